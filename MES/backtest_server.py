@@ -0,0 +1,304 @@
+import argparse
+import copy
+import http.client
+import json
+import math
+import os
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+import parameter_sweep
+from backtesting_app import FILE_MAP, load_timeframes
+from data_loader import DataLoader
+from parameter_sweep import _init_worker, prepare_merged, run_config
+from shared_arrays import SharedArrays, frames_to_arrays
+
+# "backtest" keys that decide which bars are loaded; a job may not change them.
+DATA_KEYS = ('storage', 'resample_timeframes', 'timeframes', 'start', 'end')
+
+
+def merge_job_config(base: dict, job: dict) -> dict:
+    """
+    The server's config with a job's sections laid over it: keys of a
+    section the job gives replace the server's, the rest are kept. A job
+    can therefore be a full config.json or just e.g. {"execution": {...}}.
+    Raises ValueError for a section whose type differs from the server's.
+    """
+    config = copy.deepcopy(base)
+    for section, values in job.items():
+        if section in config and type(values) is not type(config[section]):
+            raise ValueError(f"Job section '{section}' must be a {type(config[section]).__name__}, "
+                             f"not {type(values).__name__}")
+        if isinstance(values, dict) and isinstance(config.get(section), dict):
+            config[section].update(copy.deepcopy(values))
+        else:
+            config[section] = copy.deepcopy(values)
+    return config
+
+
+def _json_value(value):
+    """Metric value as plain JSON: numpy scalars unwrapped, NaN/inf as null."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    return value
+
+
+def _init_server_worker(handle, source_files, config, cache_size):
+    _init_worker(handle, source_files)
+    parameter_sweep.merged_cache_size = cache_size
+    # Build the server config's indicators before the first job arrives.
+    prepare_merged(config, parameter_sweep._worker_timeframes)
+
+
+def _run_job(config, include_trades):
+    return run_config(config, parameter_sweep._worker_timeframes, include_trades=include_trades)
+
+
+class BacktestServer:
+    """
+    Resident backtest service on localhost.
+
+    The timeframes are loaded once through DataLoader and published to a
+    pool of worker processes through shared memory, as in ParameterSweep;
+    each worker builds the merged indicator frame of the server's config at
+    start-up and keeps the last indicator_cache_size settings it has seen
+    (parameter_sweep.prepare_merged). A job is then only the bar loop and
+    the metrics.
+
+    Endpoints (JSON in and out):
+
+      GET  /health      data extent, worker count, jobs served
+      POST /backtest    body: a config in the shape of config.json (whole,
+                        or only the sections to change); ?trades=0 leaves
+                        out the trade list. Returns 'metrics', 'trades' and
+                        'elapsed_ms'.
+
+    Jobs may change anything but the "backtest" keys in DATA_KEYS, which
+    decide the data that was loaded; changing those needs a restart.
+    """
+
+    def __init__(self, config: dict, data_path: str = './data', file_map: dict = None,
+                 max_workers: int = None, indicator_cache_size: int = None):
+        server_cfg = config.get('server', {})
+        self.config = config
+        self.data_path = data_path
+        self.file_map = file_map or FILE_MAP
+        self.max_workers = max_workers or server_cfg.get('workers') or os.cpu_count() or 1
+        self.indicator_cache_size = indicator_cache_size or server_cfg.get('indicator_cache_size', 4)
+        self.timeframes = None
+        self.jobs_run = 0
+        self._shared = None
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Load the data and start the worker pool."""
+        bt_cfg = self.config.get('backtest', {})
+        loader = DataLoader(data_path=self.data_path, storage=bt_cfg.get('storage', 'csv'))
+        self.timeframes = load_timeframes(loader, self.config, self.file_map,
+                                          start=bt_cfg.get('start'), end=bt_cfg.get('end'))
+        source_files = {tf: df.attrs.get('source_file') for tf, df in self.timeframes.items()}
+        self._shared = SharedArrays(frames_to_arrays(self.timeframes))
+        self._pool = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_server_worker,
+                                         initargs=(self._shared.handle, source_files, self.config,
+                                                   self.indicator_cache_size))
+        # Start the workers now, so they build their indicators before the first job arrives.
+        list(self._pool.map(int, range(self.max_workers)))
+        print(f"BacktestServer: {self.max_workers} workers ready")
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._shared is not None:
+            self._shared.close()
+            self._shared = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def health(self) -> dict:
+        return {
+            'status': 'ok',
+            'workers': self.max_workers,
+            'jobs_run': self.jobs_run,
+            'bars': {tf: {'rows': len(df),
+                          'first': str(df.index[0]) if len(df) else None,
+                          'last': str(df.index[-1]) if len(df) else None}
+                     for tf, df in self.timeframes.items()},
+        }
+
+    def run_job(self, job: dict, include_trades: bool = True) -> dict:
+        """Run one job config on the pool; raises ValueError for a job the loaded data cannot serve."""
+        if not isinstance(job, dict):
+            raise ValueError("A job must be a JSON object in the shape of config.json")
+        config = merge_job_config(self.config, job)
+        for key in DATA_KEYS:
+            if config.get('backtest', {}).get(key) != self.config.get('backtest', {}).get(key):
+                raise ValueError(f"backtest.{key} differs from the server's; restart the server to change it")
+
+        started = time.perf_counter()
+        stats = self._pool.submit(_run_job, config, include_trades).result()
+        trades = stats.pop('trades', None)
+        with self._lock:
+            self.jobs_run += 1
+        result = {'metrics': {name: _json_value(value) for name, value in stats.items()}}
+        if trades is not None:
+            result['trades'] = json.loads(trades.to_json(orient='records', date_format='iso'))
+        result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    def serve(self, host: str = '127.0.0.1', port: int = 8765, socket_path: str = None):
+        """Serve HTTP on host:port, or on a Unix socket, until interrupted."""
+        handler = _make_handler(self)
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+            httpd = _UnixHTTPServer(socket_path, handler)
+            where = socket_path
+        else:
+            httpd = ThreadingHTTPServer((host, port), handler)
+            where = f'http://{host}:{port}'
+        print(f"BacktestServer: listening on {where}")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.server_close()
+            if socket_path and os.path.exists(socket_path):
+                os.remove(socket_path)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _make_handler(server: BacktestServer):
+    class Handler(BaseHTTPRequestHandler):
+        def address_string(self):
+            # Unix socket peers have no address.
+            return self.client_address[0] if self.client_address else 'local'
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status: int, body: dict):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.split('?')[0] == '/health':
+                self._reply(200, server.health())
+            else:
+                self._reply(404, {'error': f'Unknown path: {self.path}'})
+
+        def do_POST(self):
+            path, _, query = self.path.partition('?')
+            if path != '/backtest':
+                self._reply(404, {'error': f'Unknown path: {self.path}'})
+                return
+            try:
+                job = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                result = server.run_job(job, include_trades='trades=0' not in query.split('&'))
+            except (ValueError, KeyError, TypeError) as e:
+                self._reply(400, {'error': f'{type(e).__name__}: {e}'})
+            except Exception as e:
+                self._reply(500, {'error': f'{type(e).__name__}: {e}'})
+            else:
+                self._reply(200, result)
+
+    return Handler
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float = None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class BacktestClient:
+    """
+    Minimal client for notebooks and scripts:
+
+        client = BacktestClient(port=8765)          # or BacktestClient(socket_path=...)
+        result = client.backtest({'execution': {'stop_offset': 3.0}})
+        result['metrics']['profit_factor'], pd.DataFrame(result['trades'])
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, socket_path: str = None,
+                 timeout: float = None):
+        self.host = host
+        self.port = port
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, body: dict = None) -> dict:
+        if self.socket_path:
+            conn = _UnixHTTPConnection(self.socket_path, timeout=self.timeout)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            data = json.dumps(body).encode() if body is not None else None
+            conn.request(method, path, body=data, headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            result = json.loads(response.read())
+        finally:
+            conn.close()
+        if response.status != 200:
+            raise RuntimeError(f"BacktestServer: {response.status} {result.get('error')}")
+        return result
+
+    def health(self) -> dict:
+        return self._request('GET', '/health')
+
+    def backtest(self, config: dict, trades: bool = True) -> dict:
+        return self._request('POST', '/backtest' if trades else '/backtest?trades=0', config)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve backtests from data kept in memory.")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--data-path', default='./data')
+    parser.add_argument('--host', default=None)
+    parser.add_argument('--port', type=int, default=None)
+    parser.add_argument('--socket', default=None, help="Serve on this Unix socket instead of TCP")
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    server_cfg = config.get('server', {})
+
+    with BacktestServer(config, data_path=args.data_path, max_workers=args.workers) as server:
+        server.serve(host=args.host or server_cfg.get('host', '127.0.0.1'),
+                     port=args.port or server_cfg.get('port', 8765),
+                     socket_path=args.socket or server_cfg.get('socket'))
+
+
+if __name__ == "__main__":
+    main()
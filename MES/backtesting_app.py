@@ -1,110 +1,304 @@
 # backtesting_app.py
 
+import argparse
 import json
 import pandas as pd
 
 from data_loader import DataLoader
 from indicator_calculator import IndicatorCalculator
+from indicator_cache import IndicatorCache
 from strategy_logic import StrategyLogic
 from execution_simulator import ExecutionSimulator
 from performance_analyzer import PerformanceAnalyzer
+from columnar_engine import ColumnarEngine
+from position_kernel import KernelEngine
+from intrabar_index import IntrabarIndex
+from instrumentation import PROFILER
+from monte_carlo import MonteCarloAnalyzer, print_report as print_monte_carlo
+from session_calendar import SessionCalendar
+from multi_timeframe import MultiTimeframeBuilder
+from continuous_contract import continuous_file_map
+from results_store import ResultsStore, data_fingerprint
+from transaction_costs import TransactionCostModel, break_even
+
+FILE_MAP = {
+    '1m': 'MES_1_min.csv',
+    '5m': 'MES_5_mins.csv',
+}
+
+# Timeframe whose bars drive the strategy; the others are aligned onto it.
+BASE_TIMEFRAME = '5m'
+
+# Hot calls timed when profiling is enabled.
+PROFILED_METHODS = {
+    'loader': ['load_data'],
+    'calculator': ['add_indicators'],
+    'strategy': ['check_signal', 'compute_signals', 'compute_frame_signals'],
+    'simulator': ['process_signal', 'check_stop_loss_or_profit_target', 'check_exit_path'],
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the two-timeframe backtest.")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--profile', action='store_true', help="enable stage/hot-path timers")
+    parser.add_argument('--cprofile', action='store_true', help="also record the run with cProfile")
+    parser.add_argument('--profile-report', default=None, help="report path (default from config)")
+    parser.add_argument('--profile-format', choices=['json', 'folded'], default=None)
+    args = parser.parse_args(argv)
 
-def main():
     print("===== Starting Backtesting Application =====")
 
     # 1) Load config.json
-    with open("config.json", "r") as f:
+    with open(args.config, "r") as f:
         config = json.load(f)
 
+    prof_cfg = config.get("profiling", {})
+    if args.profile or args.cprofile or prof_cfg.get("enabled", False):
+        PROFILER.enable(cprofile=args.cprofile or prof_cfg.get("cprofile", False))
+
     # 2) Create DataLoader
-    loader = DataLoader(data_path='./data')
-    file_map = {
-        '1m': 'MES_1_min.csv',
-        '5m': 'MES_5_mins.csv',
-    }
-    timeframes = loader.load_all_timeframes(file_map)
+    bt_cfg = config.get("backtest", {})
+    loader = PROFILER.instrument(DataLoader(data_path='./data', storage=bt_cfg.get("storage", "csv")),
+                                 PROFILED_METHODS['loader'])
+    with PROFILER.timer('load'):
+        timeframes = load_timeframes(loader, config, start=bt_cfg.get("start"), end=bt_cfg.get("end"))
     print("Loaded timeframes:", list(timeframes.keys()))
 
-    # 3) Compute indicators from config
-    calculator = IndicatorCalculator()
-    ind_cfg = config["indicators"]
-
-    df_1m = calculator.add_indicators(
-        timeframes['1m'].copy(),
-        short_ema_period = ind_cfg["short_ema_period"],
-        medium_ema_period = ind_cfg["medium_ema_period"],
-        rsi_period = ind_cfg["rsi_period"],
-        atr_period = ind_cfg["atr_period"],
-        compute_macd = ind_cfg["compute_macd"],
-        compute_stoch = ind_cfg["compute_stoch"]
-    ).reset_index()
-
-    df_5m = calculator.add_indicators(
-        timeframes['5m'].copy(),
-        short_ema_period = ind_cfg["short_ema_period"],
-        medium_ema_period = ind_cfg["medium_ema_period"],
-        rsi_period = ind_cfg["rsi_period"],
-        atr_period = ind_cfg["atr_period"],
-        compute_macd = ind_cfg["compute_macd"],
-        compute_stoch = ind_cfg["compute_stoch"]
-    ).reset_index()
-
-    # 4) Rename columns, merge 1m into 5m
-    df_1m = df_1m.rename(columns={
-        'EMA_short': 'EMA_short_1m',
-        'EMA_medium': 'EMA_medium_1m',
-        'RSI': 'RSI_1m',
-        'ATR': 'ATR_1m',
-        'MACD': 'MACD_1m',
-        'MACD_signal': 'MACD_signal_1m',
-        'StochK': 'StochK_1m',
-        'StochD': 'StochD_1m',
-    })
-    df_5m = df_5m.rename(columns={
-        'EMA_short': 'EMA_short_5m',
-        'EMA_medium': 'EMA_medium_5m',
-        'RSI': 'RSI_5m',
-        'ATR': 'ATR_5m',
-        'MACD': 'MACD_5m',
-        'MACD_signal': 'MACD_signal_5m',
-        'StochK': 'StochK_5m',
-        'StochD': 'StochD_5m',
-    })
-
-    merged = pd.merge_asof(
-        df_5m,
-        df_1m[['time','EMA_short_1m','EMA_medium_1m','RSI_1m','ATR_1m',
-               'MACD_1m','MACD_signal_1m','StochK_1m','StochD_1m']],
-        on='time'
-    )
-    merged.ffill(inplace=True)
+    # 3) Compute indicators from config, then align every timeframe on 5m
+    calculator = PROFILER.instrument(build_calculator(config), PROFILED_METHODS['calculator'])
+    with PROFILER.timer('indicators'):
+        frames = add_timeframe_indicators(timeframes, config["indicators"], calculator)
+    with PROFILER.timer('merge'):
+        merged = merge_timeframes(frames)
     print("Merged DataFrame head:")
     print(merged.head())
     # 4) Initialize Strategy & Simulator with trailing stop config
-    exec_cfg = config["execution"]
-    simulator = ExecutionSimulator(
+    simulator = PROFILER.instrument(build_simulator(config["execution"]), PROFILED_METHODS['simulator'])
+
+    # 5) Initialize Strategy
+    strategy_config = config["strategy"]
+    strategy_logic = PROFILER.instrument(StrategyLogic(strategy_config), PROFILED_METHODS['strategy'])
+
+    # 6) Main loop: iterate each bar, check signals, process stop/target
+    engine = bt_cfg.get("engine", "iterrows")
+    intrabar = build_intrabar_index(config, timeframes, merged)
+    with PROFILER.timer('session_mask'):
+        session_mask = build_session_mask(config, merged['time'], timeframes['5m'].attrs.get('source_file'))
+    with PROFILER.timer('loop'):
+        run_engine(engine, strategy_logic, simulator, merged, session_mask, intrabar)
+    PROFILER.count('bars', len(merged))
+    PROFILER.count('trades', len(simulator.ledger))
+
+    # 7) Analyze trades, net of transaction costs if configured
+    costs_cfg = config.get("costs", {})
+    trades = simulator.ledger.to_frame()
+    cost_model = TransactionCostModel.from_config(config)
+    if costs_cfg.get("enabled", False):
+        trades = cost_model.apply(trades)
+    analyzer = PerformanceAnalyzer(trades, bars=merged)
+    with PROFILER.timer('metrics'):
+        stats = analyzer.compute_detailed_metrics()
+
+    print_stats("Two-Timeframe (1m & 5m) - Full 8H Session"
+                + (" (net of costs)" if costs_cfg.get("enabled", False) else ""), stats)
+
+    grid_cfg = costs_cfg.get("sensitivity", {})
+    if grid_cfg.get("enabled", False):
+        with PROFILER.timer('cost_sensitivity'):
+            grid = cost_model.sensitivity(simulator.ledger, grid_cfg.get("commission", [0.0]),
+                                          grid_cfg.get("slippage_ticks", [0.0]))
+        print("\n=== Cost sensitivity (total PnL, points) ===")
+        print(grid.pivot(index='commission', columns='slippage_ticks', values='total_pnl').round(2).to_string())
+        print(break_even(grid).to_string(index=False))
+
+    # 8) Optional robustness check on resampled trade sequences
+    mc_cfg = config.get("monte_carlo", {})
+    if mc_cfg.get("enabled", False):
+        with PROFILER.timer('monte_carlo'):
+            report = MonteCarloAnalyzer(
+                trades,
+                n_paths = mc_cfg.get("paths", 10_000),
+                method = mc_cfg.get("method", "bootstrap"),
+                ruin_level = mc_cfg.get("ruin_level_points"),
+                seed = mc_cfg.get("seed", 0)
+            ).run(mc_cfg.get("percentiles"))
+        print_monte_carlo(report)
+
+    # 9) Optionally record the run in the results store
+    if config.get("results", {}).get("enabled", False):
+        with ResultsStore.from_config(config) as store:
+            run_key = store.add_run(config, stats, trades=trades,
+                                    data_fingerprint=data_fingerprint(timeframes), label='backtest')
+        print(f"Run {run_key} has been saved to {store.path}")
+
+    if PROFILER.enabled:
+        PROFILER.write_report(args.profile_report or prof_cfg.get("report", "profile_report.json"),
+                              args.profile_format or prof_cfg.get("format", "json"))
+
+def print_stats(label: str, stats: dict):
+    """Print the summary block for a dict from compute_detailed_metrics."""
+    print(f"\n=== {label} Trades ===")
+    print(f"Total Trades:          {stats.get('total_trades', 0)}")
+    print(f"Winners / Losers:      {stats.get('winning_trades', 0)} / {stats.get('losing_trades', 0)}")
+    print(f"Win Rate:              {stats.get('win_rate', 0):.2f}%")
+    print(f"Avg P/L:               {stats.get('avg_pl', 0):.2f}")
+    print(f"Largest Win:           {stats.get('largest_win', 0):.2f}")
+    print(f"Largest Loss:          {stats.get('largest_loss', 0):.2f}")
+    print(f"Profit Factor:         {stats.get('profit_factor', 0):.3f}")
+    print(f"Avg Win / Avg Loss:    {stats.get('ratio_avg_win_loss', 0):.3f}")
+    if stats.get("avg_bar_count") is not None:
+        print(f"Avg # bars in trades:  {stats['avg_bar_count']:.1f}")
+    if stats.get("max_drawdown") is not None:
+        print(f"Max Drawdown:          {stats['max_drawdown']:.2f} "
+              f"({stats.get('max_drawdown_duration_days', 0):.1f} days under water)")
+    if stats.get("sharpe") is not None:
+        print(f"Sharpe / Sortino:      {stats['sharpe']:.2f} / {stats.get('sortino') or 0:.2f}")
+    if stats.get("exposure") is not None:
+        print(f"Exposure:              {stats['exposure'] * 100:.1f}%")
+
+def load_timeframes(loader: DataLoader, config: dict, file_map: dict = None, start=None, end=None) -> dict:
+    """
+    Bars for every timeframe (start <= time < end). With
+    backtest.resample_timeframes set, only the 1m file is parsed and the
+    timeframes listed in backtest.timeframes are built from it; otherwise
+    each timeframe is read from its own file in file_map.
+    """
+    file_map = file_map or FILE_MAP
+    bt_cfg = config.get("backtest", {})
+    if not bt_cfg.get("resample_timeframes", False):
+        return loader.load_all_timeframes(continuous_file_map(loader, config, file_map), start=start, end=end)
+    file_1m = continuous_file_map(loader, config, {'1m': file_map['1m']})['1m']
+    df_1m = loader.load_data(file_1m, start, end)
+    builder = MultiTimeframeBuilder(bt_cfg.get("timeframes", list(file_map)), BASE_TIMEFRAME)
+    return builder.resample(df_1m)
+
+def build_merged_frame(timeframes: dict, ind_cfg: dict, calculator: IndicatorCalculator) -> pd.DataFrame:
+    """
+    Add indicators to every timeframe and align them on the 5m rows
+    (suffixes _1m / _5m / ...).
+    """
+    return merge_timeframes(add_timeframe_indicators(timeframes, ind_cfg, calculator))
+
+def add_timeframe_indicators(timeframes: dict, ind_cfg: dict, calculator: IndicatorCalculator) -> dict:
+    """{timeframe: bars with indicator columns}, indexed by time."""
+    return {
+        tf: calculator.add_indicators(
+            df.copy(),
+            short_ema_period = ind_cfg["short_ema_period"],
+            medium_ema_period = ind_cfg["medium_ema_period"],
+            rsi_period = ind_cfg["rsi_period"],
+            atr_period = ind_cfg["atr_period"],
+            compute_macd = ind_cfg["compute_macd"],
+            compute_stoch = ind_cfg["compute_stoch"]
+        )
+        for tf, df in timeframes.items()
+    }
+
+def merge_timeframes(frames: dict) -> pd.DataFrame:
+    """
+    Align every timeframe's indicator columns onto the 5m rows, renamed with
+    a _<timeframe> suffix. Each 5m bar sees the last bar of every other
+    timeframe that had closed by its own close (see MultiTimeframeBuilder).
+    """
+    return MultiTimeframeBuilder(list(frames), BASE_TIMEFRAME).align(frames)
+
+def build_calculator(config: dict) -> IndicatorCalculator:
+    """IndicatorCalculator using the on-disk cache from backtest.indicator_cache, if configured."""
+    cache_cfg = config.get("backtest", {}).get("indicator_cache")
+    if not cache_cfg:
+        return IndicatorCalculator()
+    cache = IndicatorCache(
+        cache_dir = cache_cfg.get("dir", "./cache/indicators"),
+        max_bytes = int(cache_cfg.get("max_mb", 2048) * 1024 ** 2)
+    )
+    return IndicatorCalculator(cache=cache)
+
+def build_intrabar_index(config: dict, timeframes: dict, merged: pd.DataFrame):
+    """IntrabarIndex over the 1m bars when backtest.fill_mode is "intrabar", else None."""
+    fill_mode = config.get("backtest", {}).get("fill_mode", "bar")
+    if fill_mode == "bar":
+        return None
+    if fill_mode != "intrabar":
+        raise ValueError(f"Unknown fill mode: {fill_mode}")
+    return IntrabarIndex(timeframes['1m'], merged, bar_length='5min')
+
+def build_simulator(exec_cfg: dict, log_mode: str = None) -> ExecutionSimulator:
+    """
+    Create an ExecutionSimulator from the "execution" section of config.json.
+    log_mode overrides the section's "log_mode" (default 'print').
+    """
+    return ExecutionSimulator(
         stop_offset = exec_cfg["stop_offset"],
         target_offset = exec_cfg["target_offset"],
         default_quantity = exec_cfg.get("default_quantity", 1),
         enable_trailing_stop = exec_cfg.get("enable_trailing_stop", False),
-        trailing_stop_offset = exec_cfg.get("trailing_stop_offset", 2.0)
+        trailing_stop_offset = exec_cfg.get("trailing_stop_offset", 2.0),
+        log_mode = log_mode or exec_cfg.get("log_mode", "print")
     )
-    # 5) Initialize Strategy & Simulator
-    strategy_config = config["strategy"]
-    strategy_logic = StrategyLogic(strategy_config)
 
-    # Pass stop_offset/target_offset from config
-    simulator = ExecutionSimulator(
-        stop_offset=config["execution"]["stop_offset"],
-        target_offset=config["execution"]["target_offset"]
-    )
+def bar_inputs(row):
+    """data_point and multi_indicators dicts of one merged-frame row, as check_signal takes them."""
+    # Build data_point for the bar
+    data_point = {
+        'time': row['time'],
+        'open':  row['open'],
+        'high':  row['high'],
+        'low':   row['low'],
+        'close': row['close'],
+        'volume': row['volume']
+    }
 
-    # 6) Main loop: iterate each bar, check signals, process stop/target
-    for idx, row in merged.iterrows():
-        bar_time = row['time']
-        
+    # Build multi_indicators for 1m & 5m
+    multi_indicators = {
+        '1m': {
+            'EMA_short': row['EMA_short_1m'],
+            'EMA_medium': row['EMA_medium_1m'],
+            'RSI': row['RSI_1m'],
+            'ATR': row['ATR_1m'],
+            'MACD': row['MACD_1m'],
+            'MACD_signal': row['MACD_signal_1m'],
+            'StochK': row['StochK_1m'],
+            'StochD': row['StochD_1m'],
+        },
+        '5m': {
+            'EMA_short': row['EMA_short_5m'],
+            'EMA_medium': row['EMA_medium_5m'],
+            'RSI': row['RSI_5m'],
+            'ATR': row['ATR_5m'],
+            'MACD': row['MACD_5m'],
+            'MACD_signal': row['MACD_signal_5m'],
+            'StochK': row['StochK_5m'],
+            'StochD': row['StochD_5m'],
+        },
+    }
+    return data_point, multi_indicators
+
+def run_engine(engine: str, strategy_logic: StrategyLogic, simulator: ExecutionSimulator,
+               merged: pd.DataFrame, session_mask, intrabar=None):
+    """Run the bar loop with the backtest.engine named `engine`; trades end up in the simulator."""
+    if engine == "columnar":
+        ColumnarEngine(strategy_logic, simulator).run(merged, session_mask, intrabar)
+    elif engine == "kernel":
+        KernelEngine(strategy_logic, simulator).run(merged, session_mask, intrabar)
+    elif engine == "iterrows":
+        if intrabar is not None:
+            raise ValueError("fill_mode 'intrabar' requires the columnar or kernel engine")
+        run_bar_loop(merged, strategy_logic, simulator, session_mask)
+    else:
+        raise ValueError(f"Unknown backtest engine: {engine}")
+
+def run_bar_loop(merged: pd.DataFrame, strategy_logic: StrategyLogic, simulator: ExecutionSimulator,
+                 session_mask=None):
+    """
+    Row-by-row reference loop over the merged frame (the "iterrows" engine).
+    session_mask is a precomputed tradable-bar array (see build_session_mask);
+    it defaults to full_session_mask.
+    """
+    if session_mask is None:
+        session_mask = full_session_mask(merged['time'])
+    for idx, (_, row) in enumerate(merged.iterrows()):
         # (A) If outside session, skip new trades, but still check open position
-        if not is_within_full_session(bar_time):
+        if not session_mask[idx]:
             # Check if an open position hits stop/target even outside session
             if simulator.open_position:
                 exit_info = simulator.check_stop_loss_or_profit_target(row)
@@ -116,41 +310,11 @@ def main():
                         'reason': exit_info['reason']
                     }
                     simulator.process_signal(exit_signal, row)
+            if strategy_logic.uses_history:
+                strategy_logic.observe(*bar_inputs(row))
             continue
 
-        # Build data_point for the bar
-        data_point = {
-            'time': bar_time,
-            'open':  row['open'],
-            'high':  row['high'],
-            'low':   row['low'],
-            'close': row['close'],
-            'volume': row['volume']
-        }
-
-        # Build multi_indicators for 1m & 5m
-        multi_indicators = {
-            '1m': {
-                'EMA_short': row['EMA_short_1m'],
-                'EMA_medium': row['EMA_medium_1m'],
-                'RSI': row['RSI_1m'],
-                'ATR': row['ATR_1m'],
-                'MACD': row['MACD_1m'],
-                'MACD_signal': row['MACD_signal_1m'],
-                'StochK': row['StochK_1m'],
-                'StochD': row['StochD_1m'],
-            },
-            '5m': {
-                'EMA_short': row['EMA_short_5m'],
-                'EMA_medium': row['EMA_medium_5m'],
-                'RSI': row['RSI_5m'],
-                'ATR': row['ATR_5m'],
-                'MACD': row['MACD_5m'],
-                'MACD_signal': row['MACD_signal_5m'],
-                'StochK': row['StochK_5m'],
-                'StochD': row['StochD_5m'],
-            },
-        }
+        data_point, multi_indicators = bar_inputs(row)
 
         # 6a) Check for new entry signal
         signal = strategy_logic.check_signal(data_point, multi_indicators)
@@ -171,24 +335,6 @@ def main():
                 }
                 simulator.process_signal(exit_signal, data_point)
 
-    # 7) Analyze trades
-    trades = simulator.trades
-    analyzer = PerformanceAnalyzer(trades)
-    stats = analyzer.compute_detailed_metrics()
-
-    label = "Two-Timeframe (1m & 5m) - Full 8H Session"
-    print(f"\n=== {label} Trades ===")
-    print(f"Total Trades:          {stats.get('total_trades', 0)}")
-    print(f"Winners / Losers:      {stats.get('winning_trades', 0)} / {stats.get('losing_trades', 0)}")
-    print(f"Win Rate:              {stats.get('win_rate', 0):.2f}%")
-    print(f"Avg P/L:               {stats.get('avg_pl', 0):.2f}")
-    print(f"Largest Win:           {stats.get('largest_win', 0):.2f}")
-    print(f"Largest Loss:          {stats.get('largest_loss', 0):.2f}")
-    print(f"Profit Factor:         {stats.get('profit_factor', 0):.3f}")
-    print(f"Avg Win / Avg Loss:    {stats.get('ratio_avg_win_loss', 0):.3f}")
-    if stats.get("avg_bar_count") is not None:
-        print(f"Avg # bars in trades:  {stats['avg_bar_count']:.1f}")
-
 def is_within_full_session(bar_time):
     """Example session: 9:30 to 17:30 local/ET."""
     if bar_time.hour < 9:
@@ -201,5 +347,18 @@ def is_within_full_session(bar_time):
         return False
     return True
 
+def build_session_mask(config: dict, times: pd.Series, source_file: str = None):
+    """
+    Tradable-bar mask for the session named by sessions.trade_session
+    (default "full") of config.json, cached per data file.
+    """
+    session = config.get("sessions", {}).get("trade_session", "full")
+    return SessionCalendar.from_config(config).mask(times.to_numpy(), session, source_file)
+
+def full_session_mask(times: pd.Series):
+    """Vectorized is_within_full_session over a whole time column."""
+    minutes = times.dt.hour.to_numpy() * 60 + times.dt.minute.to_numpy()
+    return (minutes >= 9 * 60 + 30) & (minutes < 17 * 60 + 30)
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,265 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from backtesting_app import (add_timeframe_indicators, build_session_mask, build_simulator,
+                             load_timeframes, merge_timeframes, run_bar_loop)
+from columnar_engine import ColumnarEngine
+from position_kernel import KernelEngine
+from data_loader import DataLoader
+from indicator_calculator import IndicatorCalculator
+from performance_analyzer import PerformanceAnalyzer
+from strategy_logic import StrategyLogic
+from synthetic_data import write_dataset
+
+DEFAULT_SIZES = [100_000, 1_000_000, 10_000_000]
+STAGES = ['load', 'indicators', 'merge', 'loop', 'metrics']
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+class BenchmarkSuite:
+    """
+    Times each stage of the backtesting_app pipeline on synthetic data:
+
+      load:        DataLoader.load_data for the 1m and 5m files (or the 1m
+                   file plus resampling, with backtest.resample_timeframes)
+      indicators:  IndicatorCalculator.add_indicators on both timeframes
+      merge:       aligning the 1m columns onto the 5m rows
+      loop:        the bar loop (columnar or kernel engine, or the iterrows loop)
+      metrics:     PerformanceAnalyzer.compute_detailed_metrics
+
+    Sizes are counts of 1m bars; the 5m file has a fifth of that. Each stage
+    is timed best-of-`repeat`. Peak traced memory per stage comes from a
+    separate tracemalloc pass, so the tracing overhead does not distort the
+    timings.
+    """
+
+    def __init__(self, config: dict, sizes=None, repeat: int = 3, engine: str = 'columnar',
+                 storage: str = 'csv', measure_memory: bool = True, work_dir: str = None, seed: int = 0):
+        self.config = config
+        self.sizes = sizes or DEFAULT_SIZES
+        self.repeat = repeat
+        self.engine = engine
+        self.storage = storage
+        self.measure_memory = measure_memory
+        self.work_dir = work_dir
+        self.seed = seed
+
+    def run(self) -> dict:
+        with contextlib.ExitStack() as stack:
+            work_dir = self.work_dir or stack.enter_context(tempfile.TemporaryDirectory())
+            results = {'meta': self.meta(), 'results': {}}
+            for size in self.sizes:
+                print(f"BenchmarkSuite: {size} bars")
+                data_path = os.path.join(work_dir, f'bars_{size}')
+                file_map = write_dataset(data_path, size, seed=self.seed)
+                results['results'][str(size)] = self.run_size(data_path, file_map, size)
+        return results
+
+    def meta(self) -> dict:
+        return {
+            'engine': self.engine,
+            'storage': self.storage,
+            'repeat': self.repeat,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'created': pd.Timestamp.now().isoformat(timespec='seconds'),
+        }
+
+    def run_size(self, data_path: str, file_map: dict, size: int) -> dict:
+        seconds = {stage: float('inf') for stage in STAGES}
+        for _ in range(self.repeat):
+            timings, outputs = self.run_pipeline(data_path, file_map)
+            for stage, elapsed in timings.items():
+                seconds[stage] = min(seconds[stage], elapsed)
+
+        rows = {
+            'load': outputs['rows_1m'] + outputs['rows_5m'],
+            'indicators': outputs['rows_1m'] + outputs['rows_5m'],
+            'merge': outputs['rows_5m'],
+            'loop': outputs['rows_5m'],
+            'metrics': outputs['trades'],
+        }
+        peaks = self.peak_memory(data_path, file_map) if self.measure_memory else {}
+
+        stages = {}
+        for stage in STAGES:
+            stages[stage] = {
+                'seconds': seconds[stage],
+                'rows': rows[stage],
+                'rows_per_sec': rows[stage] / seconds[stage] if seconds[stage] > 0 else None,
+            }
+            if stage in peaks:
+                stages[stage]['peak_mb'] = peaks[stage]
+        total = sum(seconds.values())
+        return {
+            'bars_1m': outputs['rows_1m'],
+            'bars_5m': outputs['rows_5m'],
+            'trades': outputs['trades'],
+            'total_seconds': total,
+            'bars_per_sec': outputs['rows_1m'] / total if total > 0 else None,
+            'peak_mb': max(peaks.values()) if peaks else None,
+            'stages': stages,
+        }
+
+    def run_pipeline(self, data_path: str, file_map: dict, on_stage=None):
+        """
+        One pass through the pipeline. Returns ({stage: seconds}, outputs).
+        on_stage(stage) is called before each stage (used by peak_memory).
+        """
+        on_stage = on_stage or (lambda stage: None)
+        timings = {}
+
+        on_stage('load')
+        loader = DataLoader(data_path=data_path, storage=self.storage)
+        timings['load'], timeframes = _timed(load_timeframes, loader, self.config, file_map)
+
+        on_stage('indicators')
+        timings['indicators'], frames = _timed(
+            add_timeframe_indicators, timeframes, self.config['indicators'], IndicatorCalculator())
+
+        on_stage('merge')
+        timings['merge'], merged = _timed(merge_timeframes, frames)
+
+        on_stage('loop')
+        strategy_logic = StrategyLogic(self.config['strategy'])
+        simulator = build_simulator(self.config['execution'], log_mode='quiet')
+        if self.engine in ('columnar', 'kernel'):
+            engine_cls = ColumnarEngine if self.engine == 'columnar' else KernelEngine
+            engine = engine_cls(strategy_logic, simulator)
+            timings['loop'], _ = _timed(engine.run, merged, build_session_mask(self.config, merged['time']))
+        else:
+            timings['loop'], _ = _timed(run_bar_loop, merged, strategy_logic, simulator,
+                                        build_session_mask(self.config, merged['time']))
+        trades = simulator.ledger
+
+        on_stage('metrics')
+        analyzer = PerformanceAnalyzer(trades.to_frame(), bars=merged)
+        timings['metrics'], _ = _timed(analyzer.compute_detailed_metrics)
+        on_stage(None)
+
+        outputs = {'rows_1m': len(timeframes['1m']), 'rows_5m': len(timeframes['5m']),
+                   'trades': len(trades)}
+        return timings, outputs
+
+    def peak_memory(self, data_path: str, file_map: dict) -> dict:
+        """Peak traced allocation (MB) of each stage, in one traced pass."""
+        peaks = {}
+        current = [None]
+
+        def on_stage(stage):
+            if current[0] is not None:
+                peaks[current[0]] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            current[0] = stage
+            tracemalloc.reset_peak()
+
+        tracemalloc.start()
+        try:
+            self.run_pipeline(data_path, file_map, on_stage)
+        finally:
+            tracemalloc.stop()
+        return peaks
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """
+    Stage timings (and peak memory) that got worse than the baseline by more
+    than `tolerance` (0.2 = 20%). Only sizes and stages present in both runs
+    are compared. Returns a list of regression dicts.
+    """
+    regressions = []
+    for size, current in results['results'].items():
+        previous = baseline.get('results', {}).get(size)
+        if previous is None:
+            continue
+        for stage, stats in current['stages'].items():
+            old = previous['stages'].get(stage)
+            if old is None:
+                continue
+            for metric in ('seconds', 'peak_mb'):
+                new_value, old_value = stats.get(metric), old.get(metric)
+                if new_value is None or not old_value:
+                    continue
+                if new_value > old_value * (1 + tolerance):
+                    regressions.append({'size': size, 'stage': stage, 'metric': metric,
+                                        'baseline': old_value, 'current': new_value,
+                                        'change': new_value / old_value - 1})
+    return regressions
+
+
+def print_results(results: dict):
+    for size, result in results['results'].items():
+        print(f"\n--- {int(size):,} bars (1m) / {result['bars_5m']:,} bars (5m), "
+              f"{result['trades']} trades ---")
+        for stage, stats in result['stages'].items():
+            peak = f"{stats['peak_mb']:9.1f} MB" if 'peak_mb' in stats else ''
+            rate = stats['rows_per_sec'] or 0
+            print(f"{stage:<12} {stats['seconds']:9.3f} s {rate:14,.0f} rows/s {peak}")
+        print(f"{'total':<12} {result['total_seconds']:9.3f} s {result['bars_per_sec'] or 0:14,.0f} bars/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each stage of the backtest on synthetic data.")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="1m bar counts")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--engine', choices=['columnar', 'kernel', 'iterrows'], default='columnar')
+    parser.add_argument('--storage', choices=['csv', 'auto'], default='csv')
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc pass")
+    parser.add_argument('--work-dir', default=None, help="keep the generated data here")
+    parser.add_argument('--out', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=None, help="baseline JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--save-baseline', action='store_true', help="also write the results to --baseline")
+    args = parser.parse_args(argv)
+    if args.save_baseline and not args.baseline:
+        parser.error("--save-baseline needs --baseline")
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+
+    results = BenchmarkSuite(config, sizes=args.sizes, repeat=args.repeat, engine=args.engine,
+                             storage=args.storage, measure_memory=not args.no_memory,
+                             work_dir=args.work_dir).run()
+    print_results(results)
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nBenchmark results have been saved to {args.out}")
+
+    if not args.baseline:
+        return 0
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline has been saved to {args.baseline}")
+        return 0
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    regressions = compare_to_baseline(results, baseline, args.tolerance)
+    for r in regressions:
+        print(f"REGRESSION {r['size']} {r['stage']} {r['metric']}: "
+              f"{r['baseline']:.3f} -> {r['current']:.3f} (+{r['change']:.0%})")
+    if not regressions:
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
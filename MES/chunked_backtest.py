@@ -0,0 +1,369 @@
+import argparse
+import json
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from backtesting_app import (BASE_TIMEFRAME, FILE_MAP, build_intrabar_index, build_session_mask,
+                             build_simulator, load_timeframes, merge_timeframes, print_stats, run_bar_loop)
+from columnar_engine import ColumnarEngine
+from columnar_store import time_range_rows
+from continuous_contract import continuous_file_map
+from data_loader import DataLoader
+from indicator_calculator import IndicatorCalculator
+from performance_analyzer import PerformanceAnalyzer
+from position_kernel import KernelEngine
+from results_store import ResultsStore, extents_fingerprint
+from strategy_logic import StrategyLogic
+
+OHLC = ['open', 'high', 'low', 'close']
+
+# Fixed periods of IndicatorCalculator.compute_macd / compute_stochastic.
+MACD_PERIODS = (12, 26, 9)
+STOCH_PERIODS = (14, 3)
+
+
+class IndicatorCarry:
+    """
+    Indicator state of one timeframe, carried from chunk to chunk so that
+    add_indicators on consecutive chunks gives the same columns as one
+    IndicatorCalculator.add_indicators call over the whole series.
+
+    The recursive indicators (EMAs, RSI, MACD) restart each chunk's pandas
+    ewm from the previous chunk's last output; with adjust=False that is
+    the exact same recurrence. The rolling ones (ATR, Stochastic) are
+    computed over the last few raw bars of the previous chunk plus the new
+    chunk, then trimmed back to the chunk.
+    """
+
+    def __init__(self, ind_cfg: dict, calculator: IndicatorCalculator = None):
+        self.cfg = ind_cfg
+        self.calculator = calculator or IndicatorCalculator()
+        # Enough history for every rolling window of the first chunk row, plus
+        # the previous close its true range needs.
+        self.tail_rows = max(ind_cfg['atr_period'], sum(STOCH_PERIODS)) + 1
+        self.tail = None      # last raw OHLC rows of the previous chunk
+        self.state = {}       # last ewm output per series
+
+    def _ewm(self, name: str, values: np.ndarray, **params) -> np.ndarray:
+        previous = self.state.get(name, np.nan)
+        if previous == previous:
+            values = np.concatenate([[previous], values])
+        result = pd.Series(values).ewm(adjust=False, **params).mean().to_numpy()
+        if previous == previous:
+            result = result[1:]
+        if len(result):
+            self.state[name] = result[-1]
+        return result
+
+    def add_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
+        cfg = self.cfg
+        out = df.copy()
+        close = df['close'].to_numpy(dtype=float)
+        prev_close = self.tail['close'].iloc[-1] if self.tail is not None else np.nan
+
+        out['EMA_short'] = self._ewm('EMA_short', close, span=cfg['short_ema_period'])
+        out['EMA_medium'] = self._ewm('EMA_medium', close, span=cfg['medium_ema_period'])
+
+        # Same steps as IndicatorCalculator.compute_rsi, with the first delta
+        # taken from the previous chunk's last close.
+        delta = pd.Series(np.diff(close, prepend=prev_close))
+        up = delta.clip(lower=0)
+        down = -1 * delta.clip(upper=0)
+        ema_up = self._ewm('RSI_up', up.to_numpy(), com=cfg['rsi_period'] - 1)
+        ema_down = self._ewm('RSI_down', down.to_numpy(), com=cfg['rsi_period'] - 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = ema_up / ema_down
+            out['RSI'] = 100 - (100 / (1 + rs))
+
+        extended = df[OHLC] if self.tail is None else pd.concat([self.tail, df[OHLC]])
+        skip = len(extended) - len(df)
+        out['ATR'] = self.calculator.compute_atr(extended, cfg['atr_period']).to_numpy()[skip:]
+
+        if cfg['compute_macd']:
+            fast, slow, signal = MACD_PERIODS
+            macd_line = self._ewm('MACD_fast', close, span=fast) - self._ewm('MACD_slow', close, span=slow)
+            out['MACD'] = macd_line
+            out['MACD_signal'] = self._ewm('MACD_signal', macd_line, span=signal)
+
+        if cfg['compute_stoch']:
+            stoch_k, stoch_d = self.calculator.compute_stochastic(extended, *STOCH_PERIODS)
+            out['StochK'] = stoch_k.to_numpy()[skip:]
+            out['StochD'] = stoch_d.to_numpy()[skip:]
+
+        if len(df):
+            self.tail = extended.iloc[-self.tail_rows:].copy()
+        return out
+
+
+class ChunkedBacktest:
+    """
+    Out-of-core backtest: the history is processed in date-range chunks of
+    chunk_days (aligned on day boundaries, so no bar of any timeframe up to
+    1d is split), and only one chunk's bars, indicators and merged frame
+    are in memory at a time.
+
+    Between chunks it carries each timeframe's indicator state
+    (IndicatorCarry), the last indicator row of every non-base timeframe
+    (so the first base bars still see the higher-timeframe bar that closed
+    in the previous chunk), the previous merged row for crossover rules,
+    and the simulator with its open position. Trades and metrics are the
+    same as a full in-memory run; only the base bars' time and close are
+    kept for the bar-level equity curve.
+
+    Chunks are read through the memory-mapped columnar store; CSV files are
+    imported into it once, streamed in blocks of import_chunk_rows, and
+    rows appended to a CSV later are added to the store incrementally.
+
+    The day of the last bar is always a chunk of its own. With a checkpoint
+    path, run() pickles everything carried so far just before that chunk:
+    the time it starts, the carried state, the StrategyLogic and the
+    ExecutionSimulator (open position and trade ledger). After more bars
+    are appended, restore() loads it and run() continues from that day, so
+    only the last day and the new rows are processed, with the same result
+    as a run over the whole history. The day is re-run because its last
+    bars may have been partial (a higher-timeframe bucket still forming).
+    """
+
+    CHECKPOINT_VERSION = 1
+
+    def __init__(self, config: dict, data_path: str = './data', file_map: dict = None,
+                 chunk_days: int = None, engine: str = None, import_chunk_rows: int = 1_000_000):
+        bt_cfg = config.get('backtest', {})
+        self.config = config
+        self.file_map = file_map or FILE_MAP
+        self.chunk_days = chunk_days or bt_cfg.get('chunk_days') or 30
+        self.engine = engine or bt_cfg.get('engine', 'columnar')
+        if self.engine not in ('columnar', 'kernel', 'iterrows'):
+            raise ValueError(f"Unknown backtest engine: {self.engine}")
+        storage = bt_cfg.get('storage', 'csv')
+        self.loader = DataLoader(data_path=data_path, storage='auto' if storage == 'csv' else storage,
+                                 import_chunk_rows=import_chunk_rows)
+        self.chunks_run = 0
+        self.max_chunk_bars = 0
+        self.data_fingerprint = None
+        self.resume_time = None       # set by restore()
+        self.checkpoint_time = None   # start of the last bar's day, set by chunk_ranges()
+        self._state = {
+            'carries': {},            # timeframe -> IndicatorCarry
+            'last_rows': {},          # timeframe -> last indicator row
+            'last_merged': None,      # last merged row, for crossovers
+            'times': [], 'closes': [],
+            'extents': {},            # timeframe -> rows read, for the data fingerprint
+        }
+
+    def _files(self) -> list:
+        if self.config.get('backtest', {}).get('resample_timeframes', False):
+            files = {'1m': self.file_map['1m']}
+        else:
+            files = self.file_map
+        return list(continuous_file_map(self.loader, self.config, files).values())
+
+    def chunk_ranges(self, start=None) -> list:
+        """
+        [(start, end), ...] half-open ranges covering the configured backtest
+        span, or the part of it from `start` on.
+        """
+        bt_cfg = self.config.get('backtest', {})
+        bounds = [b for b in (self.loader.time_bounds(f) for f in self._files()) if b[0] is not None]
+        if not bounds:
+            return []
+        first = min(b[0] for b in bounds)
+        end = max(b[1] for b in bounds) + pd.Timedelta(1, 'ns')
+        if bt_cfg.get('start'):
+            first = max(first, pd.Timestamp(bt_cfg['start']))
+        if bt_cfg.get('end'):
+            end = min(end, pd.Timestamp(bt_cfg['end']))
+        self.checkpoint_time = max(first, (end - pd.Timedelta(1, 'ns')).floor('D'))
+        start = first if start is None else max(first, pd.Timestamp(start))
+
+        step = pd.Timedelta(days=self.chunk_days)
+        ranges = []
+        edge = start.floor('D') + step
+        while start < end:
+            stop = min(edge, end)
+            if start < self.checkpoint_time < stop:
+                stop = self.checkpoint_time
+            ranges.append((start, stop))
+            if stop == edge:
+                edge = edge + step
+            start = stop
+        return ranges
+
+    def run(self, strategy_logic: StrategyLogic, simulator, on_chunk=None, checkpoint: str = None) -> pd.DataFrame:
+        """
+        Run every chunk through `simulator` (trades end up in its ledger) and
+        return the base bars' 'time' and 'close' for PerformanceAnalyzer.
+        on_chunk(start, end, n_bars) is called after each chunk.
+
+        :param checkpoint: Path to save a checkpoint to before the last day.
+        """
+        ind_cfg = self.config['indicators']
+        state = self._state
+        carries, last_rows = state['carries'], state['last_rows']
+
+        for start, end in self.chunk_ranges(self.resume_time):
+            if checkpoint and start == self.checkpoint_time:
+                self.save_checkpoint(checkpoint, strategy_logic, simulator)
+            timeframes = load_timeframes(self.loader, self.config, self.file_map, start=start, end=end)
+            for tf, df in timeframes.items():
+                extent = state['extents'].setdefault(tf, {'source': None, 'rows': 0, 'first': None, 'last': None})
+                extent['source'] = df.attrs.get('source_fingerprint') or df.attrs.get('source_file')
+                if len(df):
+                    extent['first'] = extent['first'] if extent['rows'] else df.index[0]
+                    extent['last'] = df.index[-1]
+                    extent['rows'] += len(df)
+            frames = {}
+            for tf, df in timeframes.items():
+                carry = carries.setdefault(tf, IndicatorCarry(ind_cfg))
+                frames[tf] = carry.add_indicators(df)
+            if len(frames[BASE_TIMEFRAME]) == 0:
+                last_rows.update({tf: f.iloc[-1:] for tf, f in frames.items() if len(f)})
+                continue
+
+            aligned = {tf: pd.concat([last_rows[tf], f]) if tf != BASE_TIMEFRAME and tf in last_rows else f
+                       for tf, f in frames.items()}
+            merged = merge_timeframes(aligned)
+            last_rows.update({tf: f.iloc[-1:] for tf, f in frames.items() if len(f)})
+
+            session_mask = build_session_mask(self.config, merged['time'])
+            intrabar = build_intrabar_index(self.config, timeframes, merged)
+            signals = None
+            if strategy_logic.uses_history and state['last_merged'] is not None and self.engine != 'iterrows':
+                # Crossovers on the first bar compare against the previous chunk's last bar.
+                history = pd.concat([state['last_merged'], merged], ignore_index=True)
+                signals = strategy_logic.compute_frame_signals(history)[1:]
+
+            if self.engine == 'columnar':
+                ColumnarEngine(strategy_logic, simulator).run(merged, session_mask, intrabar, signals)
+            elif self.engine == 'kernel':
+                KernelEngine(strategy_logic, simulator).run(merged, session_mask, intrabar, signals)
+            else:
+                if intrabar is not None:
+                    raise ValueError("fill_mode 'intrabar' requires the columnar or kernel engine")
+                run_bar_loop(merged, strategy_logic, simulator, session_mask)
+
+            state['last_merged'] = merged.iloc[-1:]
+            state['times'].append(merged['time'].to_numpy())
+            state['closes'].append(merged['close'].to_numpy(dtype=float))
+            self.chunks_run += 1
+            self.max_chunk_bars = max(self.max_chunk_bars, len(merged))
+            if on_chunk is not None:
+                on_chunk(start, end, len(merged))
+
+        self.data_fingerprint = extents_fingerprint(state['extents'])
+        if not state['times']:
+            return pd.DataFrame({'time': pd.Series(dtype='datetime64[ns]'), 'close': pd.Series(dtype=float)})
+        return pd.DataFrame({'time': np.concatenate(state['times']), 'close': np.concatenate(state['closes'])})
+
+    # ------------------------------------------------------------------
+    # Checkpoints
+    # ------------------------------------------------------------------
+    def _result_config(self) -> dict:
+        """The config sections a checkpoint's results depend on."""
+        backtest = {k: v for k, v in self.config.get('backtest', {}).items()
+                    if k not in ('chunk_days', 'engine', 'storage')}
+        return {'backtest': backtest, 'sessions': self.config.get('sessions'),
+                **{name: self.config.get(name) for name in ('indicators', 'strategy', 'execution')}}
+
+    def _series_state(self, before) -> dict:
+        """Per file: the columnar import it was read from and its row count before `before`."""
+        series = {}
+        for file_name in self._files():
+            name = self.loader.series_name(file_name)
+            rows = time_range_rows(self.loader.store.open(name)['time'], None, before)[1]
+            series[file_name] = {'import_id': self.loader.store.read_meta(name).get('import_id'), 'rows': rows}
+        return series
+
+    def save_checkpoint(self, path: str, strategy_logic: StrategyLogic, simulator):
+        checkpoint = {
+            'version': self.CHECKPOINT_VERSION,
+            'time': self.checkpoint_time,
+            'config': self._result_config(),
+            'series': self._series_state(self.checkpoint_time),
+            'state': self._state,
+            'strategy_logic': strategy_logic,
+            'simulator': simulator,
+            'chunks_run': self.chunks_run,
+            'max_chunk_bars': self.max_chunk_bars,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def restore(self, path: str):
+        """
+        Load a checkpoint written by run() and return its (strategy_logic,
+        simulator) to pass back to run(), which then starts at the
+        checkpoint's day. Returns None, leaving a fresh run, if there is no
+        checkpoint or it no longer applies: the config changed, or the data
+        before the checkpoint was re-imported or has a different row count.
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            checkpoint = pickle.load(f)
+        if checkpoint.get('version') != self.CHECKPOINT_VERSION:
+            print(f"ChunkedBacktest: {path} is from another version; running the whole history")
+            return None
+        if checkpoint['config'] != self._result_config():
+            print(f"ChunkedBacktest: the config changed since {path}; running the whole history")
+            return None
+        self.chunk_ranges()   # imports any rows appended to the CSV files
+        if checkpoint['series'] != self._series_state(checkpoint['time']):
+            print(f"ChunkedBacktest: the data before {checkpoint['time']} changed; running the whole history")
+            return None
+        self._state = checkpoint['state']
+        self.chunks_run = checkpoint['chunks_run']
+        self.max_chunk_bars = checkpoint['max_chunk_bars']
+        self.resume_time = checkpoint['time']
+        return checkpoint['strategy_logic'], checkpoint['simulator']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the backtest in date-range chunks.")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--data-path', default='./data')
+    parser.add_argument('--chunk-days', type=int, default=None)
+    parser.add_argument('--engine', choices=['columnar', 'kernel', 'iterrows'], default=None)
+    parser.add_argument('--checkpoint', default=None,
+                        help="Save a checkpoint here before the last day (resume from it with --resume)")
+    parser.add_argument('--resume', action='store_true',
+                        help="Continue from --checkpoint, processing only the bars after it")
+    args = parser.parse_args(argv)
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs --checkpoint")
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+
+    backtest = ChunkedBacktest(config, data_path=args.data_path, chunk_days=args.chunk_days,
+                               engine=args.engine)
+    restored = backtest.restore(args.checkpoint) if args.resume else None
+    if restored is not None:
+        strategy_logic, simulator = restored
+        print(f"ChunkedBacktest: resuming from {backtest.resume_time}")
+    else:
+        simulator = build_simulator(config['execution'])
+        strategy_logic = StrategyLogic(config['strategy'])
+    bars = backtest.run(strategy_logic, simulator, checkpoint=args.checkpoint,
+                        on_chunk=lambda start, end, n: print(f"Chunk {start} - {end}: {n} bars"))
+    print(f"ChunkedBacktest: {backtest.chunks_run} chunks of {backtest.chunk_days} days, "
+          f"largest {backtest.max_chunk_bars} bars")
+
+    stats = PerformanceAnalyzer(simulator.ledger.to_frame(), bars=bars).compute_detailed_metrics()
+    print_stats(f"Chunked ({backtest.chunk_days}-day chunks)", stats)
+
+    if config.get('results', {}).get('enabled', False):
+        with ResultsStore.from_config(config) as store:
+            run_key = store.add_run(config, stats, trades=simulator.ledger,
+                                    data_fingerprint=backtest.data_fingerprint, label='chunked')
+        print(f"Run {run_key} has been saved to {store.path}")
+
+
+if __name__ == "__main__":
+    main()
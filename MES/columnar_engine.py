@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+
+
+class ColumnarEngine:
+    """
+    Array-based replacement for the merged.iterrows() loop in backtesting_app.
+
+    The OHLC and indicator columns are pulled out of the merged frame as NumPy
+    arrays once. Entry signals and the session filter are evaluated for the
+    whole column up front. For each open position the exit is found with one
+    first-hit search over the following bars (ExecutionSimulator.check_exit_path),
+    so the Python loop runs once per trade rather than once per bar. It drives
+    the same StrategyLogic and ExecutionSimulator objects as the row loop and
+    produces the same trades.
+    """
+
+    # First look-ahead window (in path positions) when searching for an exit;
+    # doubled until the exit is found so long trades stay O(log n) calls.
+    INITIAL_SCAN = 64
+
+    def __init__(self, strategy_logic, simulator):
+        self.strategy_logic = strategy_logic
+        self.simulator = simulator
+
+    def run(self, merged: pd.DataFrame, session_mask, intrabar=None, signals=None):
+        """
+        Walk the merged 1m/5m frame bar by bar. A position already open in
+        the simulator is carried in and checked from the first bar.
+
+        :param merged: Output of backtesting_app.build_merged_frame.
+        :param session_mask: Boolean array, True where new entries are allowed
+                             (see backtesting_app.build_session_mask).
+        :param intrabar: Optional IntrabarIndex. When given, stops/targets are
+                         resolved on the 1m bars inside each 5m bar, and a
+                         position opened at a bar's close is first checked on
+                         the next bar.
+        :param signals: Precomputed entry signals; by default the strategy's
+                        own rule is evaluated on `merged`.
+        Returns the simulator's TradeLedger.
+        """
+        times = merged['time'].to_numpy()
+        close = merged['close'].to_numpy(dtype=float)
+        session_mask = np.asarray(session_mask, dtype=bool)
+
+        if intrabar is None:
+            # Each bar is its own single-step path.
+            path_high = merged['high'].to_numpy(dtype=float)
+            path_low = merged['low'].to_numpy(dtype=float)
+            path_owner = np.arange(len(close))
+            path_start = np.arange(len(close) + 1)
+        else:
+            path_high, path_low = intrabar.high, intrabar.low
+            path_owner, path_start = intrabar.owner, intrabar.start
+
+        if signals is None:
+            signals = self.strategy_logic.compute_frame_signals(merged)
+        # Bars where a flat simulator would open a position, in order.
+        entry_bars = np.flatnonzero((signals != 0) & session_mask)
+
+        simulator = self.simulator
+        n_bars = len(close)
+        # The bar-mode loop checks the entry bar's own high/low; intrabar mode
+        # starts after the entry, at the next bar's first 1m sub-bar.
+        entry_skip = 0 if intrabar is None else 1
+        i = 0
+        while i < n_bars:
+            if simulator.open_position is None:
+                # Flat: jump straight to the next bar that opens a position.
+                k = np.searchsorted(entry_bars, i)
+                if k == len(entry_bars):
+                    break
+                i = entry_bars[k]
+                side = 'LONG' if signals[i] > 0 else 'SHORT'
+                reason = self.strategy_logic.long_reason if signals[i] > 0 else self.strategy_logic.short_reason
+                signal = {'type': side, 'reason': reason}
+                simulator.process_signal(signal, self._data_point(times, close, i))
+                scan_from = path_start[min(i + entry_skip, n_bars)]
+            else:
+                scan_from = path_start[i]
+
+            hit = self._first_exit(path_high, path_low, scan_from)
+            if hit is None:
+                break  # Position stays open past the last bar.
+            k, exit_info = hit
+            i = path_owner[k]
+            exit_signal = {
+                'type': 'EXIT',
+                'position_type': simulator.open_position.type,
+                'exit_price': exit_info['exit_price'],
+                'reason': exit_info['reason']
+            }
+            simulator.process_signal(exit_signal, self._data_point(times, close, i))
+            i += 1
+
+        return simulator.ledger
+
+    def _first_exit(self, path_high, path_low, start):
+        """Path position and exit info of the first stop/target hit at or after `start`."""
+        n = len(path_high)
+        width = self.INITIAL_SCAN
+        while start < n:
+            stop = min(n, start + width)
+            hit = self.simulator.check_exit_path(path_high[start:stop], path_low[start:stop])
+            if hit is not None:
+                return start + hit[0], hit[1]
+            start = stop
+            width *= 2
+        return None
+
+    @staticmethod
+    def _data_point(times, close, i):
+        """Minimal data_point for process_signal; only built on entries and exits."""
+        return {'time': pd.Timestamp(times[i]), 'close': close[i]}
@@ -0,0 +1,145 @@
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+
+
+class ColumnarStore:
+    """
+    Column-per-file binary storage for bar series.
+
+    Each series lives in <root>/<name>/ as one raw little-endian <column>.bin
+    file per column plus a meta.json describing dtypes and row count. The
+    'time' column is stored as datetime64 and must be sorted, so a date
+    range can be located with a binary search and read memory-mapped without
+    touching the rest of the file. Raw files (rather than .npy) keep appends
+    cheap: new rows are simply written to the end of each column file.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def series_dir(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def exists(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.series_dir(name), 'meta.json'))
+
+    def read_meta(self, name: str) -> dict:
+        with open(os.path.join(self.series_dir(name), 'meta.json'), 'r') as f:
+            return json.load(f)
+
+    def _write_meta(self, name: str, meta: dict):
+        path = os.path.join(self.series_dir(name), 'meta.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def set_source(self, name: str, source: dict):
+        """Replace the free-form source metadata of a series."""
+        meta = self.read_meta(name)
+        meta['source'] = source
+        self._write_meta(name, meta)
+
+    @staticmethod
+    def _columns_of(df: pd.DataFrame) -> dict:
+        columns = {'time': df.index.to_numpy()}
+        for col in df.columns:
+            columns[col] = df[col].to_numpy()
+        return columns
+
+    def write(self, name: str, df: pd.DataFrame, source: dict = None):
+        """
+        Replace the series `name` with `df` (time index, one column per field).
+        `source` is free-form metadata, e.g. the size/mtime of the CSV it came from.
+        Every write gets a new 'import_id'; appends keep it, so an unchanged
+        id means the rows already stored have not been replaced.
+        """
+        if not df.index.is_monotonic_increasing:
+            raise ValueError(f"ColumnarStore: '{name}' time index must be sorted")
+        columns = self._columns_of(df)
+
+        tmp_dir = self.series_dir(name) + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for col, values in columns.items():
+            values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder('<'))
+            values.tofile(os.path.join(tmp_dir, f'{col}.bin'))
+        meta = {
+            'rows': len(df),
+            'columns': {col: values.dtype.newbyteorder('<').str for col, values in columns.items()},
+            'source': source or {},
+            'import_id': uuid.uuid4().hex,
+        }
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+
+        shutil.rmtree(self.series_dir(name), ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+        os.rename(tmp_dir, self.series_dir(name))
+
+    def append(self, name: str, df: pd.DataFrame, source: dict = None):
+        """
+        Append rows to an existing series (creating it if needed). The new
+        rows must start after the last stored timestamp.
+        """
+        if not self.exists(name):
+            self.write(name, df, source)
+            return
+        if len(df) == 0:
+            return
+        meta = self.read_meta(name)
+        if list(meta['columns']) != ['time'] + list(df.columns):
+            raise ValueError(f"ColumnarStore: column mismatch appending to '{name}'")
+        if meta['rows']:
+            last_time = self.open(name)['time'][-1]
+            if df.index[0] <= last_time:
+                raise ValueError(f"ColumnarStore: rows appended to '{name}' must start after {last_time}")
+
+        for col, values in self._columns_of(df).items():
+            values = np.ascontiguousarray(values, dtype=np.dtype(meta['columns'][col]))
+            with open(os.path.join(self.series_dir(name), f'{col}.bin'), 'ab') as f:
+                values.tofile(f)
+        meta['rows'] += len(df)
+        if source is not None:
+            meta['source'] = source
+        self._write_meta(name, meta)
+
+    def open(self, name: str) -> dict:
+        """All columns of the series as read-only memory-mapped arrays."""
+        meta = self.read_meta(name)
+        arrays = {}
+        for col, dtype in meta['columns'].items():
+            path = os.path.join(self.series_dir(name), f'{col}.bin')
+            if meta['rows'] == 0:
+                arrays[col] = np.empty(0, dtype=np.dtype(dtype))
+            else:
+                arrays[col] = np.memmap(path, dtype=np.dtype(dtype), mode='r', shape=(meta['rows'],))
+        return arrays
+
+    def load(self, name: str, start=None, end=None) -> pd.DataFrame:
+        """
+        Frame for start <= time < end (None = open-ended), indexed by 'time'.
+        The columns are views of the memory-mapped files; only the requested
+        rows are ever paged in.
+        """
+        arrays = self.open(name)
+        first, stop = time_range_rows(arrays['time'], start, end)
+        # Plain ndarray views over the maps, so pandas treats them like any other column.
+        columns = {col: values[first:stop].view(np.ndarray) for col, values in arrays.items()}
+        index = pd.DatetimeIndex(columns.pop('time'), name='time')
+        return pd.DataFrame(columns, index=index, copy=False)
+
+
+def time_range_rows(times, start=None, end=None):
+    """(first, stop) row positions covering start <= time < end in a sorted time array."""
+    first = 0 if start is None else int(np.searchsorted(times, _as_datetime64(start), 'left'))
+    stop = len(times) if end is None else int(np.searchsorted(times, _as_datetime64(end), 'left'))
+    return first, max(first, stop)
+
+
+def _as_datetime64(value):
+    return pd.Timestamp(value).to_datetime64()
@@ -0,0 +1,307 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DataLoader
+
+OHLC = ['open', 'high', 'low', 'close']
+MONTH_CODES = 'FGHJKMNQUVXZ'
+
+
+def contract_symbol(file_name: str) -> str:
+    """'MESH5_1_min.csv' -> 'MESH5'."""
+    return os.path.basename(file_name).split('_')[0]
+
+
+def contract_expiry(symbol: str, reference_year: int = None) -> pd.Timestamp:
+    """
+    Expiry day of an equity index future: the third Friday of the contract
+    month, e.g. MESH5 -> 2025-03-21. A one-digit year is the first year
+    ending in that digit from reference_year on (default: this year - 5).
+    """
+    match = re.search(r'([FGHJKMNQUVXZ])(\d{1,2})$', symbol)
+    if match is None:
+        raise ValueError(f"Not a futures contract symbol: {symbol}")
+    month = MONTH_CODES.index(match.group(1)) + 1
+    digits = match.group(2)
+    if len(digits) == 2:
+        year = 2000 + int(digits)
+    else:
+        reference_year = reference_year or pd.Timestamp.now().year - 5
+        year = reference_year + (int(digits) - reference_year) % 10
+    first = pd.Timestamp(year, month, 1)
+    return first + pd.Timedelta(days=(4 - first.weekday()) % 7 + 14)
+
+
+class ContinuousContract:
+    """
+    Stitches per-expiry bar files (MESH5_1_min.csv, MESM5_1_min.csv, ...)
+    into one continuous series.
+
+    Contracts are ordered by expiry, and each is used from the previous roll
+    up to its own. The roll from a contract to the next happens
+
+      'volume' / 'open_interest'  at the start of the day after the first
+                                  day on which the next contract's daily
+                                  volume (last open interest) exceeds the
+                                  current one's, which is known only at
+                                  that day's close
+      'expiry'                    at the start of the roll_days'th trading
+                                  day before the current contract's expiry
+
+    and never later than the start of its expiry day. At each roll the
+    adjustment compares the new contract's close with the old one's on the
+    old contract's last bar: 'back' adds the accumulated gaps to everything
+    before the roll, 'ratio' multiplies it by the accumulated price ratios
+    (prices then leave the tick grid) and 'none' leaves the raw prices.
+    The adjustment is applied to all bars at once from a per-segment
+    offset/factor array.
+
+    build() caches the stitched series in the DataLoader's ColumnarStore
+    as '<name>_continuous', with the roll table and a fingerprint of the
+    input files and settings in its metadata; it is only rebuilt when one
+    of those changes. DataLoader reads it like any other series, with the
+    fingerprint as its 'source_fingerprint' for the indicator cache.
+    """
+
+    def __init__(self, loader: DataLoader, name: str, pattern: str, roll: str = 'volume',
+                 roll_days: int = 8, adjustment: str = 'back', expiries: dict = None):
+        """
+        :param name: Name of the series the stitched bars replace, e.g. 'MES_1_min.csv'.
+        :param pattern: Glob (under the loader's data_path) of the per-expiry files.
+        :param expiries: Optional {symbol: date} for contracts whose expiry is
+                         not the third Friday of the contract month.
+        """
+        if roll not in ('volume', 'open_interest', 'expiry'):
+            raise ValueError(f"Unknown roll rule: {roll}")
+        if adjustment not in ('back', 'ratio', 'none'):
+            raise ValueError(f"Unknown adjustment: {adjustment}")
+        self.loader = loader
+        self.series = f'{DataLoader.series_name(name)}_continuous'
+        self.pattern = pattern
+        self.roll = roll
+        self.roll_days = roll_days
+        self.adjustment = adjustment
+        self.expiries = {symbol: pd.Timestamp(day) for symbol, day in (expiries or {}).items()}
+
+    @property
+    def file_name(self) -> str:
+        """File name under which DataLoader finds the stitched series."""
+        return f'{self.series}.csv'
+
+    def contracts(self) -> list:
+        """[(symbol, path, expiry), ...] of the matching files, by expiry."""
+        paths = sorted(glob.glob(os.path.join(self.loader.data_path, self.pattern)))
+        if not paths:
+            raise FileNotFoundError(f"No contract files match {self.pattern} in {self.loader.data_path}")
+        contracts = []
+        for path in paths:
+            symbol = contract_symbol(path)
+            if symbol in self.expiries:
+                expiry = self.expiries[symbol]
+            else:
+                # A contract's history starts at most a few years before it expires.
+                with open(path, 'r') as f:
+                    f.readline()
+                    first_year = pd.Timestamp(f.readline().split(',')[0]).year
+                expiry = contract_expiry(symbol, reference_year=first_year)
+            contracts.append((symbol, path, expiry))
+        return sorted(contracts, key=lambda c: c[2])
+
+    def fingerprint(self, contracts: list) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        settings = {'roll': self.roll, 'roll_days': self.roll_days, 'adjustment': self.adjustment}
+        digest.update(json.dumps(settings, sort_keys=True).encode())
+        for symbol, path, expiry in contracts:
+            stat = os.stat(path)
+            digest.update(f'{symbol}:{expiry}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+        return digest.hexdigest()
+
+    # ------------------------------------------------------------------
+    # Stitching
+    # ------------------------------------------------------------------
+    def _read(self, path: str) -> pd.DataFrame:
+        columns = OHLC + ['volume'] + (['open_interest'] if self.roll == 'open_interest' else [])
+        df = pd.read_csv(path, parse_dates=['time'], index_col='time')
+        missing = [col for col in columns if col not in df.columns]
+        if missing:
+            raise ValueError(f"{path} has no {missing} column")
+        return df[columns].dropna().sort_index()
+
+    def _daily(self, df: pd.DataFrame) -> pd.Series:
+        """Daily volume, or last open interest, of one contract."""
+        if self.roll == 'volume':
+            return df['volume'].groupby(df.index.floor('D')).sum()
+        return df['open_interest'].groupby(df.index.floor('D')).last()
+
+    def _roll_times(self, frames: list, expiries: list) -> list:
+        """Start time of each contract after the first."""
+        days = pd.DatetimeIndex(np.unique(np.concatenate([df.index.floor('D').to_numpy() for df in frames])))
+        rolls = []
+        previous = days[0]
+        for i in range(len(frames) - 1):
+            front, back = frames[i], frames[i + 1]
+            latest = expiries[i].floor('D')
+            if self.roll == 'expiry':
+                position = days.searchsorted(latest) - self.roll_days
+                roll = days[max(position, 0)]
+            else:
+                table = pd.concat([self._daily(front), self._daily(back)], axis=1, keys=['front', 'back']).fillna(0)
+                crossed = table.index[(table['back'] > table['front']) & (table.index >= previous)]
+                if len(crossed):
+                    # Known at that day's close; effective from the next trading day.
+                    position = days.searchsorted(crossed[0], 'right')
+                    roll = days[position] if position < len(days) else latest
+                else:
+                    roll = latest
+            # Not after the front's expiry, nor before the next contract has bars.
+            roll = max(min(roll, latest), previous, back.index[0].floor('D'))
+            rolls.append(roll)
+            previous = roll
+        return rolls
+
+    def stitch(self, contracts: list = None):
+        """(continuous OHLCV frame, roll table) built from the contract files."""
+        contracts = contracts or self.contracts()
+        frames = [self._read(path) for _, path, _ in contracts]
+        rolls = self._roll_times(frames, [expiry for _, _, expiry in contracts])
+        bounds = [None] + rolls + [None]
+
+        segments, rows = [], []
+        for i, df in enumerate(frames):
+            times = df.index.to_numpy()
+            first = 0 if bounds[i] is None else times.searchsorted(bounds[i].to_datetime64())
+            stop = len(df) if bounds[i + 1] is None else times.searchsorted(bounds[i + 1].to_datetime64())
+            segments.append(df.iloc[first:stop][OHLC + ['volume']])
+            if i + 1 < len(frames):
+                # Compare both contracts on the old contract's last bar before the roll.
+                old = df['close'].iloc[max(stop - 1, 0)]
+                at = df.index[max(stop - 1, 0)]
+                nxt = frames[i + 1]
+                position = nxt.index.searchsorted(at, 'right') - 1
+                new = nxt['close'].iloc[position] if position >= 0 else nxt['open'].iloc[0]
+                rows.append({'roll_time': bounds[i + 1], 'from_contract': contracts[i][0],
+                             'to_contract': contracts[i + 1][0], 'compared_at': at,
+                             'from_close': float(old), 'to_close': float(new)})
+
+        rolls_table = pd.DataFrame(rows, columns=['roll_time', 'from_contract', 'to_contract', 'compared_at',
+                                                  'from_close', 'to_close'])
+        gaps = (rolls_table['to_close'] - rolls_table['from_close']).to_numpy(dtype=float)
+        ratios = (rolls_table['to_close'] / rolls_table['from_close']).to_numpy(dtype=float)
+        # Adjustment of each segment: everything from the rolls after it.
+        offsets = np.r_[np.cumsum(gaps[::-1])[::-1], 0.0]
+        factors = np.r_[np.cumprod(ratios[::-1])[::-1], 1.0]
+        rolls_table['gap'] = gaps
+        rolls_table['ratio'] = ratios
+
+        segment = np.repeat(np.arange(len(segments)), [len(s) for s in segments])
+        stitched = pd.concat(segments)
+        prices = stitched[OHLC].to_numpy(dtype=float)
+        if self.adjustment == 'back':
+            prices = prices + offsets[segment][:, None]
+        elif self.adjustment == 'ratio':
+            prices = prices * factors[segment][:, None]
+        stitched[OHLC] = prices
+        return stitched, rolls_table
+
+    # ------------------------------------------------------------------
+    # Cache
+    # ------------------------------------------------------------------
+    def build(self, force: bool = False) -> pd.DataFrame:
+        """Stitch (or reuse the cached series) and return the roll table."""
+        contracts = self.contracts()
+        fingerprint = self.fingerprint(contracts)
+        store = self.loader.store
+        if not force and store.exists(self.series):
+            source = store.read_meta(self.series).get('source', {})
+            if source.get('fingerprint') == fingerprint:
+                return self._rolls_from_meta(source)
+
+        stitched, rolls = self.stitch(contracts)
+        records = json.loads(rolls.to_json(orient='records', date_format='iso'))
+        store.write(self.series, stitched, source={
+            'fingerprint': fingerprint,
+            'contracts': [symbol for symbol, _, _ in contracts],
+            'rolls': records,
+        })
+        print(f"ContinuousContract: stitched {len(contracts)} contracts into {self.series} "
+              f"({len(stitched)} bars, {len(rolls)} rolls)")
+        return rolls
+
+    def roll_table(self) -> pd.DataFrame:
+        """Roll table of the cached series."""
+        return self._rolls_from_meta(self.loader.store.read_meta(self.series).get('source', {}))
+
+    @staticmethod
+    def _rolls_from_meta(source: dict) -> pd.DataFrame:
+        rolls = pd.DataFrame(source.get('rolls', []))
+        for col in ('roll_time', 'compared_at'):
+            if col in rolls:
+                rolls[col] = pd.to_datetime(rolls[col])
+        return rolls
+
+
+def continuous_file_map(loader: DataLoader, config: dict, file_map: dict) -> dict:
+    """
+    file_map with every file listed in the "continuous" section of
+    config.json replaced by its stitched series (built or reused from the
+    cache). Returns file_map unchanged when the section is not enabled.
+    """
+    cfg = config.get('continuous', {})
+    if not cfg.get('enabled', False):
+        return file_map
+    mapped = dict(file_map)
+    for tf, file_name in file_map.items():
+        pattern = cfg.get('contracts', {}).get(file_name)
+        if pattern is None:
+            continue
+        builder = ContinuousContract(loader, file_name, pattern, roll=cfg.get('roll', 'volume'),
+                                     roll_days=cfg.get('roll_days', 8),
+                                     adjustment=cfg.get('adjustment', 'back'),
+                                     expiries=cfg.get('expiries'))
+        builder.build()
+        mapped[tf] = builder.file_name
+    return mapped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stitch per-expiry files into a continuous contract.")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--data-path', default='./data')
+    parser.add_argument('--name', default='MES_1_min.csv', help="Series the stitched bars replace")
+    parser.add_argument('--pattern', default=None, help="Glob of the contract files (default: from config)")
+    parser.add_argument('--roll', choices=['volume', 'open_interest', 'expiry'], default=None)
+    parser.add_argument('--roll-days', type=int, default=None)
+    parser.add_argument('--adjustment', choices=['back', 'ratio', 'none'], default=None)
+    parser.add_argument('--force', action='store_true', help="Rebuild even if the cache is current")
+    args = parser.parse_args(argv)
+
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config, 'r') as f:
+            config = json.load(f)
+    cfg = config.get('continuous', {})
+    pattern = args.pattern or cfg.get('contracts', {}).get(args.name)
+    if pattern is None:
+        parser.error(f"no --pattern given and no continuous.contracts entry for {args.name}")
+
+    storage = config.get('backtest', {}).get('storage', 'csv')
+    loader = DataLoader(data_path=args.data_path, storage='auto' if storage == 'csv' else storage)
+    builder = ContinuousContract(loader, args.name, pattern,
+                                 roll=args.roll or cfg.get('roll', 'volume'),
+                                 roll_days=args.roll_days or cfg.get('roll_days', 8),
+                                 adjustment=args.adjustment or cfg.get('adjustment', 'back'),
+                                 expiries=cfg.get('expiries'))
+    rolls = builder.build(force=args.force)
+    print(rolls.to_string(index=False) if len(rolls) else "No rolls")
+    print(f"Stitched series: {builder.file_name} in {loader.store.root}")
+
+
+if __name__ == "__main__":
+    main()
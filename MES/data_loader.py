@@ -1,21 +1,74 @@
+import argparse
+import hashlib
 import pandas as pd
 import os
 
+from columnar_store import ColumnarStore, time_range_rows
+from tick_aggregator import aggregate_ticks_to_store
+
 class DataLoader:
     """
     Reads historical market data (from CSV in this example) for multiple
     timeframes (1m, 5m, 30m, 1h).
+
+    With storage='auto' (or 'columnar'), each CSV is converted once into a
+    ColumnarStore under <data_path>/columnar and later loads read the
+    memory-mapped columns instead of parsing the CSV again.
     """
-    def __init__(self, data_path: str = '.'):
+    def __init__(self, data_path: str = '.', storage: str = 'csv', store_path: str = None,
+                 import_chunk_rows: int = None):
+        """
+        :param storage: 'csv' always parses the CSV files.
+                        'auto' reads the columnar copy when it is up to date with
+                        the CSV, and (re)imports the CSV otherwise.
+                        'columnar' reads the columnar copy only.
+        :param store_path: Where columnar copies live (default <data_path>/columnar).
+        :param import_chunk_rows: Import CSVs into the columnar store this many
+                                  rows at a time instead of parsing them whole.
+        """
+        if storage not in ('csv', 'auto', 'columnar'):
+            raise ValueError(f"Unknown storage mode: {storage}")
         self.data_path = data_path
+        self.storage = storage
+        self.import_chunk_rows = import_chunk_rows
+        self.store = ColumnarStore(store_path or os.path.join(data_path, 'columnar'))
 
-    def load_data(self, file_name: str) -> pd.DataFrame:
+    def load_data(self, file_name: str, start=None, end=None) -> pd.DataFrame:
         """
         Load CSV data containing at least columns:
         ['time', 'open', 'high', 'low', 'close', 'volume'].
         The 'time' column should be parseable as a datetime.
+        Only rows with start <= time < end are returned (None = open-ended).
         """
         csv_path = os.path.join(self.data_path, file_name)
+        name = self.series_name(file_name)
+
+        if not os.path.exists(csv_path) and self.store.exists(name):
+            # Series that only exist in the store, such as stitched continuous contracts.
+            df = self.store.load(name, start, end)
+            fingerprint = self.store.read_meta(name).get('source', {}).get('fingerprint')
+            if fingerprint:
+                df.attrs['source_fingerprint'] = fingerprint
+            return df
+        if self.storage == 'columnar' or (self.storage == 'auto' and self.is_imported(file_name)):
+            if not self.store.exists(name):
+                raise FileNotFoundError(f"{file_name} has not been imported into {self.store.root}; "
+                                        f"run: python data_loader.py {file_name}")
+            df = self.store.load(name, start, end)
+        elif self.storage == 'auto':
+            self.import_to_columnar(file_name)
+            df = self.store.load(name, start, end)
+        else:
+            df = self._read_csv(csv_path)
+            first, stop = time_range_rows(df.index.to_numpy(), start, end)
+            df = df.iloc[first:stop]
+
+        # Lets IndicatorCache key cached columns on the source file.
+        if os.path.exists(csv_path):
+            df.attrs['source_file'] = csv_path
+        return df
+
+    def _read_csv(self, csv_path: str) -> pd.DataFrame:
         df = pd.read_csv(csv_path, parse_dates=['time'], index_col='time')
         df = df.sort_index()
         # Ensure columns are in the correct order; fill missing with 0 or ffill if needed
@@ -23,7 +76,127 @@ class DataLoader:
         df.dropna(inplace=True)
         return df
 
-    def load_all_timeframes(self, file_map: dict) -> dict:
+    @staticmethod
+    def series_name(file_name: str) -> str:
+        return os.path.splitext(os.path.basename(file_name))[0]
+
+    @staticmethod
+    def _tail_digest(csv_path: str, size: int) -> str:
+        """Hash of the last 4 KB before byte `size`, to recognise an appended file."""
+        with open(csv_path, 'rb') as f:
+            f.seek(max(0, size - 4096))
+            return hashlib.sha1(f.read(min(size, 4096))).hexdigest()
+
+    @classmethod
+    def _source_info(cls, csv_path: str) -> dict:
+        stat = os.stat(csv_path)
+        return {'file': os.path.basename(csv_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                'tail': cls._tail_digest(csv_path, stat.st_size)}
+
+    def is_imported(self, file_name: str) -> bool:
+        """True if the columnar copy exists and matches the CSV's size and mtime."""
+        name = self.series_name(file_name)
+        if not self.store.exists(name):
+            return False
+        csv_path = os.path.join(self.data_path, file_name)
+        if not os.path.exists(csv_path):
+            return True
+        return self.store.read_meta(name).get('source') == self._source_info(csv_path)
+
+    def import_to_columnar(self, file_name: str):
+        """
+        One-time conversion of a CSV file into the columnar store. With
+        import_chunk_rows set, the CSV is streamed into the store in chunks;
+        a file that turns out not to be sorted by time is re-imported whole.
+        A CSV that only had rows appended since its last import has just the
+        new rows added to the columnar copy.
+        """
+        csv_path = os.path.join(self.data_path, file_name)
+        name = self.series_name(file_name)
+        rows = self._import_appended(csv_path, name)
+        if rows is not None:
+            print(f"DataLoader: appended {rows} new rows of {file_name} to {self.store.root}")
+            return
+        if self.import_chunk_rows:
+            try:
+                rows = self._import_chunked(csv_path, name)
+            except ValueError:
+                rows = None
+            if rows is not None:
+                print(f"DataLoader: imported {file_name} ({rows} rows) into {self.store.root}")
+                return
+        df = self._read_csv(csv_path)
+        self.store.write(name, df, source=self._source_info(csv_path))
+        print(f"DataLoader: imported {file_name} ({len(df)} rows) into {self.store.root}")
+
+    def _import_chunked(self, csv_path: str, name: str) -> int:
+        """Stream a time-sorted CSV into the store; raises ValueError if it is not sorted."""
+        rows = 0
+        reader = pd.read_csv(csv_path, parse_dates=['time'], index_col='time', chunksize=self.import_chunk_rows)
+        for i, chunk in enumerate(reader):
+            chunk = chunk[['open', 'high', 'low', 'close', 'volume']].dropna()
+            if not chunk.index.is_monotonic_increasing:
+                raise ValueError(f"{csv_path} is not sorted by time")
+            if i == 0:
+                self.store.write(name, chunk)   # source is recorded once the import is complete
+            else:
+                self.store.append(name, chunk)
+            rows += len(chunk)
+        if rows == 0:
+            raise ValueError(f"{csv_path} has no rows")
+        self.store.set_source(name, self._source_info(csv_path))
+        return rows
+
+    def _import_appended(self, csv_path: str, name: str):
+        """
+        Append the rows written to the CSV after its last import, or return
+        None if the file does not look appended to (it did not grow, or the
+        last 4 KB before the old end changed) and has to be re-imported whole.
+        """
+        if not self.store.exists(name):
+            return None
+        old = self.store.read_meta(name).get('source', {})
+        size = os.path.getsize(csv_path)
+        if not old.get('tail') or size <= old.get('size', 0):
+            return None
+        if self._tail_digest(csv_path, old['size']) != old['tail']:
+            return None
+        with open(csv_path, 'rb') as f:
+            header = f.readline().decode().strip().split(',')
+            f.seek(old['size'] - 1)
+            if f.read(1) != b'\n':
+                return None   # the last old row was incomplete
+            try:
+                df = pd.read_csv(f, header=None, names=header, parse_dates=['time'], index_col='time')
+                df = df[['open', 'high', 'low', 'close', 'volume']].dropna()
+                if not df.index.is_monotonic_increasing:
+                    return None
+                self.store.append(name, df, source=self._source_info(csv_path))
+            except ValueError:
+                return None
+        return len(df)
+
+    def import_ticks(self, tick_file: str, bars: dict, chunk_rows: int = 1_000_000, **reader_options) -> dict:
+        """
+        Build bar series from a tick file (time, price, size) under data_path,
+        streamed chunk_rows ticks at a time, e.g.
+        bars={'MES_1_min.csv': '1m', 'MES_vol500.csv': 'volume:500'}.
+        Afterwards load_data(file) reads those bars from the columnar store.
+        """
+        return aggregate_ticks_to_store(os.path.join(self.data_path, tick_file), bars, self.store,
+                                        chunk_rows=chunk_rows, **reader_options)
+
+    def time_bounds(self, file_name: str):
+        """(first, last) bar time of a file, read from its columnar copy (imported if needed)."""
+        name = self.series_name(file_name)
+        if not self.is_imported(file_name):
+            self.import_to_columnar(file_name)
+        times = self.store.open(name)['time']
+        if len(times) == 0:
+            return None, None
+        return pd.Timestamp(times[0]), pd.Timestamp(times[-1])
+
+    def load_all_timeframes(self, file_map: dict, start=None, end=None) -> dict:
         {
             '1m': 'MES_1_min.csv',
             '5m': 'MES_5_mins.csv',
@@ -32,6 +205,16 @@ class DataLoader:
         }
         dataframes = {}
         for tf, file_name in file_map.items():
-            df = self.load_data(file_name)
+            df = self.load_data(file_name, start, end)
             dataframes[tf] = df
         return dataframes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert bar CSV files into the columnar store.")
+    parser.add_argument('files', nargs='+', help="CSV file names inside --data-path")
+    parser.add_argument('--data-path', default='./data')
+    args = parser.parse_args()
+
+    loader = DataLoader(data_path=args.data_path)
+    for file_name in args.files:
+        loader.import_to_columnar(file_name)
@@ -32,3 +32,18 @@ class EntryManager:
             print(f"EntryManager ({timeframe}): Entry signal detected -> {signal}")
         self.last_signal = signal
         return signal
+
+    def rule(self, timeframe: str = '5m', ema: str = 'EMA_medium') -> dict:
+        """
+        evaluate_entry's RSI oversold/overbought rule in the RulePlan format,
+        on one timeframe's merged columns (RSI_<tf>, <ema>_<tf>) and the bar close.
+        """
+        rsi = f'RSI_{timeframe}'
+        ema_col = f'{ema}_{timeframe}'
+        return {
+            'name': f'rsi_reversal_{timeframe}',
+            'long': {'all': [[rsi, '<', self.rsi_oversold], ['close', '>', ema_col]]},
+            'short': {'all': [[rsi, '>', self.rsi_overbought], ['close', '<', ema_col]]},
+            'long_reason': f'RSI oversold and price > EMA on {timeframe}',
+            'short_reason': f'RSI overbought and price < EMA on {timeframe}',
+        }
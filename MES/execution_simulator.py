@@ -1,5 +1,9 @@
 # File: C:\cygwin64\home\student\Test_Strategies\MES\execution_simulator.py
 
+import numpy as np
+
+from trade_ledger import Position, TradeLedger
+
 class ExecutionSimulator:
     """
     Simulates trade execution in a backtest environment.
@@ -11,13 +15,16 @@ class ExecutionSimulator:
                  target_offset: float = 5.0,
                  default_quantity: int = 1,
                  enable_trailing_stop: bool = False,
-                 trailing_stop_offset: float = 2.0):
+                 trailing_stop_offset: float = 2.0,
+                 log_mode: str = 'print'):
         """
         :param stop_offset: How many points below entry to set the initial stop-loss (for a LONG).
         :param target_offset: How many points above entry to set the take-profit (for a LONG).
         :param default_quantity: Number of contracts/shares traded per signal.
         :param enable_trailing_stop: Whether to use trailing-stop logic.
         :param trailing_stop_offset: Points behind the best favorable price for a trailing stop.
+        :param log_mode: 'print' prints every open/close, 'buffer' keeps the
+                         messages in self.log (see flush_log), 'quiet' drops them.
         """
         self.stop_offset = stop_offset
         self.target_offset = target_offset
@@ -26,18 +33,43 @@ class ExecutionSimulator:
         self.enable_trailing_stop = enable_trailing_stop
         self.trailing_stop_offset = trailing_stop_offset
 
-        # Track any currently open position (dict or None).
+        if log_mode not in ('print', 'buffer', 'quiet'):
+            raise ValueError(f"Unknown log mode: {log_mode}")
+        self.log_mode = log_mode
+        self.log = []
+
+        # Track any currently open position (Position or None).
         self.open_position = None
 
-        # Keep a list of completed trades (dicts).
-        self.trades = []
+        # Completed trades, column-wise.
+        self.ledger = TradeLedger()
+        self._trade_records = []
+
+    @property
+    def trades(self):
+        """Completed trades as a list of dicts (compatibility view of the ledger)."""
+        if len(self._trade_records) != len(self.ledger):
+            self._trade_records = self.ledger.to_records()
+        return self._trade_records
+
+    def _log(self, message: str):
+        if self.log_mode == 'print':
+            print(message)
+        elif self.log_mode == 'buffer':
+            self.log.append(message)
+
+    def flush_log(self):
+        """Print and clear the buffered open/close messages."""
+        if self.log:
+            print('\n'.join(self.log))
+            self.log = []
 
     def process_signal(self, signal: dict, data_point: dict):
         """
         Processes a trading signal (LONG, SHORT, or EXIT).
         If LONG/SHORT, opens a position if none is open.
         If EXIT, closes the open position if it matches the position_type.
-        Returns the position or trade dict, or None.
+        Returns the opened Position or the closed trade dict, or None.
         """
         signal_type = signal.get('type')
         time_ = data_point.get('time')
@@ -46,40 +78,34 @@ class ExecutionSimulator:
         if signal_type in ['LONG', 'SHORT']:
             # Only open a new position if none is currently open.
             if self.open_position is None:
-                self.open_position = {
-                    'type': signal_type,
-                    'entry_price': close_price,
-                    'entry_time': time_,
-                    'quantity': self.default_quantity,
-                    'reason': signal.get('reason', ''),
-
-                    # For trailing stop logic:
-                    # Track the best favorable price since entry (for LONG: highest high; for SHORT: lowest low).
-                    'best_price': close_price
-                }
-                print(f"ExecutionSimulator: Opened {signal_type} at {close_price} on {time_} for qty={self.default_quantity}")
+                self.open_position = Position(signal_type, close_price, time_,
+                                              self.default_quantity, signal.get('reason', ''))
+                if self.log_mode != 'quiet':
+                    self._log(f"ExecutionSimulator: Opened {signal_type} at {close_price} on {time_} for qty={self.default_quantity}")
                 return self.open_position
 
         elif signal_type == 'EXIT':
             # Close the position if it matches the signal's position_type
-            if (self.open_position is not None and
-                self.open_position['type'] == signal.get('position_type')):
-                
-                exit_price = signal.get('exit_price', close_price)
-                trade = {
-                    'position_type': self.open_position['type'],
-                    'entry_price': self.open_position['entry_price'],
-                    'exit_price': exit_price,
-                    'entry_time': self.open_position['entry_time'],
-                    'exit_time': time_,
-                    'quantity': self.open_position['quantity'],
-                    'reason': signal.get('reason', '')
-                }
-                self.trades.append(trade)
-                print(f"ExecutionSimulator: Closed {trade['position_type']} at {exit_price} on {time_}, reason={trade['reason']}")
+            position = self.open_position
+            if position is not None and position.type == signal.get('position_type'):
+                position.exit_price = signal.get('exit_price', close_price)
+                position.exit_time = time_
+                position.exit_reason = signal.get('reason', '')
+                self.ledger.append(position.type, position.entry_price, position.exit_price,
+                                   position.entry_time, time_, position.quantity, position.exit_reason)
+                if self.log_mode != 'quiet':
+                    self._log(f"ExecutionSimulator: Closed {position.type} at {position.exit_price} on {time_}, reason={position.exit_reason}")
 
                 self.open_position = None
-                return trade
+                return {
+                    'position_type': position.type,
+                    'entry_price': position.entry_price,
+                    'exit_price': position.exit_price,
+                    'entry_time': position.entry_time,
+                    'exit_time': time_,
+                    'quantity': position.quantity,
+                    'reason': position.exit_reason
+                }
 
         return None  # No action if conditions not met
 
@@ -97,26 +123,37 @@ class ExecutionSimulator:
 
         bar_high = data_point.get('high', 0.0)
         bar_low = data_point.get('low', 0.0)
-        close_price = data_point.get('close', 0.0)
-        position_type = self.open_position['type']
-        entry_price = self.open_position['entry_price']
+        return self.check_exit_levels(bar_high, bar_low)
+
+    def check_exit_levels(self, bar_high: float, bar_low: float):
+        """
+        Same checks as check_stop_loss_or_profit_target, but takes the bar's
+        high/low as plain floats so array-based loops don't have to build a
+        dict per bar.
+        """
+        if not self.open_position:
+            return None
+
+        position = self.open_position
+        position_type = position.type
+        entry_price = position.entry_price
         
         # 1) Update best favorable price if trailing stop is enabled
         if self.enable_trailing_stop:
             if position_type == 'LONG':
                 # If the current bar's high is above the previous best_price, update
-                if bar_high > self.open_position['best_price']:
-                    self.open_position['best_price'] = bar_high
+                if bar_high > position.best_price:
+                    position.best_price = bar_high
             else:  # SHORT
                 # If current bar's low is below the previous best_price, update
-                if bar_low < self.open_position['best_price']:
-                    self.open_position['best_price'] = bar_low
+                if bar_low < position.best_price:
+                    position.best_price = bar_low
 
         # 2) Compute potential stop-loss levels
         if position_type == 'LONG':
             # A) If trailing is enabled, trailing_stop is best_price - trailing_stop_offset
             if self.enable_trailing_stop:
-                trailing_stop_price = self.open_position['best_price'] - self.trailing_stop_offset
+                trailing_stop_price = position.best_price - self.trailing_stop_offset
             else:
                 trailing_stop_price = entry_price - self.stop_offset
 
@@ -138,7 +175,7 @@ class ExecutionSimulator:
 
         else:  # SHORT
             if self.enable_trailing_stop:
-                trailing_stop_price = self.open_position['best_price'] + self.trailing_stop_offset
+                trailing_stop_price = position.best_price + self.trailing_stop_offset
             else:
                 trailing_stop_price = entry_price + self.stop_offset
 
@@ -157,10 +194,64 @@ class ExecutionSimulator:
 
         return None  # No stop or target triggered
 
+    def check_exit_path(self, highs, lows):
+        """
+        Vectorized check_exit_levels over consecutive bars (or 1m sub-bars) in
+        time order. Each bar first updates best_price (trailing stop), then is
+        checked for the stop and then the target, exactly like the per-bar check.
+
+        Returns (index, exit_info) for the first bar that exits. If none does,
+        best_price is advanced through the whole path and None is returned.
+        """
+        if not self.open_position or len(highs) == 0:
+            return None
+
+        position = self.open_position
+        position_type = position.type
+        entry_price = position.entry_price
+
+        if position_type == 'LONG':
+            if self.enable_trailing_stop:
+                best = np.fmax.accumulate(np.fmax(highs, position.best_price))
+                stop = best - self.trailing_stop_offset
+            else:
+                stop = entry_price - self.stop_offset
+            take_profit = entry_price + self.target_offset
+            stop_hit = lows <= stop
+            target_hit = highs >= take_profit
+        else:  # SHORT
+            if self.enable_trailing_stop:
+                best = np.fmin.accumulate(np.fmin(lows, position.best_price))
+                stop = best + self.trailing_stop_offset
+            else:
+                stop = entry_price + self.stop_offset
+            take_profit = entry_price - self.target_offset
+            stop_hit = highs >= stop
+            target_hit = lows <= take_profit
+
+        hits = np.flatnonzero(stop_hit | target_hit)
+        if len(hits) == 0:
+            if self.enable_trailing_stop:
+                position.best_price = best[-1]
+            return None
+
+        k = hits[0]
+        if self.enable_trailing_stop:
+            position.best_price = best[k]
+        if stop_hit[k]:
+            return k, {
+                'exit_price': stop[k] if self.enable_trailing_stop else stop,
+                'reason': 'StopLoss hit (trailing)' if self.enable_trailing_stop else 'StopLoss hit'
+            }
+        return k, {
+            'exit_price': take_profit,
+            'reason': 'TakeProfit hit'
+        }
+
     def get_open_position(self):
-        """Return the currently open position dict or None."""
+        """Return the currently open Position or None."""
         return self.open_position
 
     def get_closed_trades(self):
-        """Return a list of all completed trades."""
+        """Return a list of all completed trades (dicts)."""
         return self.trades
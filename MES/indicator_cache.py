@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+
+
+class IndicatorCache:
+    """
+    Content-addressed on-disk cache for indicator columns.
+
+    Each entry is keyed on the fingerprint of the source data, the indicator
+    name and its parameters, and stored as one .npy file per output column.
+    Hits are loaded memory-mapped. The cache is size-bounded: when it grows
+    past max_bytes, the least recently used entries are removed.
+    """
+
+    def __init__(self, cache_dir: str = './cache/indicators', max_bytes: int = 2 * 1024 ** 3):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(cache_dir, 'entries'), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, 'fingerprints'), exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Fingerprints
+    # ------------------------------------------------------------------
+    def file_fingerprint(self, path: str) -> str:
+        """
+        Hash of the file contents. The digest is remembered together with the
+        file's size and mtime, so unchanged files are not hashed again.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        memo_path = os.path.join(self.cache_dir, 'fingerprints',
+                                 hashlib.sha1(path.encode()).hexdigest() + '.json')
+        if os.path.exists(memo_path):
+            with open(memo_path, 'r') as f:
+                memo = json.load(f)
+            if memo['size'] == stat.st_size and memo['mtime_ns'] == stat.st_mtime_ns:
+                return memo['digest']
+
+        digest = hashlib.blake2b(digest_size=16)
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        memo = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': digest.hexdigest()}
+        self._write_json(memo_path, memo)
+        return memo['digest']
+
+    def frame_fingerprint(self, df: pd.DataFrame) -> str:
+        """
+        Fingerprint of the rows in `df`.
+
+        Uses df.attrs['source_fingerprint'] or the file named in
+        df.attrs['source_file'] (set by DataLoader) when present, and hashes the
+        frame contents otherwise. The row count, first/last timestamp and a
+        checksum of the close column are always mixed in, so a date-range slice
+        of a file does not share entries with the full file.
+        """
+        base = df.attrs.get('source_fingerprint')
+        if base is None and df.attrs.get('source_file'):
+            base = self.file_fingerprint(df.attrs['source_file'])
+        if base is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(np.ascontiguousarray(df.index.to_numpy()).view(np.uint8))
+            for col in ('open', 'high', 'low', 'close', 'volume'):
+                if col in df.columns:
+                    digest.update(np.ascontiguousarray(df[col].to_numpy()).view(np.uint8))
+            base = digest.hexdigest()
+
+        if len(df) == 0:
+            return f'{base}:0'
+        close_sum = float(df['close'].sum())
+        return f'{base}:{len(df)}:{df.index[0]}:{df.index[-1]}:{close_sum!r}'
+
+    # ------------------------------------------------------------------
+    # Entries
+    # ------------------------------------------------------------------
+    @staticmethod
+    def entry_key(fingerprint: str, name: str, params: dict) -> str:
+        payload = json.dumps({'fingerprint': fingerprint, 'name': name, 'params': params},
+                             sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, 'entries', key)
+
+    def get(self, fingerprint: str, name: str, params: dict):
+        """Return the cached columns as a list of memory-mapped arrays, or None."""
+        entry_dir = self._entry_dir(self.entry_key(fingerprint, name, params))
+        meta_path = os.path.join(entry_dir, 'meta.json')
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            columns = [np.load(os.path.join(entry_dir, f'{i}.npy'), mmap_mode='r')
+                       for i in range(meta['n_columns'])]
+        except (OSError, ValueError, KeyError):
+            return None
+        # Bump the entry's recency for LRU eviction.
+        os.utime(meta_path)
+        return columns
+
+    def put(self, fingerprint: str, name: str, params: dict, columns: list):
+        """Store a list of equally long 1-D arrays under (fingerprint, name, params)."""
+        key = self.entry_key(fingerprint, name, params)
+        entry_dir = self._entry_dir(key)
+        if os.path.exists(entry_dir):
+            return
+
+        # Write into a private directory and rename it into place, so readers
+        # in other processes never see a half-written entry.
+        tmp_dir = os.path.join(self.cache_dir, 'entries', f'.tmp-{uuid.uuid4().hex}')
+        os.makedirs(tmp_dir)
+        size = 0
+        for i, column in enumerate(columns):
+            column = np.ascontiguousarray(column)
+            np.save(os.path.join(tmp_dir, f'{i}.npy'), column)
+            size += column.nbytes
+        meta = {'fingerprint': fingerprint, 'name': name, 'params': params,
+                'n_columns': len(columns), 'bytes': size}
+        self._write_json(os.path.join(tmp_dir, 'meta.json'), meta)
+        try:
+            os.rename(tmp_dir, entry_dir)
+        except OSError:
+            # Another process stored the same entry first.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        self.evict()
+
+    def entries(self) -> list:
+        """List of (key, meta, last_used) for every complete entry."""
+        result = []
+        root = os.path.join(self.cache_dir, 'entries')
+        for key in os.listdir(root):
+            meta_path = os.path.join(root, key, 'meta.json')
+            if key.startswith('.') or not os.path.exists(meta_path):
+                continue
+            try:
+                with open(meta_path, 'r') as f:
+                    meta = json.load(f)
+                result.append((key, meta, os.stat(meta_path).st_mtime))
+            except (OSError, ValueError):
+                continue
+        return result
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        total = sum(meta['bytes'] for _, meta, _ in entries)
+        for key, meta, _ in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            total -= meta['bytes']
+
+    def invalidate(self, fingerprint: str = None, name: str = None) -> int:
+        """
+        Remove entries matching the given fingerprint prefix and/or indicator
+        name (both None clears the whole cache). Returns the number removed.
+        """
+        removed = 0
+        for key, meta, _ in self.entries():
+            if fingerprint is not None and not meta['fingerprint'].startswith(fingerprint):
+                continue
+            if name is not None and meta['name'] != name:
+                continue
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            removed += 1
+        return removed
+
+    def invalidate_file(self, path: str) -> int:
+        """Remove every entry computed from the given data file (or a slice of it)."""
+        return self.invalidate(fingerprint=self.file_fingerprint(path))
+
+    @staticmethod
+    def _write_json(path: str, data: dict):
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
@@ -8,9 +8,10 @@ class IndicatorCalculator:
     Computes technical indicators such as EMA, RSI, ATR, MACD, Stochastic, etc.
     """
 
-    def __init__(self):
+    def __init__(self, cache=None):
         # You can store default periods here or pass them in methods below
-        pass
+        # Optional IndicatorCache; when set, add_indicators reuses stored columns.
+        self.cache = cache
 
     def compute_ema(self, df: pd.DataFrame, span: int) -> pd.Series:
         return df['close'].ewm(span=span, adjust=False).mean()
@@ -71,29 +72,53 @@ class IndicatorCalculator:
     ) -> pd.DataFrame:
         """
         Add multiple indicators to the DataFrame.
+        If the calculator has a cache, each indicator is looked up by the
+        frame's fingerprint and parameters before it is computed.
         """
+        fingerprint = self.cache.frame_fingerprint(df) if self.cache is not None else None
+
         # Short EMA
-        df['EMA_short'] = self.compute_ema(df, short_ema_period)
+        df['EMA_short'], = self._cached(fingerprint, 'EMA', {'span': short_ema_period},
+                                        lambda: (self.compute_ema(df, short_ema_period),))
 
         # Medium EMA
-        df['EMA_medium'] = self.compute_ema(df, medium_ema_period)
+        df['EMA_medium'], = self._cached(fingerprint, 'EMA', {'span': medium_ema_period},
+                                         lambda: (self.compute_ema(df, medium_ema_period),))
 
         # RSI
-        df['RSI'] = self.compute_rsi(df, rsi_period)
+        df['RSI'], = self._cached(fingerprint, 'RSI', {'period': rsi_period},
+                                  lambda: (self.compute_rsi(df, rsi_period),))
 
         # ATR
-        df['ATR'] = self.compute_atr(df, atr_period)
+        df['ATR'], = self._cached(fingerprint, 'ATR', {'period': atr_period},
+                                  lambda: (self.compute_atr(df, atr_period),))
 
         # Optional MACD
         if compute_macd:
-            macd_line, macd_signal = self.compute_macd(df)
+            macd_line, macd_signal = self._cached(fingerprint, 'MACD',
+                                                  {'fast': 12, 'slow': 26, 'signal': 9},
+                                                  lambda: self.compute_macd(df))
             df['MACD'] = macd_line
             df['MACD_signal'] = macd_signal
 
         # Optional Stochastic
         if compute_stoch:
-            stoch_k, stoch_d = self.compute_stochastic(df)
+            stoch_k, stoch_d = self._cached(fingerprint, 'Stoch', {'k_period': 14, 'd_period': 3},
+                                            lambda: self.compute_stochastic(df))
             df['StochK'] = stoch_k
             df['StochD'] = stoch_d
 
         return df
+
+    def _cached(self, fingerprint, name, params, compute):
+        """
+        Return the output columns of one indicator, from the cache when possible.
+        `compute` returns a tuple of Series; cache hits are memory-mapped arrays.
+        """
+        if self.cache is None:
+            return compute()
+        columns = self.cache.get(fingerprint, name, params)
+        if columns is None:
+            columns = compute()
+            self.cache.put(fingerprint, name, params, [np.asarray(c) for c in columns])
+        return columns
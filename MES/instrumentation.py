@@ -0,0 +1,192 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+from contextlib import nullcontext
+
+
+class _Timer:
+    """Context manager form of Instrumentation.wrap for a block of code."""
+
+    __slots__ = ('owner', 'name', 'start')
+
+    def __init__(self, owner, name):
+        self.owner = owner
+        self.name = name
+
+    def __enter__(self):
+        self.start = self.owner._push(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.owner._pop(self.name, self.start)
+        return False
+
+
+class Instrumentation:
+    """
+    Named timers and counters for finding where a run spends its time.
+
+    Disabled by default. While disabled, timer() returns a shared no-op
+    context, count() returns straight away, and wrap()/instrument() hand
+    back the original callables, so hot loops pay nothing for the hooks.
+    Enable before building the pipeline objects:
+
+        PROFILER.enable()
+        with PROFILER.timer('load'):
+            ...
+        simulator = PROFILER.instrument(simulator, ['process_signal'])
+
+    Timers nest: each call is charged to its name (total time, calls, max)
+    and its self time to the stack path of enclosing timers, which is what
+    the folded (flamegraph) report is built from. Optionally the whole run
+    is also recorded with cProfile.
+    """
+
+    _NULL = nullcontext()
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.timers = {}
+        self.counters = {}
+        self.folded = {}
+        self._stack = []
+        self._child_ns = []
+        self._profile = None
+        self._started = None
+        self._wall = None
+
+    def enable(self, cprofile: bool = False):
+        self.reset()
+        self.enabled = True
+        self._started = time.perf_counter()
+        if cprofile:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def disable(self):
+        if self._profile is not None:
+            self._profile.disable()
+        if self.enabled:
+            self._wall = time.perf_counter() - self._started
+        self.enabled = False
+
+    # -- recording ---------------------------------------------------------
+
+    def timer(self, name: str):
+        if not self.enabled:
+            return self._NULL
+        return _Timer(self, name)
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def wrap(self, name: str, func):
+        """Timed version of func (or func itself while disabled)."""
+        if not self.enabled:
+            return func
+        push, pop = self._push, self._pop
+
+        def timed(*args, **kwargs):
+            start = push(name)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                pop(name, start)
+
+        timed.__wrapped__ = func
+        return timed
+
+    def instrument(self, obj, methods, prefix: str = None):
+        """
+        Replace the given bound methods on obj (the instance only) with timed
+        versions named '<prefix>.<method>', prefix defaulting to the class
+        name. Returns obj.
+        """
+        if self.enabled:
+            prefix = prefix or type(obj).__name__
+            for method in methods:
+                setattr(obj, method, self.wrap(f'{prefix}.{method}', getattr(obj, method)))
+        return obj
+
+    def _push(self, name: str) -> int:
+        self._stack.append(name)
+        self._child_ns.append(0)
+        return time.perf_counter_ns()
+
+    def _pop(self, name: str, start: int):
+        elapsed = time.perf_counter_ns() - start
+        path = ';'.join(self._stack)
+        self.folded[path] = self.folded.get(path, 0) + elapsed - self._child_ns.pop()
+        self._stack.pop()
+        if self._child_ns:
+            self._child_ns[-1] += elapsed
+
+        stats = self.timers.get(name)
+        if stats is None:
+            stats = self.timers[name] = [0, 0, 0]   # calls, total_ns, max_ns
+        stats[0] += 1
+        stats[1] += elapsed
+        if elapsed > stats[2]:
+            stats[2] = elapsed
+
+    # -- reporting ---------------------------------------------------------
+
+    def report(self, top: int = 30) -> dict:
+        if self._wall is not None:
+            wall = self._wall
+        else:
+            wall = time.perf_counter() - self._started if self._started is not None else 0.0
+        timers = {}
+        for name, (calls, total_ns, max_ns) in sorted(self.timers.items(), key=lambda kv: -kv[1][1]):
+            timers[name] = {
+                'calls': calls,
+                'total_s': total_ns / 1e9,
+                'mean_us': total_ns / calls / 1000,
+                'max_us': max_ns / 1000,
+                'share': total_ns / 1e9 / wall if wall else None,
+            }
+        report = {'wall_seconds': wall, 'timers': timers, 'counters': dict(self.counters)}
+        if self._profile is not None:
+            report['cprofile_top'] = self._cprofile_top(top)
+        return report
+
+    def _cprofile_top(self, top: int) -> list:
+        stats = pstats.Stats(self._profile, stream=io.StringIO())
+        rows = []
+        for (file_name, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+            rows.append({'function': f'{os.path.basename(file_name)}:{line}({func})',
+                         'calls': nc, 'self_s': tt, 'cumulative_s': ct})
+        rows.sort(key=lambda row: -row['cumulative_s'])
+        return rows[:top]
+
+    def folded_stacks(self) -> str:
+        """Flamegraph input: one 'outer;inner <microseconds>' line per stack path."""
+        return ''.join(f'{path} {ns // 1000}\n' for path, ns in sorted(self.folded.items()) if ns >= 1000)
+
+    def write_report(self, path: str, fmt: str = 'json'):
+        """
+        Write the report as 'json' or 'folded' (flamegraph.pl / speedscope).
+        With cProfile on, the raw profile also goes to <path>.prof.
+        """
+        self.disable()
+        if fmt == 'folded':
+            with open(path, 'w') as f:
+                f.write(self.folded_stacks())
+        elif fmt == 'json':
+            with open(path, 'w') as f:
+                json.dump(self.report(), f, indent=2)
+        else:
+            raise ValueError(f"Unknown report format: {fmt}")
+        if self._profile is not None:
+            self._profile.dump_stats(path + '.prof')
+        print(f"Profile report has been saved to {path}")
+
+
+PROFILER = Instrumentation()
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+
+class IntrabarIndex:
+    """
+    Precomputed 5m-to-1m lookup for intrabar fills.
+
+    Flattens the 1m bars that fall inside each 5m bar ([time, time + bar_length))
+    into one "path" of sub-bars in time order. Bar i owns path positions
+    start[i]:start[i + 1], and owner[k] gives the 5m bar of path position k.
+    A 5m bar with no 1m data falls back to a single sub-bar made of its own
+    high/low, so the path never skips a bar.
+    """
+
+    def __init__(self, df_1m: pd.DataFrame, bars: pd.DataFrame, bar_length: str = '5min'):
+        """
+        :param df_1m: 1m frame indexed by time (DataLoader output).
+        :param bars: Frame with 'time', 'high', 'low' columns, e.g. the merged 5m frame.
+        """
+        times_1m = df_1m.index.to_numpy()
+        bar_times = bars['time'].to_numpy()
+        bar_end = bar_times + pd.Timedelta(bar_length).to_timedelta64()
+
+        lo = np.searchsorted(times_1m, bar_times, 'left')
+        hi = np.searchsorted(times_1m, bar_end, 'left')
+        # Never let a bar reach into the next bar's 1m rows.
+        hi[:-1] = np.minimum(hi[:-1], lo[1:])
+        counts = np.maximum(hi - lo, 0)
+
+        sizes = np.where(counts > 0, counts, 1)
+        self.start = np.concatenate([[0], np.cumsum(sizes)])
+        self.owner = np.repeat(np.arange(len(bar_times)), sizes)
+
+        position_in_bar = np.arange(self.start[-1]) - np.repeat(self.start[:-1], sizes)
+        source_rows = np.minimum(np.repeat(lo, sizes) + position_in_bar, max(len(times_1m) - 1, 0))
+        has_1m = np.repeat(counts > 0, sizes)
+
+        high_1m = df_1m['high'].to_numpy(dtype=float)
+        low_1m = df_1m['low'].to_numpy(dtype=float)
+        if len(times_1m) == 0:
+            high_1m = low_1m = np.full(1, np.nan)
+        self.high = np.where(has_1m, high_1m[source_rows], np.repeat(bars['high'].to_numpy(dtype=float), sizes))
+        self.low = np.where(has_1m, low_1m[source_rows], np.repeat(bars['low'].to_numpy(dtype=float), sizes))
+        self.missing_bars = int(np.sum(counts == 0))
+
+    @classmethod
+    def from_path(cls, high, low, start, lo: int = 0, hi: int = None) -> 'IntrabarIndex':
+        """
+        Index over bars [lo, hi) of an already built path (high, low, start
+        arrays, e.g. published through shared memory), with bar lo as bar 0.
+        """
+        hi = len(start) - 1 if hi is None else hi
+        first, last = start[lo], start[hi]
+        index = cls.__new__(cls)
+        index.high = high[first:last]
+        index.low = low[first:last]
+        index.start = start[lo:hi + 1] - first
+        index.owner = np.repeat(np.arange(hi - lo), np.diff(index.start))
+        index.missing_bars = None
+        return index
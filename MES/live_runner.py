@@ -0,0 +1,311 @@
+import argparse
+import asyncio
+import bisect
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from backtesting_app import build_simulator, load_timeframes
+from data_loader import DataLoader
+from performance_analyzer import PerformanceAnalyzer
+from session_calendar import MINUTES_PER_DAY, SessionCalendar
+from strategy_logic import StrategyLogic
+from multi_timeframe import timeframe_duration
+from streaming_indicators import StreamingIndicatorCalculator
+
+
+class LatencyHistogram:
+    """
+    Fixed log-spaced histogram of latencies in nanoseconds (1 us .. ~17 s,
+    four buckets per doubling). Recording is O(log buckets) and the memory
+    use does not grow with the number of samples.
+    """
+
+    EDGES = [int(1000 * 2 ** (i / 4)) for i in range(0, 4 * 24 + 1)]
+
+    def __init__(self, name: str):
+        self.name = name
+        self.counts = [0] * (len(self.EDGES) + 1)
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, latency_ns: int):
+        self.counts[bisect.bisect_left(self.EDGES, latency_ns)] += 1
+        self.count += 1
+        self.total_ns += latency_ns
+        if latency_ns > self.max_ns:
+            self.max_ns = latency_ns
+
+    def percentile(self, p: float) -> float:
+        """Upper edge (in us) of the bucket holding the p-th percentile."""
+        if self.count == 0:
+            return 0.0
+        target = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= target and n:
+                edge = self.EDGES[i] if i < len(self.EDGES) else self.max_ns
+                return min(edge, self.max_ns) / 1000
+        return self.max_ns / 1000
+
+    def exceeding(self, budget_us: float) -> int:
+        """Number of samples above the budget (bucket resolution)."""
+        i = bisect.bisect_left(self.EDGES, int(budget_us * 1000))
+        return sum(self.counts[i + 1:])
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'mean_us': self.total_ns / self.count / 1000 if self.count else 0.0,
+            'p50_us': self.percentile(50),
+            'p90_us': self.percentile(90),
+            'p99_us': self.percentile(99),
+            'max_us': self.max_ns / 1000,
+            'buckets_us': {f'{self.EDGES[i] / 1000:.1f}': n
+                           for i, n in enumerate(self.counts[:-1]) if n},
+        }
+
+
+class ReplayServer:
+    """
+    Local stand-in for the broker feed. Streams bars from DataLoader frames
+    over TCP as newline-delimited JSON, each bar published when it closes
+    (label + bar length), all timeframes interleaved in close-time order.
+
+    :param speed: Market seconds replayed per wall-clock second (60 = one
+                  minute of bars per second). 0 streams as fast as possible.
+    """
+
+    def __init__(self, timeframes: dict, host: str = '127.0.0.1', port: int = 0, speed: float = 0):
+        self.timeframes = timeframes
+        self.host = host
+        self.port = port
+        self.speed = speed
+        self.server = None
+
+    def _events(self):
+        events = []
+        for tf, df in self.timeframes.items():
+            close_times = df.index + timeframe_duration(tf)
+            frame = pd.DataFrame({
+                'close_time': close_times,
+                'tf_order': timeframe_duration(tf).value,
+                'tf': tf,
+                'time': df.index.as_unit('ns').asi8,
+                'open': df['open'].to_numpy(),
+                'high': df['high'].to_numpy(),
+                'low': df['low'].to_numpy(),
+                'close': df['close'].to_numpy(),
+                'volume': df['volume'].to_numpy(),
+            })
+            events.append(frame)
+        # Shorter timeframes first when several bars close at the same instant.
+        return pd.concat(events).sort_values(['close_time', 'tf_order'], kind='stable')
+
+    async def _serve_client(self, reader, writer):
+        events = self._events()
+        last_close = None
+        columns = ['tf', 'time', 'open', 'high', 'low', 'close', 'volume']
+        try:
+            for close_time, row in zip(events['close_time'], events[columns].itertuples(index=False)):
+                if self.speed and last_close is not None and close_time > last_close:
+                    await asyncio.sleep((close_time - last_close).total_seconds() / self.speed)
+                last_close = close_time
+                message = {'tf': row.tf, 'time': int(row.time), 'open': float(row.open),
+                           'high': float(row.high), 'low': float(row.low),
+                           'close': float(row.close), 'volume': float(row.volume)}
+                writer.write((json.dumps(message) + '\n').encode())
+                await writer.drain()
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        print(f"ReplayServer: streaming on {self.host}:{self.port} (speed={self.speed or 'max'})")
+        return self
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+class SocketBarSource:
+    """
+    Bar source reading newline-delimited JSON bars from a TCP feed such as
+    ReplayServer. Yields (receive_time_ns, bar) tuples; receive time is taken
+    as soon as the line is off the socket, before decoding.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+
+    async def bars(self):
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                received_ns = time.perf_counter_ns()
+                bar = json.loads(line)
+                bar['time'] = pd.Timestamp(bar['time'])
+                yield received_ns, bar
+        finally:
+            writer.close()
+
+
+class LiveRunner:
+    """
+    Event-driven runner: takes bars from any source with an async bars()
+    generator and pushes them through StreamingIndicatorCalculator,
+    StrategyLogic.check_signal and ExecutionSimulator as they arrive.
+
+    Entries and exits follow the same rules as backtesting_app.run_bar_loop on
+    the base timeframe, with new entries limited to sessions.trade_session of
+    the SessionCalendar (evaluated once per day over its minutes, not per
+    bar). Other timeframes contribute their latest closed bar's indicators.
+    Records bar-to-signal and bar-to-order latency histograms.
+    """
+
+    def __init__(self, config: dict, base_timeframe: str = '5m', timeframes=('1m', '5m')):
+        ind_cfg = config['indicators']
+        self.base_timeframe = base_timeframe
+        self.indicators = {
+            tf: StreamingIndicatorCalculator(
+                short_ema_period = ind_cfg["short_ema_period"],
+                medium_ema_period = ind_cfg["medium_ema_period"],
+                rsi_period = ind_cfg["rsi_period"],
+                atr_period = ind_cfg["atr_period"],
+                compute_macd = ind_cfg["compute_macd"],
+                compute_stoch = ind_cfg["compute_stoch"]
+            )
+            for tf in timeframes
+        }
+        self.strategy_logic = StrategyLogic(config['strategy'])
+        self.simulator = build_simulator(config['execution'])
+        self.calendar = SessionCalendar.from_config(config)
+        self.session = config.get('sessions', {}).get('trade_session', 'full')
+        self._session_day = None
+        self._session_minutes = None
+        self.latency_budget_us = config.get('live', {}).get('latency_budget_us', 1000)
+        self.bar_to_signal = LatencyHistogram('bar_to_signal')
+        self.bar_to_order = LatencyHistogram('bar_to_order')
+        self.bars_processed = 0
+
+    async def run(self, source):
+        async for received_ns, bar in source.bars():
+            self.on_bar(received_ns, bar)
+        return self.simulator.trades
+
+    def in_session(self, bar_time) -> bool:
+        """True if new entries are allowed at bar_time (the backtest's session mask for one bar)."""
+        bar_time = pd.Timestamp(bar_time)
+        day = bar_time.floor('D')
+        if day != self._session_day:
+            # Every minute of the day (plus an hour for a 25-hour DST day) in one evaluation.
+            minutes = day + pd.to_timedelta(np.arange(MINUTES_PER_DAY + 60), unit='min')
+            self._session_minutes = self.calendar.evaluate(minutes, self.session)[0]
+            self._session_day = day
+        return bool(self._session_minutes[(bar_time - day) // pd.Timedelta(minutes=1)])
+
+    def on_bar(self, received_ns: int, bar: dict):
+        tf = bar['tf']
+        if tf not in self.indicators:
+            return
+        self.indicators[tf].update(bar)
+        if tf != self.base_timeframe:
+            return
+        self.bars_processed += 1
+
+        simulator = self.simulator
+        data_point = {
+            'time': bar['time'],
+            'open': bar['open'],
+            'high': bar['high'],
+            'low': bar['low'],
+            'close': bar['close'],
+            'volume': bar['volume'],
+        }
+
+        if self.in_session(bar['time']):
+            multi_indicators = {t: calc.values for t, calc in self.indicators.items()}
+            signal = self.strategy_logic.check_signal(data_point, multi_indicators)
+            self.bar_to_signal.record(time.perf_counter_ns() - received_ns)
+            if signal and simulator.process_signal(signal, data_point) is not None:
+                self.bar_to_order.record(time.perf_counter_ns() - received_ns)
+        elif self.strategy_logic.uses_history:
+            self.strategy_logic.observe(data_point, {t: calc.values for t, calc in self.indicators.items()})
+
+        if simulator.open_position:
+            exit_info = simulator.check_stop_loss_or_profit_target(data_point)
+            if exit_info is not None:
+                exit_signal = {
+                    'type': 'EXIT',
+                    'position_type': simulator.open_position.type,
+                    'exit_price': exit_info['exit_price'],
+                    'reason': exit_info['reason']
+                }
+                simulator.process_signal(exit_signal, data_point)
+                self.bar_to_order.record(time.perf_counter_ns() - received_ns)
+
+    def latency_report(self) -> dict:
+        report = {'bars_processed': self.bars_processed, 'latency_budget_us': self.latency_budget_us}
+        for hist in (self.bar_to_signal, self.bar_to_order):
+            stats = hist.to_dict()
+            stats['over_budget'] = hist.exceeding(self.latency_budget_us)
+            report[hist.name] = stats
+        return report
+
+
+async def replay(config: dict, data_path: str = './data', speed: float = 0):
+    """Start a local ReplayServer and run a LiveRunner against it."""
+    timeframes = load_timeframes(DataLoader(data_path=data_path), config)
+    server = await ReplayServer(timeframes, speed=speed).start()
+    runner = LiveRunner(config)
+    try:
+        await runner.run(SocketBarSource(server.host, server.port))
+    finally:
+        await server.stop()
+    return runner
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay bars through the strategy as a live feed.")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--data-path', default='./data')
+    parser.add_argument('--speed', type=float, default=None,
+                        help="market seconds per wall-clock second (0 = as fast as possible)")
+    parser.add_argument('--report', default=None, help="write the latency report to this JSON file")
+    args = parser.parse_args(argv)
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    speed = args.speed if args.speed is not None else config.get('live', {}).get('replay_speed', 0)
+
+    runner = asyncio.run(replay(config, data_path=args.data_path, speed=speed))
+
+    report = runner.latency_report()
+    stats = PerformanceAnalyzer(runner.simulator.trades).compute_detailed_metrics()
+    print(f"\nBars processed:        {report['bars_processed']}")
+    print(f"Total Trades:          {stats.get('total_trades', 0)}")
+    for name in ('bar_to_signal', 'bar_to_order'):
+        hist = report[name]
+        print(f"{name:<22} p50={hist['p50_us']:.1f}us p99={hist['p99_us']:.1f}us "
+              f"max={hist['max_us']:.1f}us over budget={hist['over_budget']}")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Latency report has been saved to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
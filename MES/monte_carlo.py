@@ -0,0 +1,182 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from performance_analyzer import PerformanceAnalyzer
+
+DEFAULT_PERCENTILES = [5, 25, 50, 75, 95]
+
+
+def _simulate_chunk(job):
+    """
+    Simulate one chunk of paths. The chunk is a (trades x paths) matrix, so
+    the running sums and peaks advance over contiguous rows for all paths at
+    once. Returns per-path final PnL, max drawdown, profit factor and ruin
+    flags.
+    """
+    pnl, n_paths, method, seed, ruin_level = job
+    rng = np.random.default_rng(seed)
+    n_trades = len(pnl)
+    if method == 'bootstrap':
+        equity = pnl[rng.integers(0, n_trades, size=(n_trades, n_paths), dtype=np.int32)]
+    else:  # shuffle
+        equity = rng.permuted(np.repeat(pnl[:, None], n_paths, axis=1), axis=0)
+
+    gains = np.maximum(equity, 0.0).sum(axis=0)
+    np.cumsum(equity, axis=0, out=equity)
+    final_pnl = equity[-1].copy()
+    losses = gains - final_pnl
+    with np.errstate(divide='ignore', invalid='ignore'):
+        profit_factor = np.where(losses > 0, gains / losses, np.inf)
+
+    lowest = equity.min(axis=0)
+    ruined = lowest <= -ruin_level if ruin_level is not None else np.zeros(n_paths, bool)
+
+    # Drawdown from the running peak (starting at 0), one trade row at a time.
+    peak = np.zeros(n_paths)
+    max_drawdown = np.zeros(n_paths)
+    for row in equity:
+        np.maximum(peak, row, out=peak)
+        np.minimum(max_drawdown, row - peak, out=max_drawdown)
+    return final_pnl, max_drawdown, profit_factor, ruined
+
+
+class MonteCarloAnalyzer:
+    """
+    Robustness of a finished backtest under resampled trade sequences.
+
+    'bootstrap' draws each path's trades with replacement from the trade
+    PnLs (final PnL, drawdown and profit factor all vary); 'shuffle'
+    reorders the same trades (only the path-dependent drawdown and ruin
+    vary). Paths are generated in chunks sized to stay under
+    max_chunk_bytes and spread across worker processes; each chunk has
+    its own seed from one SeedSequence, so results do not depend on the
+    number of workers.
+
+    :param trades: Anything PerformanceAnalyzer accepts (trade list,
+                   TradeLedger or trade DataFrame).
+    :param ruin_level: Loss from the start, in PnL units (index points per
+                       contract unless a multiplier is given or the trades
+                       carry one), that counts as ruin; None disables risk
+                       of ruin. config.json gives it in points, as
+                       monte_carlo.ruin_level_points.
+    """
+
+    def __init__(self, trades, n_paths: int = 10_000, method: str = 'bootstrap',
+                 ruin_level: float = None, multiplier: float = 1.0, seed: int = 0,
+                 max_workers: int = None, max_chunk_bytes: int = 64 * 2 ** 20):
+        if method not in ('bootstrap', 'shuffle'):
+            raise ValueError(f"Unknown Monte Carlo method: {method}")
+        analyzer = PerformanceAnalyzer(trades, multiplier=multiplier)
+        self.pnl = analyzer.trade_arrays()['pnl'] if analyzer.trades_df is not None else np.empty(0)
+        self.n_paths = n_paths
+        self.method = method
+        self.ruin_level = ruin_level
+        self.seed = seed
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_chunk_bytes = max_chunk_bytes
+
+    def chunks(self) -> list:
+        """(pnl, paths, method, seed, ruin_level) jobs covering n_paths."""
+        # The int32 index matrix and the float64 equity matrix.
+        bytes_per_path = max(len(self.pnl), 1) * (4 + 8)
+        chunk_paths = max(1, min(self.n_paths, self.max_chunk_bytes // bytes_per_path))
+        sizes = [chunk_paths] * (self.n_paths // chunk_paths)
+        if self.n_paths % chunk_paths:
+            sizes.append(self.n_paths % chunk_paths)
+        seeds = np.random.SeedSequence(self.seed).spawn(len(sizes))
+        return [(self.pnl, size, self.method, seed, self.ruin_level) for size, seed in zip(sizes, seeds)]
+
+    def simulate(self) -> dict:
+        """Per-path arrays: 'final_pnl', 'max_drawdown', 'profit_factor', 'ruined'."""
+        jobs = self.chunks()
+        if self.max_workers == 1 or len(jobs) == 1:
+            results = [_simulate_chunk(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(jobs))) as pool:
+                results = list(pool.map(_simulate_chunk, jobs))
+        names = ['final_pnl', 'max_drawdown', 'profit_factor', 'ruined']
+        return {name: np.concatenate([r[i] for r in results]) for i, name in enumerate(names)}
+
+    def run(self, percentiles=None) -> dict:
+        """
+        Percentile bands of final PnL, max drawdown and profit factor across
+        paths, the risk of ruin, and the same statistics for the original
+        trade order.
+        """
+        percentiles = percentiles or DEFAULT_PERCENTILES
+        if len(self.pnl) == 0:
+            return {'paths': 0, 'trades': 0}
+        paths = self.simulate()
+
+        def bands(values):
+            return {f'p{p:g}': float(v) for p, v in zip(percentiles, np.percentile(values, percentiles))}
+
+        equity = np.cumsum(self.pnl)
+        return {
+            'paths': self.n_paths,
+            'trades': len(self.pnl),
+            'method': self.method,
+            'final_pnl': bands(paths['final_pnl']),
+            'max_drawdown': bands(paths['max_drawdown']),
+            'profit_factor': bands(paths['profit_factor']),
+            'risk_of_ruin': float(paths['ruined'].mean()) if self.ruin_level is not None else None,
+            'ruin_level': self.ruin_level,
+            'original': {
+                'final_pnl': float(equity[-1]),
+                'max_drawdown': float((equity - np.maximum.accumulate(np.maximum(equity, 0.0))).min()),
+            },
+        }
+
+
+def print_report(report: dict):
+    print(f"\n=== Monte Carlo ({report.get('method')}, {report['paths']} paths of {report['trades']} trades) ===")
+    if not report['paths']:
+        return
+    for name in ('final_pnl', 'max_drawdown', 'profit_factor'):
+        band = '  '.join(f"{p}={v:.2f}" for p, v in report[name].items())
+        print(f"{name:<15} {band}")
+    if report['risk_of_ruin'] is not None:
+        print(f"Risk of ruin (loss >= {report['ruin_level']:g}): {report['risk_of_ruin'] * 100:.2f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo / bootstrap analysis of a trade list.")
+    parser.add_argument('trades', help="trade CSV (position_type, entry_price, exit_price, "
+                                       "entry_time, exit_time[, quantity, multiplier])")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--paths', type=int, default=None)
+    parser.add_argument('--method', choices=['bootstrap', 'shuffle'], default=None)
+    parser.add_argument('--ruin-level', type=float, default=None,
+                        help="loss counted as ruin, in the trades' PnL units (default: ruin_level_points)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default=None, help="write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    mc_cfg = {}
+    if os.path.exists(args.config):
+        with open(args.config, 'r') as f:
+            mc_cfg = json.load(f).get('monte_carlo', {})
+    trades = pd.read_csv(args.trades, parse_dates=['entry_time', 'exit_time'])
+
+    report = MonteCarloAnalyzer(
+        trades,
+        n_paths=args.paths or mc_cfg.get('paths', 10_000),
+        method=args.method or mc_cfg.get('method', 'bootstrap'),
+        ruin_level=args.ruin_level if args.ruin_level is not None else mc_cfg.get('ruin_level_points'),
+        seed=mc_cfg.get('seed', 0),
+        max_workers=args.workers,
+    ).run(mc_cfg.get('percentiles'))
+    print_report(report)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Monte Carlo report has been saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
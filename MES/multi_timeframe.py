@@ -0,0 +1,95 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+OHLCV = ['open', 'high', 'low', 'close', 'volume']
+
+_UNITS = {'m': 'min', 'h': 'h', 'd': 'D'}
+
+
+def timeframe_duration(timeframe: str) -> pd.Timedelta:
+    """Bar length of a timeframe label such as '1m', '5m', '30m', '1h' or '1d'."""
+    match = re.fullmatch(r'(\d+)([mhd])', timeframe)
+    if match is None:
+        raise ValueError(f"Unknown timeframe: {timeframe}")
+    return pd.Timedelta(int(match.group(1)), unit=_UNITS[match.group(2)])
+
+
+class MultiTimeframeBuilder:
+    """
+    Builds every timeframe from the 1m series and aligns them on one base
+    timeframe.
+
+    resample() aggregates the 1m bars into each higher timeframe with
+    ufunc.reduceat over epoch-aligned buckets (bars labelled by their open
+    time, as in the CSV files). align() puts the indicator columns of all
+    timeframes on the base timeframe's rows, each suffixed with its
+    timeframe, using bar-close semantics: a base bar closing at T sees, for
+    every other timeframe, the last bar that closed at or before T. A
+    higher-timeframe bar still forming is never visible, and a lower one
+    is always its latest closed bar.
+    """
+
+    def __init__(self, timeframes=('1m', '5m'), base_timeframe: str = '5m'):
+        if base_timeframe not in timeframes:
+            raise ValueError(f"Base timeframe {base_timeframe} is not in {list(timeframes)}")
+        self.timeframes = list(timeframes)
+        self.base_timeframe = base_timeframe
+
+    def resample(self, df_1m: pd.DataFrame) -> dict:
+        """{timeframe: OHLCV frame indexed by time} for every configured timeframe."""
+        times = df_1m.index.as_unit('ns').asi8
+        columns = {col: df_1m[col].to_numpy() for col in OHLCV}
+        frames = {}
+        for tf in self.timeframes:
+            width = timeframe_duration(tf).value
+            if width == timeframe_duration('1m').value:
+                frames[tf] = df_1m
+                continue
+            bucket = times // width * width
+            starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]]) if len(bucket) else np.empty(0, int)
+            ends = np.r_[starts[1:], len(bucket)] - 1
+            index = pd.DatetimeIndex(bucket[starts].view('datetime64[ns]'), name=df_1m.index.name)
+            frame = pd.DataFrame({
+                'open': columns['open'][starts],
+                'high': np.maximum.reduceat(columns['high'], starts) if len(starts) else columns['high'][:0],
+                'low': np.minimum.reduceat(columns['low'], starts) if len(starts) else columns['low'][:0],
+                'close': columns['close'][ends],
+                'volume': np.add.reduceat(columns['volume'], starts) if len(starts) else columns['volume'][:0],
+            }, index=index.as_unit(df_1m.index.unit))
+            frame.attrs = dict(df_1m.attrs, timeframe=tf)
+            frames[tf] = frame
+        return frames
+
+    def align(self, frames: dict) -> pd.DataFrame:
+        """
+        Base-timeframe frame with 'time', the base OHLCV columns and every
+        timeframe's non-OHLCV columns renamed '<column>_<timeframe>'.
+        """
+        base = frames[self.base_timeframe]
+        base_close = base.index.as_unit('ns').asi8 + timeframe_duration(self.base_timeframe).value
+
+        merged = {'time': base.index.to_numpy()}
+        for col in OHLCV:
+            merged[col] = base[col].to_numpy()
+        for tf in self.timeframes:
+            df = frames[tf]
+            indicator_cols = [col for col in df.columns if col not in OHLCV]
+            if tf == self.base_timeframe:
+                for col in indicator_cols:
+                    merged[f'{col}_{tf}'] = df[col].to_numpy()
+                continue
+            close = df.index.as_unit('ns').asi8 + timeframe_duration(tf).value
+            rows = np.searchsorted(close, base_close, 'right') - 1
+            visible = rows >= 0
+            rows = np.maximum(rows, 0)
+            for col in indicator_cols:
+                values = df[col].to_numpy(dtype=float)
+                merged[f'{col}_{tf}'] = np.where(visible, values[rows] if len(values) else np.nan, np.nan)
+        return pd.DataFrame(merged)
+
+    @staticmethod
+    def indicator_matrix(merged: pd.DataFrame, column: str, timeframes) -> np.ndarray:
+        """bars x timeframes array of one indicator, e.g. indicator_matrix(m, 'RSI', ['1m', '5m'])."""
+        return np.column_stack([merged[f'{column}_{tf}'].to_numpy(dtype=float) for tf in timeframes])
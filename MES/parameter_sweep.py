@@ -0,0 +1,301 @@
+import argparse
+import copy
+import itertools
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtesting_app import (FILE_MAP, build_calculator, build_intrabar_index, build_merged_frame,
+                             build_session_mask, build_simulator, load_timeframes, run_engine)
+from data_loader import DataLoader
+from performance_analyzer import PerformanceAnalyzer
+from position_kernel import KernelEngine
+from results_store import ResultsStore, data_fingerprint, write_trade_blob
+from rule_engine import RulePlan
+from shared_arrays import SharedArrays, arrays_to_frames, frames_to_arrays
+from strategy_logic import StrategyLogic
+
+SWEEP_SECTIONS = ('indicators', 'strategy', 'execution')
+
+
+def expand_grid(grid: dict) -> list:
+    """
+    Expand {'key': spec} into a list of {'key': value} combinations.
+    A spec is a list of values, a {'start', 'stop', 'step'} range (stop inclusive)
+    or a single value.
+    """
+    keys = list(grid)
+    axes = [_axis_values(grid[key]) for key in keys]
+    return [dict(zip(keys, combo)) for combo in itertools.product(*axes)]
+
+
+def _axis_values(spec):
+    if isinstance(spec, dict):
+        start, stop, step = spec['start'], spec['stop'], spec.get('step', 1)
+        count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        if all(isinstance(v, int) for v in (start, stop, step)):
+            return [start + i * step for i in range(count)]
+        return [round(start + i * step, 10) for i in range(count)]
+    if isinstance(spec, (list, tuple)):
+        return list(spec)
+    return [spec]
+
+
+def apply_params(config: dict, params: dict) -> dict:
+    """
+    Return a copy of config with each parameter written into the section that
+    already defines it. Use 'section.key' for keys that aren't in config.json yet.
+    """
+    config = copy.deepcopy(config)
+    for key, value in params.items():
+        if '.' in key:
+            section, key = key.split('.', 1)
+        else:
+            section = next((s for s in SWEEP_SECTIONS if key in config.get(s, {})), None)
+            if section is None:
+                raise KeyError(f"Unknown sweep parameter: {key}")
+        config.setdefault(section, {})[key] = value
+    return config
+
+
+# Per-process state; filled by _init_worker (or lazily for in-process runs).
+_worker_shm = None
+_worker_timeframes = None
+_worker_blob_store = None
+_merged_cache = OrderedDict()
+# Indicator settings whose merged frame a process keeps (least recently used dropped first).
+merged_cache_size = 1
+
+
+def _init_worker(handle, source_files, blob_store=None):
+    global _worker_shm, _worker_timeframes, _worker_blob_store
+    _worker_blob_store = blob_store
+    _worker_shm, arrays = SharedArrays.attach(handle)
+    _worker_timeframes = arrays_to_frames(arrays)
+    # Keep the indicator cache keyed on the original files.
+    for tf, df in _worker_timeframes.items():
+        if source_files.get(tf):
+            df.attrs['source_file'] = source_files[tf]
+
+
+def prepare_merged(config: dict, timeframes: dict) -> tuple:
+    """
+    (merged, session_mask, intrabar) for config's indicator, session and
+    backtest settings. The last merged_cache_size settings are kept in this
+    process, so configs that only differ in strategy/execution parameters
+    skip the indicator stage.
+    """
+    key = json.dumps([config['indicators'], config.get('sessions'), config.get('backtest')],
+                     sort_keys=True, default=str)
+    if key in _merged_cache:
+        _merged_cache.move_to_end(key)
+        return _merged_cache[key]
+    while len(_merged_cache) >= max(merged_cache_size, 1):
+        _merged_cache.popitem(last=False)
+    merged = build_merged_frame(timeframes, config['indicators'], build_calculator(config))
+    intrabar = build_intrabar_index(config, timeframes, merged)
+    session_mask = build_session_mask(config, merged['time'], timeframes['5m'].attrs.get('source_file'))
+    _merged_cache[key] = (merged, session_mask, intrabar)
+    return _merged_cache[key]
+
+
+def run_config(config: dict, timeframes: dict, blob_store=None, include_trades: bool = False) -> dict:
+    """
+    Run one backtest for `config` on already-loaded timeframes, with its
+    backtest.engine (default "columnar"), and return
+    PerformanceAnalyzer.compute_detailed_metrics (see prepare_merged for
+    how the indicator stage is reused).
+
+    :param blob_store: Optional (blob_dir, trade_format); the trades are then
+                       written there and the file name returned as 'trades_blob'.
+    :param include_trades: Also return the trade DataFrame as 'trades'.
+    """
+    merged, session_mask, intrabar = prepare_merged(config, timeframes)
+
+    simulator = build_simulator(config['execution'], log_mode='quiet')
+    strategy_logic = StrategyLogic(config['strategy'])
+    engine = config.get('backtest', {}).get('engine', 'columnar')
+    run_engine(engine, strategy_logic, simulator, merged, session_mask, intrabar)
+    trades = simulator.ledger.to_frame()
+    stats = PerformanceAnalyzer(trades, bars=merged).compute_detailed_metrics()
+    if blob_store is not None:
+        stats['trades_blob'] = write_trade_blob(trades, *blob_store)
+    if include_trades:
+        stats['trades'] = trades
+    return stats
+
+
+def _run_in_worker(config):
+    return run_config(config, _worker_timeframes, _worker_blob_store)
+
+
+class ParameterSweep:
+    """
+    Runs the backtest over a grid of config.json parameters.
+
+    The data is loaded through DataLoader once and published to the worker
+    processes through shared memory; each worker rebuilds the indicators it
+    needs and returns the metrics for its combinations.
+    """
+
+    def __init__(self, config: dict, data_path: str = './data', file_map: dict = None,
+                 max_workers: int = None):
+        self.config = config
+        self.data_path = data_path
+        self.file_map = file_map or FILE_MAP
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def run(self, grid: dict, store: ResultsStore = None) -> pd.DataFrame:
+        """
+        Returns one row per combination: the swept parameters followed by the
+        compute_detailed_metrics results.
+
+        With a ResultsStore, every run is also recorded there (with its
+        run_key in the result): workers write the trade blobs, and this
+        process inserts the rows in batched transactions.
+        """
+        combos = expand_grid(grid)
+        configs = [apply_params(self.config, params) for params in combos]
+        # Neighbouring tasks with the same indicator settings share one merged frame.
+        order = sorted(range(len(configs)),
+                       key=lambda i: json.dumps(configs[i]['indicators'], sort_keys=True))
+
+        bt_cfg = self.config.get('backtest', {})
+        loader = DataLoader(data_path=self.data_path, storage=bt_cfg.get('storage', 'csv'))
+        timeframes = load_timeframes(loader, self.config, self.file_map,
+                                     start=bt_cfg.get('start'), end=bt_cfg.get('end'))
+        source_files = {tf: df.attrs.get('source_file') for tf, df in timeframes.items()}
+        print(f"ParameterSweep: {len(configs)} combinations on {self.max_workers} workers")
+        blob_store = (store.blob_dir, store.trade_format) if store is not None else None
+
+        with SharedArrays(frames_to_arrays(timeframes)) as shared:
+            with ProcessPoolExecutor(max_workers=self.max_workers,
+                                     initializer=_init_worker,
+                                     initargs=(shared.handle, source_files, blob_store)) as pool:
+                chunksize = max(1, len(configs) // (self.max_workers * 4))
+                results = list(pool.map(_run_in_worker, [configs[i] for i in order],
+                                        chunksize=chunksize))
+
+        rows = [None] * len(configs)
+        fingerprint = data_fingerprint(timeframes) if store is not None else None
+        for i, stats in zip(order, results):
+            if store is not None:
+                blob = stats.pop('trades_blob')
+                stats['run_key'] = store.add_run(configs[i], stats, data_fingerprint=fingerprint,
+                                                 params=combos[i], label='sweep', trades_blob=blob)
+            rows[i] = {**combos[i], **stats}
+        if store is not None:
+            store.flush()
+        return pd.DataFrame(rows)
+
+
+def rule_variants(template: dict, grid: dict) -> list:
+    """
+    One RulePlan variant per grid combination: every "$key" string in the
+    template is replaced by that combination's value, and the variant keeps
+    the values under 'params'.
+    """
+    def substitute(node, params):
+        if isinstance(node, str) and node.startswith('$'):
+            return params[node[1:]]
+        if isinstance(node, dict):
+            return {k: substitute(v, params) for k, v in node.items()}
+        if isinstance(node, (list, tuple)):
+            return [substitute(v, params) for v in node]
+        return node
+
+    variants = []
+    for params in expand_grid(grid):
+        variant = substitute(template, params)
+        suffix = ','.join(f'{k}={v}' for k, v in params.items())
+        variant['name'] = f"{template.get('name', 'rule')}[{suffix}]"
+        variant['params'] = params
+        variants.append(variant)
+    return variants
+
+
+def screen_rules(config: dict, timeframes: dict, variants: list) -> pd.DataFrame:
+    """
+    Backtest many entry-rule variants on one indicator frame. All variants
+    are compiled into one RulePlan, so shared conditions are evaluated once
+    for the (variants x bars) signal matrix; each row then runs through the
+    position kernel with the configured execution settings.
+    """
+    merged = build_merged_frame(timeframes, config['indicators'], build_calculator(config))
+    intrabar = build_intrabar_index(config, timeframes, merged)
+    session_mask = build_session_mask(config, merged['time'], timeframes['5m'].attrs.get('source_file'))
+
+    plan = RulePlan(variants)
+    signals = plan.evaluate(merged)
+    print(f"RulePlan: {len(plan.variants)} variants, {plan.size} distinct expressions "
+          f"({plan.expression_count} as written)")
+
+    rows = []
+    for variant, row in zip(plan.variants, signals):
+        simulator = build_simulator(config['execution'], log_mode='quiet')
+        ledger = KernelEngine(None, simulator).run(merged, session_mask, intrabar, signals=row)
+        stats = PerformanceAnalyzer(ledger.to_frame(), bars=merged).compute_detailed_metrics()
+        rows.append({'variant': variant['name'], **variant.get('params', {}), **stats})
+    return pd.DataFrame(rows)
+
+
+def parse_set_argument(text: str):
+    """Parse 'key=1,2,3' (list) or 'key=start:stop:step' (inclusive range)."""
+    key, _, spec = text.partition('=')
+    if ':' in spec:
+        parts = [json.loads(p) for p in spec.split(':')]
+        return key, dict(zip(('start', 'stop', 'step'), parts))
+    return key, [json.loads(p) for p in spec.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a parameter sweep over config.json.")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--data-path', default='./data')
+    parser.add_argument('--set', dest='grid', action='append', default=[],
+                        help="e.g. short_ema_period=5,9,13 or stop_offset=1:4:0.5")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--rules', default=None,
+                        help="JSON file of entry-rule variants (a list, or {'template', 'grid'}) "
+                             "to screen instead of a config sweep; --set values fill the template")
+    parser.add_argument('--out', default='sweep_results.csv')
+    parser.add_argument('--store', action='store_true',
+                        help="also record every run in the results store (config: results)")
+    args = parser.parse_args(argv)
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    grid = dict(parse_set_argument(item) for item in args.grid)
+
+    if args.rules:
+        with open(args.rules, 'r') as f:
+            spec = json.load(f)
+        if isinstance(spec, dict):
+            variants = rule_variants(spec['template'], {**spec.get('grid', {}), **grid})
+        else:
+            variants = spec
+        bt_cfg = config.get('backtest', {})
+        loader = DataLoader(data_path=args.data_path, storage=bt_cfg.get('storage', 'csv'))
+        timeframes = load_timeframes(loader, config, start=bt_cfg.get('start'), end=bt_cfg.get('end'))
+        results = screen_rules(config, timeframes, variants)
+    else:
+        store = ResultsStore.from_config(config) if args.store else None
+        try:
+            results = ParameterSweep(config, data_path=args.data_path,
+                                     max_workers=args.workers).run(grid, store)
+        finally:
+            if store is not None:
+                store.close()
+    results.to_csv(args.out, index=False)
+    print(f"Sweep results have been saved to {args.out}")
+    if 'profit_factor' in results:
+        results = results.sort_values('profit_factor', ascending=False)
+    print(results.head(10).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,172 @@
+import numpy as np
 import pandas as pd
 
+from trade_ledger import TradeLedger
+
+TRADING_DAYS_PER_YEAR = 252
+
 class PerformanceAnalyzer:
     """
     Computes PnL, drawdown, win rate, etc. on the trades recorded by ExecutionSimulator.
+
+    All metrics are array operations over the trade columns; nothing loops
+    per trade or per bar in Python. PnL is signed by side and scaled by
+    quantity and the contract multiplier (a 'multiplier' column on the
+    trades wins over the constructor argument). With the default
+    multiplier of 1 and one contract, PnL is in index points as before.
+    A 'cost' column (points per contract, e.g. from
+    TransactionCostModel.apply) is deducted from each trade's PnL.
+
+    When the bars the trades ran on are given (e.g. the merged frame), the
+    equity curve is marked to market on every bar close, and drawdown,
+    Sharpe/Sortino, exposure and bars held come from that curve; without
+    bars they fall back to realised PnL at trade exits.
     """
-    def __init__(self, trades):
+    def __init__(self, trades, multiplier: float = 1.0, bars: pd.DataFrame = None):
         # trades is a list of dicts: each containing entry_price, exit_price, etc.
+        # A TradeLedger or its to_frame() DataFrame is used without copying.
+        if isinstance(trades, TradeLedger):
+            trades = trades.to_frame()
         self.trades = trades
         self.trades_df = None
-        if trades:
+        if isinstance(trades, pd.DataFrame):
+            if not trades.empty:
+                self.trades_df = trades
+        elif trades:
             self.trades_df = pd.DataFrame(trades)
+        self.multiplier = multiplier
+        self.bars = bars
+        self._arrays = None
+        self._curve = None
+
+    # -- trade arrays ------------------------------------------------------
+
+    @staticmethod
+    def _side(position_type: pd.Series) -> np.ndarray:
+        """+1 for LONG, -1 for SHORT, 0 otherwise."""
+        if isinstance(position_type.dtype, pd.CategoricalDtype):
+            categories = np.asarray(position_type.cat.categories, dtype=object)
+            lookup = np.where(categories == 'LONG', 1.0, np.where(categories == 'SHORT', -1.0, 0.0))
+            return lookup[position_type.cat.codes.to_numpy()]
+        values = position_type.to_numpy()
+        return np.where(values == 'LONG', 1.0, np.where(values == 'SHORT', -1.0, 0.0))
+
+    @staticmethod
+    def _ns(values) -> np.ndarray:
+        values = np.asarray(values)
+        if values.dtype == object:
+            # tz-aware times (Timestamps); as UTC nanoseconds like the ledger.
+            return pd.DatetimeIndex(values).as_unit('ns').asi8
+        return values.astype('datetime64[ns]', copy=False).view(np.int64)
+
+    def trade_arrays(self) -> dict:
+        """Per-trade NumPy columns (side, prices, size, pnl, ns times), computed once."""
+        if self._arrays is None:
+            df = self.trades_df
+            side = self._side(df['position_type'])
+            entry = df['entry_price'].to_numpy(dtype=float)
+            exit_ = df['exit_price'].to_numpy(dtype=float)
+            size = (df['quantity'].to_numpy(dtype=float) if 'quantity' in df
+                    else np.ones(len(df)))
+            if 'multiplier' in df:
+                size = size * df['multiplier'].to_numpy(dtype=float)
+            elif self.multiplier != 1.0:
+                size = size * self.multiplier
+            pnl = side * (exit_ - entry) * size
+            if 'cost' in df:
+                pnl = pnl - df['cost'].to_numpy(dtype=float) * size
+            self._arrays = {
+                'side': side,
+                'entry_price': entry,
+                'size': size,
+                'pnl': pnl,
+                'entry_time': self._ns(df['entry_time'].to_numpy()),
+                'exit_time': self._ns(df['exit_time'].to_numpy()),
+            }
+        return self._arrays
+
+    # -- equity curve ------------------------------------------------------
+
+    def equity_curve(self) -> dict:
+        """
+        Equity curve as arrays {'time' (ns), 'equity', 'in_market' (bars only),
+        'entry_bar', 'exit_bar'}.
+
+        With bars: realised PnL of trades exited at or before each bar plus the
+        open PnL of positions held over it, marked at the bar close. A trade
+        is open on bars [entry bar, exit bar). Without bars: cumulative PnL at
+        each exit, in exit-time order.
+        """
+        if self._curve is not None:
+            return self._curve
+        a = self.trade_arrays()
+        if self.bars is None:
+            order = np.argsort(a['exit_time'], kind='stable')
+            self._curve = {'time': a['exit_time'][order], 'equity': np.cumsum(a['pnl'][order]),
+                           'in_market': None, 'entry_bar': None, 'exit_bar': None}
+            return self._curve
+
+        times = self.bars['time'] if 'time' in self.bars else self.bars.index
+        bar_ns = self._ns(times.to_numpy() if hasattr(times, 'to_numpy') else times)
+        close = self.bars['close'].to_numpy(dtype=float)
+        n = len(bar_ns)
+        entry_bar = np.searchsorted(bar_ns, a['entry_time'], 'left')
+        exit_bar = np.searchsorted(bar_ns, a['exit_time'], 'left')
+
+        # Difference arrays over bars: realised PnL from the exit bar on, and
+        # for the open interval the sums that give sum(side*size*(close-entry)).
+        realised = np.bincount(exit_bar, weights=a['pnl'], minlength=n + 1)[:n]
+        signed_size = a['side'] * a['size']
+        exposure = (np.bincount(entry_bar, weights=signed_size, minlength=n + 1)
+                    - np.bincount(exit_bar, weights=signed_size, minlength=n + 1))[:n]
+        cost = (np.bincount(entry_bar, weights=signed_size * a['entry_price'], minlength=n + 1)
+                - np.bincount(exit_bar, weights=signed_size * a['entry_price'], minlength=n + 1))[:n]
+        open_count = (np.bincount(entry_bar, minlength=n + 1)
+                      - np.bincount(exit_bar, minlength=n + 1))[:n]
+
+        equity = np.cumsum(realised) + close * np.cumsum(exposure) - np.cumsum(cost)
+        self._curve = {'time': bar_ns, 'equity': equity, 'in_market': np.cumsum(open_count) > 0,
+                       'entry_bar': entry_bar, 'exit_bar': exit_bar}
+        return self._curve
+
+    @staticmethod
+    def drawdown_stats(times: np.ndarray, equity: np.ndarray) -> dict:
+        """Max drawdown (<= 0) and the longest time spent below a previous peak (from 0)."""
+        if len(equity) == 0:
+            return {'max_drawdown': 0.0, 'max_drawdown_duration_bars': 0, 'max_drawdown_duration_days': 0.0}
+        peak = np.maximum.accumulate(np.maximum(equity, 0.0))
+        drawdown = equity - peak
+        # Index of the last new high (or the start) at every point.
+        at_peak = drawdown >= 0
+        last_peak = np.maximum.accumulate(np.where(at_peak, np.arange(len(equity)), 0))
+        bars_under = np.where(at_peak, 0, np.arange(len(equity)) - last_peak)
+        ns_under = np.where(at_peak, 0, times - times[last_peak])
+        return {
+            'max_drawdown': float(drawdown.min()),
+            'max_drawdown_duration_bars': int(bars_under.max()),
+            'max_drawdown_duration_days': float(ns_under.max()) / 86_400e9,
+        }
+
+    @staticmethod
+    def risk_ratios(times: np.ndarray, equity: np.ndarray) -> dict:
+        """Annualised Sharpe and Sortino of daily equity changes (PnL, no risk-free rate)."""
+        if len(equity) == 0:
+            return {'sharpe': None, 'sortino': None}
+        days = times // 86_400_000_000_000
+        last_of_day = np.flatnonzero(np.append(days[1:] != days[:-1], True))
+        daily = np.diff(equity[last_of_day], prepend=0.0)
+        if len(daily) < 2:
+            return {'sharpe': None, 'sortino': None}
+        mean = daily.mean()
+        std = daily.std(ddof=1)
+        downside = np.sqrt(np.mean(np.minimum(daily, 0.0) ** 2))
+        scale = np.sqrt(TRADING_DAYS_PER_YEAR)
+        return {
+            'sharpe': float(mean / std * scale) if std > 0 else None,
+            'sortino': float(mean / downside * scale) if downside > 0 else None,
+        }
+
+    # -- metrics -----------------------------------------------------------
 
     def compute_basic_metrics(self):
         """
@@ -21,90 +178,67 @@ class PerformanceAnalyzer:
                 'total_pnl': 0.0,
                 'win_rate': 0.0,
             }
-        
-        # For a LONG position, PnL = exit_price - entry_price
-        # For a SHORT position, PnL = entry_price - exit_price
-        def calculate_trade_pnl(row):
-            if row['position_type'] == 'LONG':
-                return row['exit_price'] - row['entry_price']
-            elif row['position_type'] == 'SHORT':
-                return row['entry_price'] - row['exit_price']
-            else:
-                return 0.0
-
-        self.trades_df['pnl'] = self.trades_df.apply(calculate_trade_pnl, axis=1)
-
-        total_trades = len(self.trades_df)
-        total_pnl = self.trades_df['pnl'].sum()
-        wins = self.trades_df[self.trades_df['pnl'] > 0]
-        win_rate = len(wins) / total_trades if total_trades > 0 else 0
 
+        pnl = self.trade_arrays()['pnl']
+        total_trades = len(pnl)
         return {
             'total_trades': total_trades,
-            'total_pnl': total_pnl,
-            'win_rate': win_rate,
+            'total_pnl': pnl.sum(),
+            'win_rate': np.count_nonzero(pnl > 0) / total_trades,
         }
 
     def compute_drawdown(self):
         """
-        A simplistic approach to compute drawdown from a running PnL series.
+        Max drawdown of the equity curve: bar-level marked to market when bars
+        were given, otherwise from the running PnL at trade exits.
         """
         if self.trades_df is None or self.trades_df.empty:
             return 0.0
-        
-        # Construct an equity curve from the trades. This is simplified.
-        self.trades_df = self.trades_df.sort_values(by='exit_time')
-        self.trades_df['cum_pnl'] = self.trades_df['pnl'].cumsum()
-        peak = self.trades_df['cum_pnl'].cummax()
-        drawdown = (self.trades_df['cum_pnl'] - peak).min()
-        return drawdown  # negative number indicating max drawdown
-    # In performance_analyzer.py
+        curve = self.equity_curve()
+        return self.drawdown_stats(curve['time'], curve['equity'])['max_drawdown']  # negative number
 
     def compute_detailed_metrics(self):
         if self.trades_df is None or self.trades_df.empty:
             return {}
 
-        # Calculate trade PnL for each trade:
-        def calculate_trade_pnl(row):
-            if row['position_type'] == 'LONG':
-                return row['exit_price'] - row['entry_price']
-            elif row['position_type'] == 'SHORT':
-                return row['entry_price'] - row['exit_price']
-            else:
-                return 0.0
-
-        self.trades_df['pnl'] = self.trades_df.apply(calculate_trade_pnl, axis=1)
-
-        winners = self.trades_df[self.trades_df['pnl'] > 0]
-        losers = self.trades_df[self.trades_df['pnl'] < 0]
-        total_trades = len(self.trades_df)
+        pnl = self.trade_arrays()['pnl']
+        winners = pnl[pnl > 0]
+        losers = pnl[pnl < 0]
+        total_trades = len(pnl)
         winning_trades = len(winners)
         losing_trades = len(losers)
         win_rate = (winning_trades / total_trades * 100) if total_trades > 0 else 0
-        avg_pl = self.trades_df['pnl'].mean()
-        largest_win = self.trades_df['pnl'].max()
-        largest_loss = self.trades_df['pnl'].min()
-        sum_winners = winners['pnl'].sum()
-        sum_losers = abs(losers['pnl'].sum())
+        sum_winners = winners.sum()
+        sum_losers = abs(losers.sum())
         profit_factor = (sum_winners / sum_losers) if sum_losers != 0 else float('inf')
-        avg_win = winners['pnl'].mean() if not winners.empty else 0
-        avg_loss = abs(losers['pnl'].mean()) if not losers.empty else 0
+        avg_win = winners.mean() if winning_trades else 0
+        avg_loss = abs(losers.mean()) if losing_trades else 0
         ratio_avg_win_loss = (avg_win / avg_loss) if avg_loss != 0 else float('inf')
 
-        # Optionally, calculate avg_bar_count if you have time/index data that represents bars.
-        avg_bar_count = None  # Replace with your own logic if needed
+        curve = self.equity_curve()
+        if curve['in_market'] is not None:
+            bars_held = curve['exit_bar'] - curve['entry_bar']
+            avg_bar_count = float(bars_held.mean())
+            exposure = float(curve['in_market'].mean()) if len(curve['in_market']) else 0.0
+        else:
+            avg_bar_count = None
+            exposure = None
 
         stats = {
             'total_trades': total_trades,
             'winning_trades': winning_trades,
             'losing_trades': losing_trades,
             'win_rate': win_rate,
-            'avg_pl': avg_pl,
-            'largest_win': largest_win,
-            'largest_loss': largest_loss,
+            'total_pnl': pnl.sum(),
+            'avg_pl': pnl.mean(),
+            'largest_win': pnl.max(),
+            'largest_loss': pnl.min(),
             'profit_factor': profit_factor,
             'ratio_avg_win_loss': ratio_avg_win_loss,
             'avg_bar_count': avg_bar_count,
+            'exposure': exposure,
         }
+        stats.update(self.drawdown_stats(curve['time'], curve['equity']))
+        stats.update(self.risk_ratios(curve['time'], curve['equity']))
 
-        return stats
\ No newline at end of file
+        return stats
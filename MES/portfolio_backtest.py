@@ -0,0 +1,220 @@
+import argparse
+import contextlib
+import copy
+import heapq
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtesting_app import (FILE_MAP, build_calculator, build_intrabar_index, build_merged_frame,
+                             build_session_mask, build_simulator, load_timeframes, print_stats)
+from columnar_engine import ColumnarEngine
+from data_loader import DataLoader
+from performance_analyzer import PerformanceAnalyzer
+from strategy_logic import StrategyLogic
+
+
+def _run_instrument_quietly(instrument: dict, config: dict) -> list:
+    # Keeps DataLoader's import messages of the worker processes off the console.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        return run_instrument(instrument, config)
+
+
+def run_instrument(instrument: dict, config: dict) -> list:
+    """
+    Full single-symbol pipeline (load, indicators, signals, execution) for one
+    instrument. Sections given in the instrument entry ('indicators',
+    'strategy', 'execution', 'backtest') override the shared config.
+    Returns the closed trades, each tagged with symbol and multiplier.
+    """
+    config = copy.deepcopy(config)
+    for section in ('indicators', 'strategy', 'execution', 'backtest'):
+        config.setdefault(section, {}).update(instrument.get(section, {}))
+    bt_cfg = config['backtest']
+
+    loader = DataLoader(data_path=instrument.get('data_path', './data'),
+                        storage=bt_cfg.get('storage', 'csv'))
+    timeframes = load_timeframes(loader, config, instrument.get('file_map', FILE_MAP),
+                                 start=bt_cfg.get('start'), end=bt_cfg.get('end'))
+    merged = build_merged_frame(timeframes, config['indicators'], build_calculator(config))
+    intrabar = build_intrabar_index(config, timeframes, merged)
+
+    simulator = build_simulator(config['execution'], log_mode='quiet')
+    ColumnarEngine(StrategyLogic(config['strategy']), simulator).run(
+        merged, build_session_mask(config, merged['time'], timeframes['5m'].attrs.get('source_file')),
+        intrabar)
+
+    trades = simulator.get_closed_trades()
+    for trade in trades:
+        trade['symbol'] = instrument['symbol']
+        trade['multiplier'] = instrument.get('multiplier', 1.0)
+    return trades
+
+
+class PortfolioBacktest:
+    """
+    Runs the strategy on several instruments at once.
+
+    Each symbol's indicators, signals and trades are computed in its own
+    worker process. The per-symbol trade streams are then merged in time
+    order into one portfolio, applying combined risk limits:
+
+      max_open_positions:  concurrent positions across all symbols
+      max_open_contracts:  concurrent contracts across all symbols
+      daily_loss_limit:    no new entries for the rest of the day once the
+                           day's realised loss (in currency) reaches it
+      max_drawdown_limit:  no new entries once the realised drawdown from
+                           the equity peak (in currency) reaches it
+
+    A trade refused by a limit is skipped; the symbol's later trades are kept
+    as simulated, since each symbol was run independently.
+    """
+
+    def __init__(self, config: dict, instruments: list = None, risk: dict = None,
+                 max_workers: int = None):
+        portfolio_cfg = config.get('portfolio', {})
+        self.config = config
+        self.instruments = instruments or portfolio_cfg.get('instruments', [])
+        self.risk = risk if risk is not None else portfolio_cfg.get('risk', {})
+        self.max_workers = max_workers or min(len(self.instruments), os.cpu_count() or 1) or 1
+
+    def run(self) -> dict:
+        """
+        Returns {'trades': accepted trades DataFrame, 'rejected': refused trades
+        DataFrame, 'equity': equity curve Series (by exit time),
+        'stats': portfolio metrics, 'symbol_stats': per-symbol metrics}.
+        """
+        print(f"PortfolioBacktest: {len(self.instruments)} instruments on {self.max_workers} workers")
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(_run_instrument_quietly, instrument, self.config)
+                       for instrument in self.instruments]
+            symbol_trades = {inst['symbol']: f.result() for inst, f in zip(self.instruments, futures)}
+
+        symbol_stats = {symbol: PerformanceAnalyzer(trades).compute_detailed_metrics()
+                        for symbol, trades in symbol_trades.items()}
+        all_trades = [trade for trades in symbol_trades.values() for trade in trades]
+        accepted, rejected = self.apply_risk_limits(all_trades)
+        equity = self.equity_curve(accepted)
+        return {
+            'trades': accepted,
+            'rejected': rejected,
+            'equity': equity,
+            'stats': self.portfolio_stats(accepted, equity),
+            'symbol_stats': symbol_stats,
+        }
+
+    @staticmethod
+    def _trade_frame(trades: list) -> pd.DataFrame:
+        df = pd.DataFrame(trades)
+        if df.empty:
+            return pd.DataFrame(columns=['symbol', 'position_type', 'entry_time', 'exit_time', 'pnl'])
+        sign = np.where(df['position_type'] == 'LONG', 1.0, -1.0)
+        df['pnl'] = sign * (df['exit_price'] - df['entry_price']) * df['quantity'] * df['multiplier']
+        return df.sort_values(['entry_time', 'symbol'], kind='stable').reset_index(drop=True)
+
+    def apply_risk_limits(self, trades: list):
+        """Walk all trades in entry order and split them into (accepted, rejected) frames."""
+        df = self._trade_frame(trades)
+        max_positions = self.risk.get('max_open_positions')
+        max_contracts = self.risk.get('max_open_contracts')
+        daily_limit = self.risk.get('daily_loss_limit')
+        drawdown_limit = self.risk.get('max_drawdown_limit')
+
+        open_heap = []          # (exit_time, quantity, pnl) of accepted open trades
+        open_contracts = 0
+        realised = 0.0
+        peak = 0.0
+        day_pnl = {}
+        halted = False
+        accepted = np.zeros(len(df), dtype=bool)
+
+        for i, trade in enumerate(df.itertuples(index=False)):
+            # Book every accepted trade that closed before this entry.
+            while open_heap and open_heap[0][0] <= trade.entry_time:
+                exit_time, quantity, pnl = heapq.heappop(open_heap)
+                open_contracts -= quantity
+                realised += pnl
+                peak = max(peak, realised)
+                day = exit_time.normalize()
+                day_pnl[day] = day_pnl.get(day, 0.0) + pnl
+                if drawdown_limit is not None and peak - realised >= drawdown_limit:
+                    halted = True
+
+            if halted:
+                continue
+            if max_positions is not None and len(open_heap) >= max_positions:
+                continue
+            if max_contracts is not None and open_contracts + trade.quantity > max_contracts:
+                continue
+            if daily_limit is not None and day_pnl.get(trade.entry_time.normalize(), 0.0) <= -daily_limit:
+                continue
+
+            accepted[i] = True
+            open_contracts += trade.quantity
+            heapq.heappush(open_heap, (trade.exit_time, trade.quantity, trade.pnl))
+
+        return df[accepted].reset_index(drop=True), df[~accepted].reset_index(drop=True)
+
+    @staticmethod
+    def equity_curve(trades: pd.DataFrame) -> pd.Series:
+        """Cumulative realised PnL (in currency) of the portfolio, indexed by exit time."""
+        if trades.empty:
+            return pd.Series(dtype=float, name='equity')
+        by_exit = trades.sort_values('exit_time', kind='stable')
+        return pd.Series(by_exit['pnl'].cumsum().to_numpy(), index=by_exit['exit_time'].to_numpy(),
+                         name='equity')
+
+    @staticmethod
+    def portfolio_stats(trades: pd.DataFrame, equity: pd.Series) -> dict:
+        if trades.empty:
+            return {'total_trades': 0}
+        pnl = trades['pnl'].to_numpy()
+        wins = pnl[pnl > 0]
+        losses = pnl[pnl < 0]
+        times = equity.index.to_numpy().astype('datetime64[ns]').view(np.int64)
+        curve = equity.to_numpy()
+        # As PerformanceAnalyzer.compute_detailed_metrics.
+        avg_win = wins.mean() if len(wins) else 0
+        avg_loss = abs(losses.mean()) if len(losses) else 0
+        stats = {
+            'total_trades': len(pnl),
+            'winning_trades': len(wins),
+            'losing_trades': len(losses),
+            'win_rate': len(wins) / len(pnl) * 100,
+            'total_pnl': pnl.sum(),
+            'avg_pl': pnl.mean(),
+            'largest_win': pnl.max(),
+            'largest_loss': pnl.min(),
+            'profit_factor': wins.sum() / abs(losses.sum()) if len(losses) else float('inf'),
+            'ratio_avg_win_loss': avg_win / avg_loss if avg_loss != 0 else float('inf'),
+        }
+        stats.update(PerformanceAnalyzer.drawdown_stats(times, curve))
+        stats.update(PerformanceAnalyzer.risk_ratios(times, curve))
+        return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest the strategy on a portfolio of instruments.")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default='portfolio_trades.csv')
+    args = parser.parse_args(argv)
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+
+    result = PortfolioBacktest(config, max_workers=args.workers).run()
+    for symbol, stats in result['symbol_stats'].items():
+        print_stats(symbol, stats)
+    print_stats("Portfolio (currency)", result['stats'])
+    print(f"Total PnL:             {result['stats'].get('total_pnl', 0):.2f}")
+    print(f"Rejected by limits:    {len(result['rejected'])}")
+    result['trades'].to_csv(args.out, index=False)
+    print(f"Portfolio trades have been saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
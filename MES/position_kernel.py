@@ -0,0 +1,227 @@
+import numpy as np
+import pandas as pd
+
+from strategy_logic import LONG_REASON, SHORT_REASON
+from trade_ledger import EXIT_REASONS, Position
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; the kernel then runs as plain Python.
+    njit = None
+
+REASON_STOP = EXIT_REASONS.index('StopLoss hit')
+REASON_TRAILING = EXIT_REASONS.index('StopLoss hit (trailing)')
+REASON_TARGET = EXIT_REASONS.index('TakeProfit hit')
+
+
+def _position_kernel(signals, session, close, path_high, path_low, path_start, entry_skip,
+                     stop_offset, target_offset, trailing, trailing_offset,
+                     out_side, out_entry_bar, out_exit_bar, out_entry_price, out_exit_price, out_reason,
+                     state):
+    """
+    One pass over the bars. A flat position opens at the close of an
+    in-session bar with a signal; an open position is then checked on the
+    bar's path entries (the bar itself, or its 1m sub-bars), updating the
+    trailing best price first and checking the stop before the target,
+    as ExecutionSimulator.check_exit_levels does.
+
+    Writes closed trades into the out_* arrays and returns their count.
+    state holds [side, entry_bar, entry_price, best_price] of a position
+    already open before the first bar (side 0 if flat, entry_bar -1), and
+    receives the same for a position still open after the last bar.
+    """
+    n_bars = len(close)
+    n_trades = 0
+    side = int(state[0])
+    entry_bar = int(state[1])
+    entry_price = state[2]
+    best = state[3]
+    for i in range(n_bars):
+        first = path_start[i]
+        if side == 0:
+            if not session[i] or signals[i] == 0:
+                continue
+            side = 1 if signals[i] > 0 else -1
+            entry_bar = i
+            entry_price = close[i]
+            best = entry_price
+            if entry_skip:
+                continue
+
+        for k in range(first, path_start[i + 1]):
+            high = path_high[k]
+            low = path_low[k]
+            if side == 1:
+                if trailing:
+                    if high > best:
+                        best = high
+                    stop = best - trailing_offset
+                else:
+                    stop = entry_price - stop_offset
+                target = entry_price + target_offset
+                stop_hit = low <= stop
+                target_hit = high >= target
+            else:
+                if trailing:
+                    if low < best:
+                        best = low
+                    stop = best + trailing_offset
+                else:
+                    stop = entry_price + stop_offset
+                target = entry_price - target_offset
+                stop_hit = high >= stop
+                target_hit = low <= target
+
+            if stop_hit or target_hit:
+                out_side[n_trades] = side
+                out_entry_bar[n_trades] = entry_bar
+                out_exit_bar[n_trades] = i
+                out_entry_price[n_trades] = entry_price
+                if stop_hit:
+                    out_exit_price[n_trades] = stop
+                    out_reason[n_trades] = REASON_TRAILING if trailing else REASON_STOP
+                else:
+                    out_exit_price[n_trades] = target
+                    out_reason[n_trades] = REASON_TARGET
+                n_trades += 1
+                side = 0
+                break
+
+    state[0] = side
+    state[1] = entry_bar
+    state[2] = entry_price
+    state[3] = best
+    return n_trades
+
+
+_compiled_kernel = njit(cache=True, nogil=True)(_position_kernel) if njit is not None else None
+
+
+def run_position_kernel(signals, session, close, path_high, path_low, path_start, entry_skip: bool,
+                        stop_offset: float, target_offset: float, trailing: bool, trailing_offset: float,
+                        compiled: bool = None, open_position=None) -> dict:
+    """
+    Run the position kernel and return the closed trades as arrays
+    ('side', 'entry_bar', 'exit_bar', 'entry_price', 'exit_price',
+    'reason_code') plus 'open' (side, entry_bar, entry_price, best_price)
+    for a position left open.
+
+    open_position=(side, entry_price, best_price) continues a position
+    opened before these bars; its trade reports entry_bar -1.
+
+    compiled=None uses Numba when it is installed; False forces the
+    pure-Python loop (run on lists, which Python indexes fastest).
+    """
+    n = len(close)
+    use_numba = _compiled_kernel is not None if compiled is None else compiled
+    if use_numba and _compiled_kernel is None:
+        raise ImportError("numba is not installed")
+
+    out = {
+        'side': np.zeros(n, dtype=np.int8),
+        'entry_bar': np.zeros(n, dtype=np.int64),
+        'exit_bar': np.zeros(n, dtype=np.int64),
+        'entry_price': np.zeros(n, dtype=np.float64),
+        'exit_price': np.zeros(n, dtype=np.float64),
+        'reason_code': np.zeros(n, dtype=np.int16),
+    }
+    state = np.zeros(4)
+    if open_position is not None:
+        state[:] = (open_position[0], -1, open_position[1], open_position[2])
+    args = (np.ascontiguousarray(signals, dtype=np.int8), np.ascontiguousarray(session, dtype=np.bool_),
+            np.ascontiguousarray(close, dtype=np.float64), np.ascontiguousarray(path_high, dtype=np.float64),
+            np.ascontiguousarray(path_low, dtype=np.float64), np.ascontiguousarray(path_start, dtype=np.int64))
+    params = (bool(entry_skip), float(stop_offset), float(target_offset), bool(trailing), float(trailing_offset))
+
+    if use_numba:
+        count = _compiled_kernel(*args, *params, out['side'], out['entry_bar'], out['exit_bar'],
+                                 out['entry_price'], out['exit_price'], out['reason_code'], state)
+    else:
+        lists = {name: [0] * n for name in out}
+        state_list = state.tolist()
+        count = _position_kernel(*(a.tolist() for a in args), *params,
+                                 lists['side'], lists['entry_bar'], lists['exit_bar'],
+                                 lists['entry_price'], lists['exit_price'], lists['reason_code'], state_list)
+        for name, values in lists.items():
+            out[name][:count] = values[:count]
+        state[:] = state_list
+
+    result = {name: values[:count] for name, values in out.items()}
+    result['open'] = (int(state[0]), int(state[1]), float(state[2]), float(state[3]))
+    return result
+
+
+class KernelEngine:
+    """
+    Drop-in alternative to ColumnarEngine that runs the whole position
+    state machine in position_kernel (compiled with Numba when available)
+    and writes the trades into the simulator's ledger in one batch.
+    Per-trade console output is not produced.
+    """
+
+    def __init__(self, strategy_logic, simulator, compiled: bool = None):
+        self.strategy_logic = strategy_logic
+        self.simulator = simulator
+        self.compiled = compiled
+
+    def run(self, merged: pd.DataFrame, session_mask, intrabar=None, signals=None):
+        """
+        Same arguments as ColumnarEngine.run. Returns the simulator's TradeLedger.
+
+        :param signals: Precomputed entry signals (e.g. one row of a RulePlan
+                        matrix); by default the strategy's own rule is evaluated.
+        """
+        times = merged['time'].to_numpy()
+        close = merged['close'].to_numpy(dtype=float)
+        if intrabar is None:
+            path_high = merged['high'].to_numpy(dtype=float)
+            path_low = merged['low'].to_numpy(dtype=float)
+            path_start = np.arange(len(close) + 1)
+        else:
+            path_high, path_low, path_start = intrabar.high, intrabar.low, intrabar.start
+
+        if signals is None:
+            signals = self.strategy_logic.compute_frame_signals(merged)
+        sim = self.simulator
+        carried = sim.open_position
+        result = run_position_kernel(
+            signals, session_mask, close, path_high, path_low, path_start,
+            entry_skip=intrabar is not None,
+            stop_offset=sim.stop_offset, target_offset=sim.target_offset,
+            trailing=sim.enable_trailing_stop, trailing_offset=sim.trailing_stop_offset,
+            compiled=self.compiled,
+            open_position=None if carried is None else (1 if carried.type == 'LONG' else -1,
+                                                         carried.entry_price, carried.best_price),
+        )
+
+        time_index = pd.DatetimeIndex(times)
+        time_ns = time_index.as_unit('ns').asi8
+        entry_time = time_ns[np.maximum(result['entry_bar'], 0)] if len(time_ns) else result['entry_bar']
+        if carried is not None:
+            # The carried position's trade (entry_bar -1) keeps its original entry time.
+            entry_time[result['entry_bar'] < 0] = pd.Timestamp(carried.entry_time).as_unit('ns').value
+        sim.ledger.extend(
+            side=result['side'],
+            entry_price=result['entry_price'],
+            exit_price=result['exit_price'],
+            entry_time=entry_time,
+            exit_time=time_ns[result['exit_bar']],
+            quantity=np.full(len(result['side']), sim.default_quantity),
+            reason_code=result['reason_code'],
+            tz=time_index.tz,
+        )
+
+        side, entry_bar, entry_price, best = result['open']
+        sim.open_position = None
+        if side != 0 and entry_bar < 0:
+            sim.open_position = carried
+            carried.best_price = best
+        elif side != 0:
+            position_type = 'LONG' if side > 0 else 'SHORT'
+            long_reason = getattr(self.strategy_logic, 'long_reason', LONG_REASON)
+            short_reason = getattr(self.strategy_logic, 'short_reason', SHORT_REASON)
+            sim.open_position = Position(position_type, entry_price, pd.Timestamp(times[entry_bar]),
+                                         sim.default_quantity,
+                                         long_reason if side > 0 else short_reason)
+            sim.open_position.best_price = best
+        return sim.ledger
@@ -0,0 +1,327 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import uuid
+
+import numpy as np
+import pandas as pd
+
+# Summary metrics stored as indexed columns (compute_detailed_metrics keys).
+METRIC_COLUMNS = {
+    'total_trades': 'INTEGER',
+    'winning_trades': 'INTEGER',
+    'losing_trades': 'INTEGER',
+    'win_rate': 'REAL',
+    'total_pnl': 'REAL',
+    'avg_pl': 'REAL',
+    'largest_win': 'REAL',
+    'largest_loss': 'REAL',
+    'profit_factor': 'REAL',
+    'ratio_avg_win_loss': 'REAL',
+    'avg_bar_count': 'REAL',
+    'exposure': 'REAL',
+    'max_drawdown': 'REAL',
+    'max_drawdown_duration_bars': 'INTEGER',
+    'max_drawdown_duration_days': 'REAL',
+    'sharpe': 'REAL',
+    'sortino': 'REAL',
+}
+RUN_COLUMNS = ['run_key', 'created_at', 'label', 'config_hash', 'data_fingerprint',
+               'params', 'config', 'trades_blob'] + list(METRIC_COLUMNS)
+
+
+def _parquet_available() -> bool:
+    for module in ('pyarrow', 'fastparquet'):
+        try:
+            __import__(module)
+            return True
+        except ImportError:
+            pass
+    return False
+
+
+def config_hash(config: dict) -> str:
+    return hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _source_key(source: str) -> str:
+    if source and os.path.exists(source):
+        stat = os.stat(source)
+        source = f'{os.path.abspath(source)}:{stat.st_size}:{stat.st_mtime_ns}'
+    return source
+
+
+def data_fingerprint(timeframes: dict) -> str:
+    """
+    Identity of the loaded data: per timeframe, the source file (path, size,
+    mtime) or a hash of the close column, plus the row count and the
+    first/last bar time.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for tf in sorted(timeframes):
+        df = timeframes[tf]
+        source = _source_key(df.attrs.get('source_fingerprint') or df.attrs.get('source_file'))
+        if source:
+            digest.update(f'{tf}:{source}'.encode())
+        else:
+            digest.update(tf.encode())
+            digest.update(np.ascontiguousarray(df['close'].to_numpy(dtype=float)).view(np.uint8))
+        if len(df):
+            digest.update(f'{len(df)}:{df.index[0]}:{df.index[-1]}'.encode())
+    return digest.hexdigest()
+
+
+def extents_fingerprint(extents: dict) -> str:
+    """
+    data_fingerprint of data read in pieces, from per-timeframe tallies
+    {'source', 'rows', 'first', 'last'}. Equal to data_fingerprint of the
+    whole series when each timeframe has a source file; without one only
+    the timeframe and extent are hashed.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for tf in sorted(extents):
+        extent = extents[tf]
+        source = _source_key(extent['source'])
+        digest.update(f'{tf}:{source}'.encode() if source else tf.encode())
+        if extent['rows']:
+            digest.update(f"{extent['rows']}:{extent['first']}:{extent['last']}".encode())
+    return digest.hexdigest()
+
+
+def write_trade_blob(trades: pd.DataFrame, blob_dir: str, trade_format: str = 'parquet') -> str:
+    """
+    Write one run's trades to blob_dir and return the file name relative to
+    it. Parquet needs pyarrow or fastparquet; without them the columns go
+    into a compressed .npz. Safe to call from worker processes.
+    """
+    if trade_format == 'parquet' and not _parquet_available():
+        trade_format = 'npz'
+    name = uuid.uuid4().hex
+    relpath = os.path.join(name[:2], f'{name}.{trade_format}')
+    path = os.path.join(blob_dir, relpath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.tmp'
+    if trade_format == 'parquet':
+        trades.to_parquet(tmp, index=False)
+    elif trade_format == 'npz':
+        columns = {}
+        for col in trades.columns:
+            values = trades[col]
+            if values.dtype == object or isinstance(values.dtype, (pd.CategoricalDtype, pd.StringDtype)):
+                columns[col] = values.astype(str).to_numpy(dtype=str)
+            else:
+                columns[col] = values.to_numpy()
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, **columns)
+    else:
+        raise ValueError(f"Unknown trade format: {trade_format}")
+    os.replace(tmp, path)
+    return relpath
+
+
+def read_trade_blob(path: str) -> pd.DataFrame:
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    with np.load(path) as blob:
+        trades = pd.DataFrame({col: blob[col] for col in blob.files})
+    for col in ('position_type', 'reason', 'symbol'):
+        if col in trades:
+            trades[col] = trades[col].astype('category')
+    return trades
+
+
+class ResultsStore:
+    """
+    Queryable store of backtest runs.
+
+    Each run is one row of a SQLite 'runs' table: the full config (JSON),
+    its hash, the data fingerprint, the swept parameters and the
+    compute_detailed_metrics values in indexed columns. The trades go into
+    a Parquet file (or .npz without a Parquet engine) under blob_dir, named
+    in the row.
+
+    add_run() only buffers the row; rows are inserted in one transaction per
+    flush() (every batch_size runs, and on close). The database runs in WAL
+    mode with a busy timeout, so readers are not blocked and several
+    processes can append to the same store. Worker processes can write trade
+    blobs themselves with write_trade_blob and hand only the file name back.
+    """
+
+    def __init__(self, path: str = './results/results.db', blob_dir: str = None,
+                 trade_format: str = 'parquet', batch_size: int = 500):
+        self.path = path
+        self.blob_dir = blob_dir or os.path.join(os.path.dirname(os.path.abspath(path)), 'trades')
+        self.trade_format = trade_format
+        self.batch_size = batch_size
+        self._pending = []
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._create_schema()
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'ResultsStore':
+        """Build from the "results" section of config.json."""
+        cfg = config.get('results', {})
+        return cls(
+            path = cfg.get('database', './results/results.db'),
+            blob_dir = cfg.get('blob_dir'),
+            trade_format = cfg.get('trade_format', 'parquet'),
+            batch_size = cfg.get('batch_size', 500)
+        )
+
+    def _create_schema(self):
+        metrics = ',\n'.join(f'    {name} {kind}' for name, kind in METRIC_COLUMNS.items())
+        with self.conn:
+            self.conn.execute(f"""
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id INTEGER PRIMARY KEY,
+                    run_key TEXT UNIQUE NOT NULL,
+                    created_at TEXT NOT NULL,
+                    label TEXT,
+                    config_hash TEXT NOT NULL,
+                    data_fingerprint TEXT,
+                    params TEXT,
+                    config TEXT NOT NULL,
+                    trades_blob TEXT,
+                {metrics}
+                )""")
+            for name in ['config_hash', 'data_fingerprint', 'label'] + list(METRIC_COLUMNS):
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS idx_runs_{name} ON runs ({name})')
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def write_trades(self, trades) -> str:
+        """Write a trade DataFrame or TradeLedger as a blob; returns its name."""
+        if hasattr(trades, 'to_frame'):
+            trades = trades.to_frame()
+        return write_trade_blob(trades, self.blob_dir, self.trade_format)
+
+    def add_run(self, config: dict, metrics: dict, trades=None, data_fingerprint: str = None,
+                params: dict = None, label: str = None, trades_blob: str = None) -> str:
+        """
+        Buffer one run and return its run_key. Pass either the trades
+        (DataFrame or TradeLedger) or the name of an already written blob.
+        """
+        if trades is not None and trades_blob is None:
+            trades_blob = self.write_trades(trades)
+        row = {
+            'run_key': uuid.uuid4().hex,
+            'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'label': label,
+            'config_hash': config_hash(config),
+            'data_fingerprint': data_fingerprint,
+            'params': json.dumps(params, sort_keys=True, default=str) if params is not None else None,
+            'config': json.dumps(config, sort_keys=True, default=str),
+            'trades_blob': trades_blob,
+        }
+        for name, kind in METRIC_COLUMNS.items():
+            value = metrics.get(name)
+            if value is not None:
+                value = int(value) if kind == 'INTEGER' else float(value)
+            row[name] = value
+        self._pending.append(row)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        return row['run_key']
+
+    def flush(self):
+        """Insert the buffered runs in one transaction."""
+        if not self._pending:
+            return
+        placeholders = ', '.join('?' for _ in RUN_COLUMNS)
+        rows = [tuple(row[name] for name in RUN_COLUMNS) for row in self._pending]
+        with self.conn:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.executemany(f"INSERT INTO runs ({', '.join(RUN_COLUMNS)}) VALUES ({placeholders})", rows)
+        self._pending.clear()
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def query(self, where: str = None, args=(), order_by: str = None, descending: bool = True,
+              limit: int = None, columns=None) -> pd.DataFrame:
+        """
+        Runs as a DataFrame, e.g. the top 50 by profit factor with drawdown
+        above -30:
+
+            store.query('max_drawdown > ?', (-30,), order_by='profit_factor', limit=50)
+
+        :param where: SQL condition over the run columns, with ? placeholders.
+        :param columns: Columns to return (default: everything but the config JSON).
+        """
+        self.flush()
+        columns = columns or ['run_id'] + [c for c in RUN_COLUMNS if c != 'config']
+        sql = f"SELECT {', '.join(columns)} FROM runs"
+        if where:
+            sql += f' WHERE {where}'
+        if order_by:
+            if order_by not in METRIC_COLUMNS and order_by not in ('run_id', 'created_at'):
+                raise ValueError(f"Cannot order by {order_by}")
+            # A bare indexed column, so SQLite can walk its index and stop at the limit.
+            sql += f" ORDER BY {order_by} {'DESC' if descending else 'ASC'}"
+        if limit is not None:
+            sql += f' LIMIT {int(limit)}'
+        return pd.read_sql_query(sql, self.conn, params=tuple(args))
+
+    def get_config(self, run_key: str) -> dict:
+        row = self.conn.execute('SELECT config FROM runs WHERE run_key = ?', (run_key,)).fetchone()
+        if row is None:
+            raise KeyError(run_key)
+        return json.loads(row[0])
+
+    def load_trades(self, run_key: str) -> pd.DataFrame:
+        self.flush()
+        row = self.conn.execute('SELECT trades_blob FROM runs WHERE run_key = ?', (run_key,)).fetchone()
+        if row is None:
+            raise KeyError(run_key)
+        if row[0] is None:
+            return pd.DataFrame()
+        return read_trade_blob(os.path.join(self.blob_dir, row[0]))
+
+    def __len__(self):
+        self.flush()
+        return self.conn.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the backtest results store.")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--database', default=None)
+    parser.add_argument('--where', default=None, help="SQL condition, e.g. \"max_drawdown > -30\"")
+    parser.add_argument('--order-by', default='profit_factor')
+    parser.add_argument('--ascending', action='store_true')
+    parser.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args(argv)
+
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config, 'r') as f:
+            config = json.load(f)
+    if args.database:
+        config.setdefault('results', {})['database'] = args.database
+    with ResultsStore.from_config(config) as store:
+        runs = store.query(args.where, order_by=args.order_by, descending=not args.ascending,
+                           limit=args.limit)
+    columns = ['run_key', 'label', 'params', 'total_trades', 'total_pnl', 'profit_factor',
+               'max_drawdown', 'sharpe', 'win_rate']
+    print(runs[columns].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
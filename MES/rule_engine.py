@@ -0,0 +1,197 @@
+import numpy as np
+import pandas as pd
+
+# Comparison operators of the rule format. '<' and '<=' are stored as '>'
+# and '>=' with the operands swapped, so "a < b" and "b > a" share a node.
+COMPARISONS = ('>', '<', '>=', '<=', 'crosses_above', 'crosses_below')
+
+
+class RulePlan:
+    """
+    Compiles declarative entry rules for many strategy variants into one
+    evaluation plan over the merged frame.
+
+    A variant is a dict with a 'name' and a 'long' and/or 'short'
+    expression (optional 'long_reason'/'short_reason' label the entries).
+    An expression is either
+
+      [left, op, right]   a comparison; op is one of COMPARISONS and each
+                          operand is a merged column name ('close',
+                          'RSI_5m', 'EMA_medium_1m', ...) or a number
+      {"all": [expr, ...]}, {"any": [expr, ...]}, {"not": expr}
+
+    'crosses_above' is true on the bar where left > right after
+    left <= right on the previous bar (never on the first bar).
+    Comparisons involving NaN are false, as in StrategyLogic.check_signal.
+
+    Every expression is reduced to a canonical form (operands of '<'
+    swapped, AND/OR children flattened, deduplicated and sorted, double NOT
+    removed) and interned, so a subexpression such as close > EMA_medium_5m
+    is computed once however many variants use it. evaluate() returns a
+    (variants x bars) int8 signal matrix: 1 LONG, -1 SHORT, 0 none; where
+    both fire, LONG wins, as in check_signal.
+    """
+
+    def __init__(self, variants):
+        self.variants = []
+        self.columns = set()
+        self.expression_count = 0   # expressions as written, before sharing
+        self._nodes = []            # (op, args); children always precede parents
+        self._ids = {}
+        self._outputs = []          # (long node or None, short node or None) per variant
+        for i, variant in enumerate(variants):
+            variant = dict(variant)
+            variant.setdefault('name', f'variant_{i}')
+            if variant.get('long') is None and variant.get('short') is None:
+                raise ValueError(f"Rule {variant['name']} has neither a 'long' nor a 'short' expression")
+            variant.setdefault('long_reason', f"{variant['name']}: long")
+            variant.setdefault('short_reason', f"{variant['name']}: short")
+            self.variants.append(variant)
+            self._outputs.append(tuple(None if variant.get(side) is None else self._compile(variant[side])
+                                       for side in ('long', 'short')))
+        self._order, self._last_use = self._schedule()
+
+    @property
+    def size(self) -> int:
+        """Distinct expressions the plan evaluates."""
+        return len(self._order)
+
+    @property
+    def uses_history(self) -> bool:
+        """True if any rule looks at the previous bar (crossovers)."""
+        return any(self._nodes[i][0] == 'cross' for i in self._order)
+
+    # ------------------------------------------------------------------
+    # Compilation
+    # ------------------------------------------------------------------
+    def _intern(self, node) -> int:
+        if node not in self._ids:
+            self._ids[node] = len(self._nodes)
+            self._nodes.append(node)
+        return self._ids[node]
+
+    def _operand(self, value):
+        if isinstance(value, str):
+            self.columns.add(value)
+            return ('col', value)
+        if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+            return ('const', float(value))
+        raise ValueError(f"Invalid rule operand: {value!r}")
+
+    def _compile(self, expr) -> int:
+        self.expression_count += 1
+        if isinstance(expr, dict):
+            if len(expr) != 1:
+                raise ValueError(f"Invalid rule expression: {expr!r}")
+            (op, arg), = expr.items()
+            if op in ('all', 'any'):
+                if not arg:
+                    raise ValueError(f"Empty '{op}' in rule expression")
+                children = set()
+                for child in arg:
+                    node = self._compile(child)
+                    if self._nodes[node][0] == op:
+                        children.update(self._nodes[node][1])
+                    else:
+                        children.add(node)
+                children = tuple(sorted(children))
+                return children[0] if len(children) == 1 else self._intern((op, children))
+            if op == 'not':
+                node = self._compile(arg)
+                if self._nodes[node][0] == 'not':
+                    return self._nodes[node][1][0]
+                return self._intern(('not', (node,)))
+            raise ValueError(f"Unknown rule operator: {op}")
+
+        if isinstance(expr, (list, tuple)) and len(expr) == 3 and expr[1] in COMPARISONS:
+            left, op, right = expr
+            a, b = self._operand(left), self._operand(right)
+            if op == '>':
+                return self._intern(('gt', (a, b)))
+            if op == '<':
+                return self._intern(('gt', (b, a)))
+            if op == '>=':
+                return self._intern(('ge', (a, b)))
+            if op == '<=':
+                return self._intern(('ge', (b, a)))
+            if op == 'crosses_below':
+                a, b = b, a
+            # a crosses above b: a > b now and b >= a on the previous bar.
+            now = self._intern(('gt', (a, b)))
+            before = self._intern(('ge', (b, a)))
+            return self._intern(('cross', (now, before)))
+        raise ValueError(f"Invalid rule expression: {expr!r}")
+
+    def _schedule(self):
+        """Nodes reachable from the outputs, in evaluation order, and each one's last reader."""
+        reachable = set()
+        stack = [node for pair in self._outputs for node in pair if node is not None]
+        while stack:
+            node = stack.pop()
+            if node in reachable:
+                continue
+            reachable.add(node)
+            op, args = self._nodes[node]
+            if op in ('all', 'any', 'not', 'cross'):
+                stack.extend(args)
+        order = sorted(reachable)
+        last_use = {}
+        for node in order:
+            op, args = self._nodes[node]
+            if op in ('all', 'any', 'not', 'cross'):
+                for child in args:
+                    last_use[child] = node
+        return order, last_use
+
+    # ------------------------------------------------------------------
+    # Evaluation
+    # ------------------------------------------------------------------
+    def evaluate(self, data) -> np.ndarray:
+        """
+        (variants x bars) int8 signal matrix.
+
+        :param data: The merged frame, or a dict of equal-length column arrays.
+        """
+        missing = [name for name in sorted(self.columns) if name not in data]
+        if missing:
+            raise KeyError(f"Rule columns not in the data: {missing}")
+        columns = {name: np.asarray(data[name], dtype=float) for name in self.columns}
+        if isinstance(data, pd.DataFrame):
+            n = len(data)
+        else:
+            n = len(next(iter(columns.values()))) if columns else len(next(iter(data.values())))
+
+        def operand(ref):
+            return columns[ref[1]] if ref[0] == 'col' else ref[1]
+
+        outputs = {node for pair in self._outputs for node in pair if node is not None}
+        values = {}
+        for node in self._order:
+            op, args = self._nodes[node]
+            if op in ('gt', 'ge'):
+                compare = np.greater if op == 'gt' else np.greater_equal
+                result = np.broadcast_to(compare(operand(args[0]), operand(args[1])), n)
+            elif op == 'cross':
+                now, before = values[args[0]], values[args[1]]
+                result = np.zeros(n, dtype=bool)
+                np.logical_and(now[1:], before[:-1], out=result[1:])
+            elif op == 'not':
+                result = ~values[args[0]]
+            else:
+                combine = np.logical_and if op == 'all' else np.logical_or
+                result = combine(values[args[0]], values[args[1]])
+                for child in args[2:]:
+                    combine(result, values[child], out=result)
+            values[node] = result
+            # Drop intermediate results once their last reader has run.
+            for child in args if op in ('all', 'any', 'not', 'cross') else ():
+                if self._last_use.get(child) == node and child not in outputs:
+                    values.pop(child, None)
+
+        signals = np.zeros((len(self._outputs), n), dtype=np.int8)
+        for row, (long_node, short_node) in enumerate(self._outputs):
+            if short_node is not None:
+                signals[row][values[short_node]] = -1
+            if long_node is not None:
+                signals[row][values[long_node]] = 1
+        return signals
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+NS_PER_MINUTE = 60 * 10 ** 9
+NS_PER_DAY = 1440 * NS_PER_MINUTE
+MINUTES_PER_DAY = 1440
+
+# (mask, session_ids) results shared by every SessionCalendar of this process,
+# keyed on the calendar definition and data (see SessionCalendar._cache_key);
+# the least recently used beyond MEMORY_CACHE_SIZE are dropped.
+_memory = OrderedDict()
+MEMORY_CACHE_SIZE = 8
+
+# Used when config.json has no "sessions" section; "full" matches the
+# original is_within_full_session window.
+DEFAULT_SESSIONS = {
+    'full': {'start': '09:30', 'end': '17:30'},
+}
+
+
+def _minutes(hhmm: str) -> int:
+    hours, minutes = hhmm.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def _day_numbers(dates) -> np.ndarray:
+    """Days since 1970-01-01 for a list of dates."""
+    return np.asarray(pd.to_datetime(list(dates)).to_numpy().astype('datetime64[D]').astype(np.int64))
+
+
+class SessionCalendar:
+    """
+    Vectorized trading-session calendar.
+
+    Each named session has a local start and end time ("HH:MM", end
+    exclusive) in the exchange time zone and optionally the weekdays it
+    trades (0 = Monday, judged on the trading day). A session whose end is
+    not after its start runs overnight, e.g. CME Globex 18:00-17:00, and
+    belongs to the trading day on which it ends.
+
+    Holidays close every session for that trading day; an early close
+    ("YYYY-MM-DD": "HH:MM") ends the session at that local time on that
+    calendar day.
+
+    mask()/session_ids() evaluate the whole time index in one pass. Results
+    can be cached per data file (see compute).
+    """
+
+    def __init__(self, sessions: dict = None, timezone: str = None, data_timezone: str = None,
+                 holidays=None, early_closes: dict = None, cache_dir: str = None):
+        """
+        :param sessions: {name: {'start': 'HH:MM', 'end': 'HH:MM', 'days': [0..6]}}.
+        :param timezone: Exchange time zone the session times are in. None means
+                         bar times are already exchange-local.
+        :param data_timezone: Time zone of naive bar times (default: same as timezone).
+        :param cache_dir: Directory for cached masks; None disables the disk cache.
+        """
+        self.sessions = sessions or DEFAULT_SESSIONS
+        self.timezone = timezone
+        self.data_timezone = data_timezone
+        self.holidays = np.unique(_day_numbers(holidays or []))
+        early_closes = early_closes or {}
+        order = np.argsort(_day_numbers(early_closes.keys())) if early_closes else []
+        self.early_close_days = _day_numbers(early_closes.keys())[order] if early_closes else np.empty(0, np.int64)
+        self.early_close_minutes = (np.array([_minutes(v) for v in early_closes.values()])[order]
+                                    if early_closes else np.empty(0, np.int64))
+        self.cache_dir = cache_dir
+        self._definition = json.dumps({
+            'sessions': self.sessions, 'timezone': timezone, 'data_timezone': data_timezone,
+            'holidays': sorted(str(h) for h in holidays or []), 'early_closes': early_closes,
+        }, sort_keys=True)
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'SessionCalendar':
+        """Build from the "sessions" section of config.json (defaults if absent)."""
+        cfg = config.get('sessions', {})
+        return cls(
+            sessions = cfg.get('definitions'),
+            timezone = cfg.get('timezone'),
+            data_timezone = cfg.get('data_timezone'),
+            holidays = cfg.get('holidays'),
+            early_closes = cfg.get('early_closes'),
+            cache_dir = cfg.get('cache_dir')
+        )
+
+    # ------------------------------------------------------------------
+    # Evaluation
+    # ------------------------------------------------------------------
+    def local_ns(self, times) -> np.ndarray:
+        """Exchange-local wall-clock times as int64 ns (NaT where a local time does not exist)."""
+        index = pd.DatetimeIndex(times)
+        if self.timezone is not None:
+            if index.tz is None:
+                index = index.tz_localize(self.data_timezone or self.timezone,
+                                          ambiguous='NaT', nonexistent='NaT')
+            index = index.tz_convert(self.timezone).tz_localize(None)
+        elif index.tz is not None:
+            index = index.tz_localize(None)
+        return index.as_unit('ns').asi8
+
+    def evaluate(self, times, session: str):
+        """(mask, session_ids) for one session; ids are trading-day numbers, -1 outside."""
+        if session not in self.sessions:
+            raise KeyError(f"Unknown session: {session}")
+        spec = self.sessions[session]
+        start, end = _minutes(spec['start']), _minutes(spec['end'])
+
+        local = self.local_ns(times)
+        valid = local != np.iinfo(np.int64).min
+        day = local // NS_PER_DAY
+        minute = (local // NS_PER_MINUTE) % MINUTES_PER_DAY
+
+        if end > start:
+            inside = (minute >= start) & (minute < end)
+            trading_day = day
+        else:
+            # Overnight: the evening part belongs to the next trading day.
+            evening = minute >= start
+            inside = evening | (minute < end)
+            trading_day = day + evening
+
+        inside &= valid
+        if spec.get('days') is not None:
+            weekday = (trading_day + 3) % 7   # 1970-01-01 was a Thursday
+            inside &= np.isin(weekday, spec['days'])
+        if len(self.holidays):
+            inside &= ~np.isin(trading_day, self.holidays)
+        if len(self.early_close_days):
+            k = np.minimum(np.searchsorted(self.early_close_days, day), len(self.early_close_days) - 1)
+            closes_early = self.early_close_days[k] == day
+            inside &= ~(closes_early & (minute >= self.early_close_minutes[k]) & (trading_day == day))
+
+        session_ids = np.where(inside, trading_day, -1)
+        return inside, session_ids
+
+    def compute(self, times, session: str = 'full', source_file: str = None):
+        """
+        evaluate() with caching. Results are memoised in memory for the
+        whole process (shared by calendars built from the same config, as
+        backtesting_app.build_session_mask does on every call), and on disk
+        under cache_dir when source_file is given; a cache entry is keyed on
+        the calendar definition, the session name, the file's size/mtime and
+        the row count and first/last time of `times`.
+        """
+        times = np.asarray(times)
+        key = self._cache_key(times, session, source_file)
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+
+        path = None
+        if self.cache_dir and source_file:
+            path = os.path.join(self.cache_dir, key + '.npz')
+            if os.path.exists(path):
+                with np.load(path) as cached:
+                    result = (cached['mask'], cached['session_ids'])
+                self._remember(key, result)
+                return result
+
+        result = self.evaluate(times, session)
+        if path is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp = f'{path}.{uuid.uuid4().hex}.tmp.npz'
+            np.savez(tmp, mask=result[0], session_ids=result[1])
+            os.replace(tmp, path)
+        self._remember(key, result)
+        return result
+
+    @staticmethod
+    def _remember(key: str, result: tuple):
+        while len(_memory) >= max(MEMORY_CACHE_SIZE, 1):
+            _memory.popitem(last=False)
+        _memory[key] = result
+
+    def mask(self, times, session: str = 'full', source_file: str = None) -> np.ndarray:
+        """Boolean array, True where `session` is open."""
+        return self.compute(times, session, source_file)[0]
+
+    def session_ids(self, times, session: str = 'full', source_file: str = None) -> np.ndarray:
+        """Trading-day number of the session each bar belongs to, -1 outside the session."""
+        return self.compute(times, session, source_file)[1]
+
+    def _cache_key(self, times: np.ndarray, session: str, source_file: str) -> str:
+        digest = hashlib.sha1(self._definition.encode())
+        digest.update(session.encode())
+        if source_file and os.path.exists(source_file):
+            stat = os.stat(source_file)
+            digest.update(f'{os.path.abspath(source_file)}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+        else:
+            digest.update(np.ascontiguousarray(times).view(np.uint8))
+        if len(times):
+            digest.update(f'{len(times)}:{times[0]}:{times[-1]}'.encode())
+        return digest.hexdigest()
@@ -0,0 +1,90 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+
+class SharedArrays:
+    """
+    Publishes a dict of NumPy arrays in one shared-memory block so worker
+    processes can read them without each getting a pickled copy.
+
+    The owner creates the block and passes `handle` (a small picklable tuple)
+    to the workers, which call SharedArrays.attach(handle) to get zero-copy
+    views of the same arrays.
+    """
+
+    def __init__(self, arrays: dict):
+        layout = {}
+        offset = 0
+        for name, arr in arrays.items():
+            arr = np.ascontiguousarray(arr)
+            # Keep every array 64-byte aligned inside the block.
+            offset = (offset + 63) // 64 * 64
+            layout[name] = (offset, arr.shape, arr.dtype.str)
+            offset += arr.nbytes
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        self.layout = layout
+        self.arrays = self._views(self.shm, layout)
+        for name, arr in arrays.items():
+            self.arrays[name][...] = arr
+
+    @property
+    def handle(self):
+        return (self.shm.name, self.layout)
+
+    @staticmethod
+    def _views(shm, layout):
+        return {
+            name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for name, (offset, shape, dtype) in layout.items()
+        }
+
+    @staticmethod
+    def attach(handle):
+        """
+        Attach to a block created in another process.
+        Returns (shm, arrays); keep `shm` referenced for as long as the arrays are used.
+        """
+        name, layout = handle
+        # Workers started by multiprocessing share the owner's resource tracker,
+        # so the block is still unlinked exactly once, by close() in the owner.
+        shm = shared_memory.SharedMemory(name=name)
+        return shm, SharedArrays._views(shm, layout)
+
+    def close(self):
+        self.arrays = {}
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def frames_to_arrays(timeframes: dict) -> dict:
+    """Flatten DataLoader.load_all_timeframes output into '<tf>/<column>' arrays."""
+    arrays = {}
+    for tf, df in timeframes.items():
+        arrays[f'{tf}/time'] = df.index.to_numpy()
+        for col in df.columns:
+            arrays[f'{tf}/{col}'] = df[col].to_numpy()
+    return arrays
+
+
+def arrays_to_frames(arrays: dict) -> dict:
+    """Inverse of frames_to_arrays; the frames wrap the arrays without copying."""
+    columns = {}
+    for key in arrays:
+        tf, col = key.split('/', 1)
+        if col != 'time':
+            columns.setdefault(tf, []).append(col)
+
+    timeframes = {}
+    for tf, cols in columns.items():
+        index = pd.DatetimeIndex(arrays[f'{tf}/time'], name='time')
+        timeframes[tf] = pd.DataFrame({c: arrays[f'{tf}/{c}'] for c in cols}, index=index, copy=False)
+    return timeframes
@@ -1,21 +1,109 @@
 # File: C:\cygwin64\home\student\Test_Strategies\MES\strategy_logic.py
 
+import numpy as np
+
 from entry_manager import EntryManager
 from exit_manager import ExitManager
+from rule_engine import RulePlan
+
+LONG_REASON = '5m uptrend: close > EMA_medium and RSI > 50'
+SHORT_REASON = '5m downtrend: close < EMA_medium and RSI < 50'
+
+
+def trend_rule(timeframe: str = '5m', rsi_long: float = 45, rsi_short: float = 55) -> dict:
+    """The built-in check_signal rule in the RulePlan format (45/55 RSI by default)."""
+    return {
+        'name': f'trend_{timeframe}',
+        'long': {'all': [['close', '>', f'EMA_medium_{timeframe}'], [f'EMA_short_{timeframe}', '>', f'EMA_medium_{timeframe}'],
+                         [f'RSI_{timeframe}', '>', rsi_long]]},
+        'short': {'all': [['close', '<', f'EMA_medium_{timeframe}'],
+                          [f'EMA_short_{timeframe}', '<', f'EMA_medium_{timeframe}'],
+                          [f'RSI_{timeframe}', '<', rsi_short]]},
+        'long_reason': LONG_REASON,
+        'short_reason': SHORT_REASON,
+    }
+
 
 class StrategyLogic:
     """
     Combines EntryManager and ExitManager to produce trade signals.
+
+    strategy.entry_rule in config.json picks the entry rule: "trend" (the
+    built-in 5m rule below, the default), "rsi_reversal"
+    (EntryManager's RSI oversold/overbought rule on 5m) or a RulePlan
+    variant dict.
     """
     def __init__(self, strategy_config: dict):
         self.entry_manager = EntryManager(strategy_config)
         self.exit_manager = ExitManager()
         self.current_position = None  # {'type': 'LONG'/'SHORT', 'entry_price': ...}
 
+        entry_rule = strategy_config.get('entry_rule', 'trend')
+        if entry_rule == 'trend':
+            self.rule = trend_rule()
+            self._plan = None   # hand-written check_signal/compute_signals
+        else:
+            if entry_rule == 'rsi_reversal':
+                self.rule = self.entry_manager.rule('5m')
+            elif isinstance(entry_rule, dict):
+                self.rule = entry_rule
+            else:
+                raise ValueError(f"Unknown entry rule: {entry_rule}")
+            self._plan = RulePlan([self.rule])
+            self.rule = self._plan.variants[0]
+        self.long_reason = self.rule.get('long_reason', LONG_REASON)
+        self.short_reason = self.rule.get('short_reason', SHORT_REASON)
+        self._previous = {}
+
+    @property
+    def columns(self) -> set:
+        """Merged-frame columns the entry rule reads."""
+        plan = self._plan if self._plan is not None else RulePlan([self.rule])
+        return set(plan.columns)
+
+    @property
+    def uses_history(self) -> bool:
+        """True if the entry rule needs the previous bar (see observe)."""
+        return self._plan is not None and self._plan.uses_history
+
     def update_position(self, new_position):
         self.current_position = new_position
 
+    @staticmethod
+    def _flat_values(data_point: dict, multi_indicators: dict) -> dict:
+        """One bar as merged-frame column names: 'close', 'RSI_5m', ..."""
+        values = {key: value for key, value in data_point.items() if key != 'time'}
+        for tf, indicators in multi_indicators.items():
+            for name, value in indicators.items():
+                values[f'{name}_{tf}'] = value
+        return values
+
+    def observe(self, data_point: dict, multi_indicators: dict):
+        """
+        Record a bar check_signal is not called on (e.g. outside the session),
+        so crossover rules compare against the true previous bar.
+        """
+        if self._plan is not None:
+            self._previous = self._flat_values(data_point, multi_indicators)
+
+    def _check_rule(self, data_point: dict, multi_indicators: dict):
+        values = self._flat_values(data_point, multi_indicators)
+        previous, self._previous = self._previous, values
+        if self.current_position is not None:
+            return None
+        columns = {name: np.array([previous.get(name, np.nan), values[name]], dtype=float)
+                   for name in self._plan.columns}
+        signal = self._plan.evaluate(columns)[0, -1]
+        if signal > 0:
+            return {'type': 'LONG', 'reason': self.long_reason}
+        if signal < 0:
+            return {'type': 'SHORT', 'reason': self.short_reason}
+        return None
+
     def check_signal(self, data_point: dict, multi_indicators: dict):
+        if self._plan is not None:
+            return self._check_rule(data_point, multi_indicators)
+
         # If no position is open, decide on an entry based solely on 5m data:
         if self.current_position is None:
             # For example, consider an uptrend if the current 5m close is above the 5m medium EMA.
@@ -31,10 +119,47 @@ class StrategyLogic:
             if uptrend:
                 # Enter long if EMA_short is above EMA_medium and RSI is greater than 50
                 if ema_short_5m > ema_medium_5m and rsi_5m > 45:
-                    return {'type': 'LONG', 'reason': '5m uptrend: close > EMA_medium and RSI > 50'}
+                    return {'type': 'LONG', 'reason': LONG_REASON}
             if downtrend:
                 # Enter short if EMA_short is below EMA_medium and RSI is less than 50
                 if ema_short_5m < ema_medium_5m and rsi_5m < 55:
-                    return {'type': 'SHORT', 'reason': '5m downtrend: close < EMA_medium and RSI < 50'}
+                    return {'type': 'SHORT', 'reason': SHORT_REASON}
         
         return None
+
+    def compute_signals(self, close, ema_short_5m, ema_medium_5m, rsi_5m):
+        """
+        Vectorized counterpart of check_signal over whole columns.
+        Returns an int8 array: 1 for LONG, -1 for SHORT, 0 for no signal.
+        NaN indicator values never produce a signal, same as the scalar version.
+        """
+        close = np.asarray(close, dtype=float)
+        signals = np.zeros(len(close), dtype=np.int8)
+        if self.current_position is not None:
+            return signals
+
+        ema_short_5m = np.asarray(ema_short_5m, dtype=float)
+        ema_medium_5m = np.asarray(ema_medium_5m, dtype=float)
+        rsi_5m = np.asarray(rsi_5m, dtype=float)
+
+        uptrend = close > ema_medium_5m
+        downtrend = close < ema_medium_5m
+        long_entry = uptrend & (ema_short_5m > ema_medium_5m) & (rsi_5m > 45)
+        short_entry = downtrend & (ema_short_5m < ema_medium_5m) & (rsi_5m < 55)
+
+        signals[long_entry] = 1
+        signals[short_entry] = -1
+        return signals
+
+    def compute_frame_signals(self, merged) -> np.ndarray:
+        """Signals of the configured entry rule over the whole merged frame."""
+        if self._plan is None:
+            return self.compute_signals(
+                merged['close'].to_numpy(dtype=float),
+                merged['EMA_short_5m'].to_numpy(dtype=float),
+                merged['EMA_medium_5m'].to_numpy(dtype=float),
+                merged['RSI_5m'].to_numpy(dtype=float),
+            )
+        if self.current_position is not None:
+            return np.zeros(len(merged), dtype=np.int8)
+        return self._plan.evaluate(merged)[0]
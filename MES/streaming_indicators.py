@@ -0,0 +1,205 @@
+import math
+from collections import deque
+
+import pandas as pd
+
+NAN = float('nan')
+
+
+def _divide(a: float, b: float) -> float:
+    """a / b with NumPy's IEEE semantics (x/0 -> +-inf, 0/0 -> nan) instead of raising."""
+    if b == 0.0:
+        if a != a or a == 0.0:
+            return NAN
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+class StreamingEma:
+    """
+    Recursive EMA, step-for-step identical to pandas
+    Series.ewm(alpha=..., adjust=False).mean(), including its NaN handling.
+    """
+    __slots__ = ('alpha', 'old_wt_factor', 'weighted', 'old_wt')
+
+    def __init__(self, span: float = None, com: float = None):
+        if span is not None:
+            self.alpha = 2.0 / (span + 1.0)
+        else:
+            self.alpha = 1.0 / (1.0 + com)
+        self.old_wt_factor = 1.0 - self.alpha
+        self.weighted = NAN
+        self.old_wt = 1.0
+
+    def update(self, x: float) -> float:
+        is_observation = x == x
+        if self.weighted == self.weighted:
+            self.old_wt *= self.old_wt_factor
+            if is_observation:
+                if self.weighted != x:
+                    self.weighted = (self.old_wt * self.weighted + self.alpha * x) / (self.old_wt + self.alpha)
+                self.old_wt = 1.0
+        elif is_observation:
+            self.weighted = x
+        return self.weighted
+
+
+class RollingMean:
+    """Rolling mean over the last `window` values using a ring buffer and a running sum."""
+    __slots__ = ('window', 'buffer', 'pos', 'count', 'nan_count', 'total')
+
+    def __init__(self, window: int):
+        self.window = window
+        self.buffer = [NAN] * window
+        self.pos = 0
+        self.count = 0       # values seen, capped at window
+        self.nan_count = 0   # NaNs currently in the window
+        self.total = 0.0
+
+    def update(self, x: float) -> float:
+        old = self.buffer[self.pos]
+        if self.count == self.window:
+            if old == old:
+                self.total -= old
+            else:
+                self.nan_count -= 1
+        else:
+            self.count += 1
+        self.buffer[self.pos] = x
+        self.pos = (self.pos + 1) % self.window
+        if x == x:
+            self.total += x
+        else:
+            self.nan_count += 1
+        if self.pos == 0:
+            # Re-sum once per lap (amortised O(1)) so rounding error can't accumulate.
+            self.total = math.fsum(v for v in self.buffer if v == v)
+
+        if self.count < self.window or self.nan_count:
+            return NAN
+        return self.total / self.window
+
+
+class RollingExtreme:
+    """Rolling min or max over the last `window` values using a monotonic deque."""
+    __slots__ = ('window', 'is_max', 'deque', 'index', 'last_nan')
+
+    def __init__(self, window: int, is_max: bool):
+        self.window = window
+        self.is_max = is_max
+        self.deque = deque()   # (index, value), values monotonic from the left
+        self.index = -1
+        self.last_nan = -window - 1
+
+    def update(self, x: float) -> float:
+        self.index += 1
+        if x != x:
+            self.last_nan = self.index
+        else:
+            dq = self.deque
+            if self.is_max:
+                while dq and dq[-1][1] <= x:
+                    dq.pop()
+            else:
+                while dq and dq[-1][1] >= x:
+                    dq.pop()
+            dq.append((self.index, x))
+        while self.deque and self.deque[0][0] <= self.index - self.window:
+            self.deque.popleft()
+
+        # Same as pandas with min_periods=window: a full window with no NaNs.
+        if self.index + 1 < self.window or self.last_nan > self.index - self.window:
+            return NAN
+        return self.deque[0][1]
+
+
+class StreamingIndicatorCalculator:
+    """
+    Bar-by-bar counterpart of IndicatorCalculator.add_indicators.
+
+    Each call to update(bar) advances every indicator in constant time and
+    returns the same columns add_indicators would produce for that row
+    (EMA_short, EMA_medium, RSI, ATR, and optionally MACD/MACD_signal and
+    StochK/StochD). EMA, RSI and MACD keep recursive state; ATR and %D keep
+    ring-buffer sums; %K keeps monotonic deques for the rolling low/high.
+    """
+
+    def __init__(self,
+                 short_ema_period=5,
+                 medium_ema_period=15,
+                 rsi_period=14,
+                 atr_period=14,
+                 compute_macd=False,
+                 compute_stoch=False):
+        self.compute_macd = compute_macd
+        self.compute_stoch = compute_stoch
+
+        self.ema_short = StreamingEma(span=short_ema_period)
+        self.ema_medium = StreamingEma(span=medium_ema_period)
+        self.rsi_up = StreamingEma(com=rsi_period - 1)
+        self.rsi_down = StreamingEma(com=rsi_period - 1)
+        self.atr = RollingMean(atr_period)
+
+        # Same fixed periods as IndicatorCalculator.compute_macd / compute_stochastic.
+        self.macd_fast = StreamingEma(span=12)
+        self.macd_slow = StreamingEma(span=26)
+        self.macd_signal = StreamingEma(span=9)
+        self.stoch_low = RollingExtreme(14, is_max=False)
+        self.stoch_high = RollingExtreme(14, is_max=True)
+        self.stoch_d = RollingMean(3)
+
+        self.prev_close = NAN
+        self.values = {}
+
+    def update(self, bar: dict) -> dict:
+        """
+        Advance all indicators by one bar (needs 'high', 'low', 'close').
+        Returns a dict of the indicator values for this bar.
+        """
+        high = float(bar['high'])
+        low = float(bar['low'])
+        close = float(bar['close'])
+        prev_close = self.prev_close
+
+        values = {
+            'EMA_short': self.ema_short.update(close),
+            'EMA_medium': self.ema_medium.update(close),
+        }
+
+        # RSI: EMA of gains and losses; the first bar has no delta.
+        delta = close - prev_close
+        if delta != delta:
+            up = down = NAN
+        else:
+            up = delta if delta > 0 else 0.0
+            down = -delta if delta < 0 else 0.0
+        rs = _divide(self.rsi_up.update(up), self.rsi_down.update(down))
+        values['RSI'] = 100 - _divide(100, 1 + rs)
+
+        # ATR: rolling mean of the true range (NaN terms skipped, as in pandas max(axis=1)).
+        true_range = high - low
+        if prev_close == prev_close:
+            true_range = max(true_range, abs(high - prev_close), abs(low - prev_close))
+        values['ATR'] = self.atr.update(true_range)
+
+        if self.compute_macd:
+            macd_line = self.macd_fast.update(close) - self.macd_slow.update(close)
+            values['MACD'] = macd_line
+            values['MACD_signal'] = self.macd_signal.update(macd_line)
+
+        if self.compute_stoch:
+            low_min = self.stoch_low.update(low)
+            high_max = self.stoch_high.update(high)
+            stoch_k = 100 * (close - low_min) / (high_max - low_min + 1e-9)
+            values['StochK'] = stoch_k
+            values['StochD'] = self.stoch_d.update(stoch_k)
+
+        self.prev_close = close
+        self.values = values
+        return values
+
+    def replay(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Feed every row of an OHLC frame through update(); returns the indicator columns."""
+        rows = [self.update({'high': h, 'low': l, 'close': c})
+                for h, l, c in zip(df['high'].to_numpy(), df['low'].to_numpy(), df['close'].to_numpy())]
+        return pd.DataFrame(rows, index=df.index)
@@ -0,0 +1,70 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+TICK_SIZE = 0.25
+
+
+def generate_bars(n_bars: int, freq: str = '1min', seed: int = 0,
+                  start: str = '2020-01-02 00:00', base_price: float = 5000.0) -> pd.DataFrame:
+    """
+    MES-like OHLCV bars: a random walk on the 0.25 tick grid with
+    exponential wicks and integer volume. Same columns and index as
+    DataLoader.load_data (time index; open, high, low, close, volume).
+    """
+    rng = np.random.default_rng(seed)
+    times = pd.date_range(start, periods=n_bars, freq=freq, name='time')
+
+    steps = np.round(rng.normal(0.0, 1.0, n_bars) / TICK_SIZE) * TICK_SIZE
+    close = base_price + np.cumsum(steps)
+    open_ = np.empty(n_bars)
+    open_[:1] = base_price
+    open_[1:] = close[:-1]
+    wick_up = np.round(rng.exponential(0.5, n_bars) / TICK_SIZE) * TICK_SIZE
+    wick_down = np.round(rng.exponential(0.5, n_bars) / TICK_SIZE) * TICK_SIZE
+
+    return pd.DataFrame({
+        'open': open_,
+        'high': np.maximum(open_, close) + wick_up,
+        'low': np.minimum(open_, close) - wick_down,
+        'close': close,
+        'volume': rng.integers(10, 500, n_bars),
+    }, index=times)
+
+
+def resample_bars(df: pd.DataFrame, rule: str = '5min') -> pd.DataFrame:
+    """Aggregate bars to a longer timeframe, labelled by bar open time."""
+    return df.resample(rule, label='left', closed='left').agg({
+        'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'
+    }).dropna()
+
+
+def write_dataset(data_path: str, n_bars: int, symbol: str = 'MES', seed: int = 0) -> dict:
+    """
+    Write <symbol>_1_min.csv (n_bars rows) and the matching <symbol>_5_mins.csv
+    into data_path, in the layout DataLoader reads. Returns the file map.
+    """
+    os.makedirs(data_path, exist_ok=True)
+    df_1m = generate_bars(n_bars, seed=seed)
+    file_map = {'1m': f'{symbol}_1_min.csv', '5m': f'{symbol}_5_mins.csv'}
+    df_1m.to_csv(os.path.join(data_path, file_map['1m']))
+    resample_bars(df_1m).to_csv(os.path.join(data_path, file_map['5m']))
+    return file_map
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic MES-like 1m/5m CSV files.")
+    parser.add_argument('--data-path', default='./data')
+    parser.add_argument('--bars', type=int, default=100_000, help="number of 1m bars")
+    parser.add_argument('--symbol', default='MES')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    file_map = write_dataset(args.data_path, args.bars, symbol=args.symbol, seed=args.seed)
+    print(f"Wrote {args.bars} 1m bars to {os.path.join(args.data_path, file_map['1m'])}")
+
+
+if __name__ == "__main__":
+    main()
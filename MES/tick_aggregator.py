@@ -0,0 +1,283 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from columnar_store import ColumnarStore
+from multi_timeframe import timeframe_duration
+
+try:
+    from numba import njit
+except ImportError:  # Numba is optional; range bars then run as plain Python.
+    njit = None
+
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+def parse_bar_spec(spec: str) -> tuple:
+    """
+    '1m', '5m', '1h' -> ('time', width in ns); 'volume:500' -> ('volume', 500);
+    'range:2.5' -> ('range', 2.5).
+    """
+    kind, _, size = spec.partition(':')
+    if not size:
+        return 'time', timeframe_duration(spec).value
+    if kind == 'volume':
+        return 'volume', float(size)
+    if kind == 'range':
+        return 'range', float(size)
+    raise ValueError(f"Unknown bar spec: {spec}")
+
+
+def _range_bar_ids(prices, range_size, state, out):
+    """
+    Bar number of each tick for range bars. A bar closes on the tick that
+    takes its high - low to range_size; the next tick opens a new one.
+    state holds [bar, high, low, open] (open = 1 while a bar is forming)
+    and is updated for the next chunk.
+    """
+    bar = int(state[0])
+    high = state[1]
+    low = state[2]
+    forming = state[3] > 0
+    for i in range(len(prices)):
+        price = prices[i]
+        if forming:
+            if price > high:
+                high = price
+            if price < low:
+                low = price
+        else:
+            high = price
+            low = price
+            forming = True
+        out[i] = bar
+        if high - low >= range_size - 1e-9:
+            bar += 1
+            forming = False
+    state[0] = bar
+    state[1] = high
+    state[2] = low
+    state[3] = 1.0 if forming else 0.0
+
+
+_compiled_range_bar_ids = njit(cache=True, nogil=True)(_range_bar_ids) if njit is not None else None
+
+
+class TickAggregator:
+    """
+    Builds bars from trade ticks (time, price, size) a chunk at a time.
+
+    Bar kinds (see parse_bar_spec):
+      time    epoch-aligned buckets labelled by their open time, like the
+              bar CSVs and MultiTimeframeBuilder.resample
+      volume  bar k holds the ticks whose cumulative volume before the tick
+              is in [k*size, (k+1)*size); a tick is never split, so a large
+              one lets the next bar start part-way through its threshold
+      range   a bar closes on the tick that takes its high - low to size
+              (a sequential rule; compiled with Numba when installed)
+    Volume and range bars are labelled by the time of their first tick.
+
+    Each chunk is reduced with ufunc.reduceat over the bar boundaries. The
+    last bar of a chunk may still be forming, so it is held back and merged
+    with the next chunk's first bar; update() only returns finished bars
+    and flush() returns the ones still open at the end. Memory is bounded
+    by the chunk size whatever the length of the tick file.
+    """
+
+    def __init__(self, specs, chunk_rows: int = 1_000_000, time_column: str = 'time',
+                 price_column: str = 'price', size_column: str = 'size', time_format: str = None):
+        """
+        :param specs: Bar specs, e.g. ['1m', '5m', 'volume:500', 'range:2.5'].
+        :param time_format: strftime format of the time column (faster parsing);
+                            numeric time columns are read as epoch seconds.
+        """
+        self.specs = {spec: parse_bar_spec(spec) for spec in specs}
+        self.chunk_rows = chunk_rows
+        self.time_column = time_column
+        self.price_column = price_column
+        self.size_column = size_column
+        self.time_format = time_format
+        self.ticks = 0
+        self._last_time = None
+        self._carry = {spec: None for spec in self.specs}
+        self._volume = {spec: 0.0 for spec in self.specs}
+        self._range_state = {spec: np.zeros(4) for spec in self.specs}
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+    def read_chunks(self, path: str):
+        """Yield (time ns, price, size) arrays of the tick file, chunk_rows at a time."""
+        columns = [self.time_column, self.price_column, self.size_column]
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=self.chunk_rows):
+            chunk = chunk.dropna()
+            times = chunk[self.time_column]
+            if pd.api.types.is_numeric_dtype(times):
+                times = pd.to_datetime(times, unit='s')
+            else:
+                times = pd.to_datetime(times, format=self.time_format)
+            yield (times.to_numpy().astype('datetime64[ns]').view(np.int64),
+                   chunk[self.price_column].to_numpy(dtype=float),
+                   chunk[self.size_column].to_numpy())
+
+    # ------------------------------------------------------------------
+    # Aggregation
+    # ------------------------------------------------------------------
+    def _bar_ids(self, spec: str, times, prices, sizes) -> np.ndarray:
+        kind, size = self.specs[spec]
+        if kind == 'time':
+            return times // size * size
+        if kind == 'volume':
+            cumulative = np.cumsum(sizes, dtype=float)
+            before = self._volume[spec] + cumulative - sizes
+            self._volume[spec] += cumulative[-1]
+            return np.floor(before / size).astype(np.int64)
+        ids = np.empty(len(prices), dtype=np.int64)
+        state = self._range_state[spec]
+        if _compiled_range_bar_ids is not None:
+            _compiled_range_bar_ids(prices, size, state, ids)
+        else:
+            out = [0] * len(prices)
+            state_list = state.tolist()
+            _range_bar_ids(prices.tolist(), size, state_list, out)
+            ids[:] = out
+            state[:] = state_list
+        return ids
+
+    def update(self, times, prices, sizes) -> dict:
+        """Add one chunk of ticks (sorted by time); returns {spec: finished bars}."""
+        if len(times) == 0:
+            return {spec: self._frame(None) for spec in self.specs}
+        if np.any(times[1:] < times[:-1]) or (self._last_time is not None and times[0] < self._last_time):
+            raise ValueError("TickAggregator: ticks must be sorted by time")
+        self._last_time = times[-1]
+        self.ticks += len(times)
+
+        finished = {}
+        for spec in self.specs:
+            ids = self._bar_ids(spec, times, prices, sizes)
+            starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+            ends = np.r_[starts[1:], len(ids)] - 1
+            bars = {
+                'id': ids[starts],
+                'time': ids[starts] if self.specs[spec][0] == 'time' else times[starts],
+                'open': prices[starts],
+                'high': np.maximum.reduceat(prices, starts),
+                'low': np.minimum.reduceat(prices, starts),
+                'close': prices[ends],
+                'volume': np.add.reduceat(sizes, starts),
+            }
+            carry = self._carry[spec]
+            if carry is not None and carry['id'][0] == bars['id'][0]:
+                # The first bar continues the one left open by the previous chunk.
+                for col in ('time', 'open'):
+                    bars[col][0] = carry[col][0]
+                bars['high'][0] = max(bars['high'][0], carry['high'][0])
+                bars['low'][0] = min(bars['low'][0], carry['low'][0])
+                bars['volume'][0] += carry['volume'][0]
+            elif carry is not None:
+                bars = {col: np.r_[carry[col], values] for col, values in bars.items()}
+            self._carry[spec] = {col: values[-1:].copy() for col, values in bars.items()}
+            finished[spec] = self._frame({col: values[:-1] for col, values in bars.items()})
+        return finished
+
+    def flush(self) -> dict:
+        """{spec: the bar still forming} after the last chunk (may be empty)."""
+        bars = {spec: self._frame(self._carry[spec]) for spec in self.specs}
+        self._carry = {spec: None for spec in self.specs}
+        return bars
+
+    @staticmethod
+    def _frame(bars) -> pd.DataFrame:
+        """DataLoader-shaped frame: OHLCV columns on a 'time' index."""
+        if bars is None:
+            bars = {'time': np.empty(0, dtype=np.int64), **{col: np.empty(0) for col in BAR_COLUMNS}}
+        index = pd.DatetimeIndex(np.asarray(bars['time'], dtype=np.int64).view('datetime64[ns]'), name='time')
+        return pd.DataFrame({col: bars[col] for col in BAR_COLUMNS}, index=index)
+
+    def run(self, path: str, sink) -> dict:
+        """
+        Aggregate a whole tick file; sink(spec, bars) receives every batch of
+        finished bars in time order. Returns {spec: bar count}.
+        """
+        counts = {spec: 0 for spec in self.specs}
+        for chunk in self.read_chunks(path):
+            for spec, bars in self.update(*chunk).items():
+                if len(bars):
+                    sink(spec, bars)
+                    counts[spec] += len(bars)
+        for spec, bars in self.flush().items():
+            if len(bars):
+                sink(spec, bars)
+                counts[spec] += len(bars)
+        return counts
+
+
+def aggregate_ticks_to_store(tick_path: str, bars: dict, store: ColumnarStore, chunk_rows: int = 1_000_000,
+                             **reader_options) -> dict:
+    """
+    Build bar series from a tick file into a ColumnarStore, e.g.
+    bars={'MES_1_min.csv': '1m', 'MES_5_mins.csv': '5m'}. Each series is
+    named after its file (DataLoader.series_name), so DataLoader reads it
+    for that file name when no such CSV exists. Returns {file: bar count}.
+    """
+    names = {spec: os.path.splitext(os.path.basename(file_name))[0] for file_name, spec in bars.items()}
+    written = set()
+    stat = os.stat(tick_path)
+    source = {'ticks': os.path.basename(tick_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def sink(spec, frame):
+        name = names[spec]
+        if name in written:
+            store.append(name, frame)
+        else:
+            store.write(name, frame)
+            written.add(name)
+
+    aggregator = TickAggregator(list(names), chunk_rows=chunk_rows, **reader_options)
+    counts = aggregator.run(tick_path, sink)
+    for spec, name in names.items():
+        if name not in written:
+            store.write(name, TickAggregator._frame(None))
+        store.set_source(name, dict(source, bars=spec))
+    print(f"TickAggregator: {aggregator.ticks} ticks -> "
+          + ', '.join(f'{name} ({counts[spec]} bars)' for spec, name in names.items()))
+    return {file_name: counts[spec] for file_name, spec in bars.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate trade ticks into bars.")
+    parser.add_argument('ticks', help="CSV of trade ticks (time, price, size)")
+    parser.add_argument('--data-path', default='./data')
+    parser.add_argument('--bars', action='append', default=[],
+                        help="file=spec, e.g. MES_1_min.csv=1m, MES_vol500.csv=volume:500, "
+                             "MES_range2.csv=range:2.0 (default: the 1m and 5m files)")
+    parser.add_argument('--csv', action='store_true', help="Write CSV files instead of the columnar store")
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000)
+    parser.add_argument('--time-format', default=None)
+    args = parser.parse_args(argv)
+
+    bars = dict(item.split('=', 1) for item in args.bars) or {'MES_1_min.csv': '1m', 'MES_5_mins.csv': '5m'}
+    if not args.csv:
+        store = ColumnarStore(os.path.join(args.data_path, 'columnar'))
+        aggregate_ticks_to_store(args.ticks, bars, store, chunk_rows=args.chunk_rows,
+                                 time_format=args.time_format)
+        return
+
+    paths = {spec: os.path.join(args.data_path, file_name) for file_name, spec in bars.items()}
+    started = set()
+
+    def sink(spec, frame):
+        frame.to_csv(paths[spec], mode='a' if spec in started else 'w', header=spec not in started)
+        started.add(spec)
+
+    aggregator = TickAggregator(list(paths), chunk_rows=args.chunk_rows, time_format=args.time_format)
+    counts = aggregator.run(args.ticks, sink)
+    for spec, path in paths.items():
+        print(f"Wrote {counts[spec]} bars to {path}")
+
+
+if __name__ == "__main__":
+    main()
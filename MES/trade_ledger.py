@@ -0,0 +1,198 @@
+import numpy as np
+import pandas as pd
+
+SIDE_CODES = {'LONG': 1, 'SHORT': -1}
+SIDE_NAMES = {1: 'LONG', -1: 'SHORT'}
+
+# Exit reasons seen in this codebase; other strings get codes as they appear.
+EXIT_REASONS = ['StopLoss hit', 'StopLoss hit (trailing)', 'TakeProfit hit']
+
+
+def _time_ns(value) -> int:
+    """Nanoseconds since the epoch for a bar time (NaT for None)."""
+    if isinstance(value, pd.Timestamp):
+        return value.value
+    if isinstance(value, np.datetime64):
+        return value.astype('datetime64[ns]').astype(np.int64)
+    return pd.Timestamp(value).value
+
+
+class Position:
+    """
+    The open position of an ExecutionSimulator.
+
+    A fixed-slot object instead of a dict; item access (position['type'])
+    is kept for code written against the old dict.
+    """
+
+    __slots__ = ('type', 'entry_price', 'entry_time', 'quantity', 'reason', 'best_price',
+                 'exit_price', 'exit_time', 'exit_reason')
+
+    def __init__(self, type: str, entry_price: float, entry_time, quantity: int, reason: str = ''):
+        self.type = type
+        self.entry_price = entry_price
+        self.entry_time = entry_time
+        self.quantity = quantity
+        self.reason = reason
+        # Best favorable price since entry, for the trailing stop
+        # (LONG: highest high; SHORT: lowest low).
+        self.best_price = entry_price
+        self.exit_price = None
+        self.exit_time = None
+        self.exit_reason = None
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return (f"Position({self.type} {self.quantity} @ {self.entry_price} on {self.entry_time}, "
+                f"best={self.best_price})")
+
+
+class TradeLedger:
+    """
+    Closed trades stored column-wise in preallocated NumPy arrays that double
+    in size when full. Side and exit reason are small integer codes; times
+    are int64 nanoseconds since the epoch (UTC). The time zone of tz-aware
+    bar times is kept in `tz`, and to_frame()/to_records() convert back to it.
+
+    to_frame() wraps the filled part of the arrays in a DataFrame without
+    copying the numeric columns; to_records() rebuilds the list of trade
+    dicts the simulator used to keep.
+    """
+
+    COLUMNS = {
+        'side': np.int8,
+        'entry_price': np.float64,
+        'exit_price': np.float64,
+        'entry_time': np.int64,
+        'exit_time': np.int64,
+        'quantity': np.int64,
+        'reason_code': np.int16,
+    }
+
+    tz = None
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.columns = {name: np.empty(max(capacity, 1), dtype=dtype)
+                        for name, dtype in self.COLUMNS.items()}
+        self.reasons = list(EXIT_REASONS)
+        self._reason_codes = {reason: code for code, reason in enumerate(self.reasons)}
+
+    def __len__(self):
+        return self.size
+
+    def reason_code(self, reason: str) -> int:
+        code = self._reason_codes.get(reason)
+        if code is None:
+            code = self._reason_codes[reason] = len(self.reasons)
+            self.reasons.append(reason)
+        return code
+
+    def _grow(self):
+        capacity = 2 * len(self.columns['side'])
+        for name, values in self.columns.items():
+            grown = np.empty(capacity, dtype=values.dtype)
+            grown[:self.size] = values[:self.size]
+            self.columns[name] = grown
+
+    def append(self, side: str, entry_price: float, exit_price: float, entry_time, exit_time,
+               quantity: int, reason: str):
+        if self.size == len(self.columns['side']):
+            self._grow()
+        if self.tz is None and getattr(exit_time, 'tz', None) is not None:
+            self.tz = exit_time.tz
+        i = self.size
+        cols = self.columns
+        cols['side'][i] = SIDE_CODES[side]
+        cols['entry_price'][i] = entry_price
+        cols['exit_price'][i] = exit_price
+        cols['entry_time'][i] = _time_ns(entry_time)
+        cols['exit_time'][i] = _time_ns(exit_time)
+        cols['quantity'][i] = quantity
+        cols['reason_code'][i] = self.reason_code(reason)
+        self.size += 1
+
+    def extend(self, side, entry_price, exit_price, entry_time, exit_time, quantity, reason_code, tz=None):
+        """
+        Append many trades from arrays: side as +1/-1, times as int64 ns (UTC
+        for tz-aware bars, whose zone is passed as tz) and exit reasons as
+        codes of this ledger (EXIT_REASONS order).
+        """
+        if self.tz is None and tz is not None:
+            self.tz = tz
+        m = len(side)
+        while self.size + m > len(self.columns['side']):
+            self._grow()
+        lo, hi = self.size, self.size + m
+        cols = self.columns
+        cols['side'][lo:hi] = side
+        cols['entry_price'][lo:hi] = entry_price
+        cols['exit_price'][lo:hi] = exit_price
+        cols['entry_time'][lo:hi] = entry_time
+        cols['exit_time'][lo:hi] = exit_time
+        cols['quantity'][lo:hi] = quantity
+        cols['reason_code'][lo:hi] = reason_code
+        self.size = hi
+
+    def column(self, name: str) -> np.ndarray:
+        """View of the filled part of one column."""
+        return self.columns[name][:self.size]
+
+    def _times(self, name: str):
+        """One time column as datetime64[ns] (a view), or tz-aware in the bars' zone."""
+        values = self.columns[name][:self.size].view('datetime64[ns]')
+        if self.tz is None:
+            return values
+        return pd.DatetimeIndex(values).tz_localize('UTC').tz_convert(self.tz)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Closed trades as a DataFrame with the trade-dict column names. The
+        price, time and quantity columns are views of the ledger arrays
+        (times are converted instead for tz-aware bars).
+        """
+        n = self.size
+        cols = self.columns
+        side = cols['side'][:n]
+        return pd.DataFrame({
+            'position_type': pd.Categorical.from_codes((side < 0).astype(np.int8), ['LONG', 'SHORT']),
+            'entry_price': cols['entry_price'][:n],
+            'exit_price': cols['exit_price'][:n],
+            'entry_time': self._times('entry_time'),
+            'exit_time': self._times('exit_time'),
+            'quantity': cols['quantity'][:n],
+            'reason': pd.Categorical.from_codes(cols['reason_code'][:n], self.reasons),
+        }, copy=False)
+
+    def to_records(self) -> list:
+        """Closed trades as the list of dicts ExecutionSimulator used to keep."""
+        n = self.size
+        cols = self.columns
+        entry_times = pd.DatetimeIndex(self._times('entry_time'))
+        exit_times = pd.DatetimeIndex(self._times('exit_time'))
+        return [
+            {
+                'position_type': SIDE_NAMES[int(cols['side'][i])],
+                'entry_price': float(cols['entry_price'][i]),
+                'exit_price': float(cols['exit_price'][i]),
+                'entry_time': entry_times[i],
+                'exit_time': exit_times[i],
+                'quantity': int(cols['quantity'][i]),
+                'reason': self.reasons[cols['reason_code'][i]],
+            }
+            for i in range(n)
+        ]
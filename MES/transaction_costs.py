@@ -0,0 +1,209 @@
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from performance_analyzer import TRADING_DAYS_PER_YEAR, PerformanceAnalyzer
+from trade_ledger import TradeLedger
+
+# Exit reasons filled by a resting limit order (no slippage unless slip_limit_orders).
+LIMIT_EXIT_REASONS = ('TakeProfit hit',)
+
+
+class TransactionCostModel:
+    """
+    Turns the simulator's gross fills into net ones, after the run:
+
+      tick rounding  every fill is moved to the tick grid, against the
+                     trade (buys up, sells down)
+      slippage       market fills (entries at the bar close, stop exits)
+                     move slippage_ticks further against the trade; target
+                     exits are limit orders and fill at their price
+      commission     per contract per side, in currency, charged on entry
+                     and exit and converted to points with point_value
+
+    apply() returns the trades with net entry/exit prices and a 'cost'
+    column (commission in points per contract), which PerformanceAnalyzer
+    subtracts from PnL. PnL stays in points per contract unless the
+    analyzer is given a multiplier (point_value for dollars).
+
+    sensitivity() evaluates a whole grid of commission x slippage values on
+    one trade ledger at once: each trade's net PnL is its rounded gross PnL
+    minus slippage x its number of market fills minus the commission, so
+    the grid is one broadcast (commissions x slippages x trades) array, and
+    the metrics are reductions along the trade axis.
+    """
+
+    def __init__(self, commission: float = 0.0, slippage_ticks: float = 0.0, tick_size: float = 0.25,
+                 point_value: float = 5.0, slip_limit_orders: bool = False):
+        """
+        :param commission: Currency per contract per side (fees included).
+        :param slippage_ticks: Ticks lost on each market fill.
+        :param tick_size: Minimum price increment (0.25 for MES).
+        :param point_value: Currency per point per contract ($5 for MES).
+        """
+        self.commission = commission
+        self.slippage_ticks = slippage_ticks
+        self.tick_size = tick_size
+        self.point_value = point_value
+        self.slip_limit_orders = slip_limit_orders
+
+    @classmethod
+    def from_config(cls, config: dict) -> 'TransactionCostModel':
+        """Build from the "costs" section of config.json."""
+        cfg = config.get('costs', {})
+        return cls(
+            commission = cfg.get('commission', 0.0),
+            slippage_ticks = cfg.get('slippage_ticks', 0.0),
+            tick_size = cfg.get('tick_size', 0.25),
+            point_value = cfg.get('point_value', 5.0),
+            slip_limit_orders = cfg.get('slip_limit_orders', False)
+        )
+
+    # ------------------------------------------------------------------
+    # Per-trade arrays
+    # ------------------------------------------------------------------
+    def _trade_columns(self, trades: pd.DataFrame) -> dict:
+        """Side, tick-rounded fills, market fill count and size of every trade."""
+        side = PerformanceAnalyzer._side(trades['position_type'])
+        tick = self.tick_size
+        entry = trades['entry_price'].to_numpy(dtype=float)
+        exit_ = trades['exit_price'].to_numpy(dtype=float)
+        # Buys round up and sells down; the epsilon keeps on-grid prices where they are.
+        entry = side * np.ceil(side * entry / tick - 1e-9) * tick
+        exit_ = -side * np.ceil(-side * exit_ / tick - 1e-9) * tick
+        if self.slip_limit_orders:
+            market_exit = np.ones(len(trades))
+        else:
+            market_exit = (~trades['reason'].astype(str).isin(LIMIT_EXIT_REASONS).to_numpy()).astype(float)
+        size = trades['quantity'].to_numpy(dtype=float) if 'quantity' in trades else np.ones(len(trades))
+        return {'side': side, 'entry': entry, 'exit': exit_, 'market_exit': market_exit, 'size': size}
+
+    @staticmethod
+    def _frame(trades) -> pd.DataFrame:
+        return trades.to_frame() if isinstance(trades, TradeLedger) else trades
+
+    def apply(self, trades, commission: float = None, slippage_ticks: float = None) -> pd.DataFrame:
+        """Copy of the trades with net fill prices and a 'cost' column (points per contract)."""
+        trades = self._frame(trades)
+        commission = self.commission if commission is None else commission
+        slippage = (self.slippage_ticks if slippage_ticks is None else slippage_ticks) * self.tick_size
+        cols = self._trade_columns(trades)
+        net = trades.copy()
+        net['entry_price'] = cols['entry'] + cols['side'] * slippage
+        net['exit_price'] = cols['exit'] - cols['side'] * slippage * cols['market_exit']
+        net['cost'] = 2 * commission / self.point_value
+        return net
+
+    # ------------------------------------------------------------------
+    # Sensitivity grid
+    # ------------------------------------------------------------------
+    def sensitivity(self, trades, commissions, slippage_ticks, multiplier: float = 1.0) -> pd.DataFrame:
+        """
+        Net metrics for every (commission, slippage_ticks) pair, one row each.
+
+        Drawdown, Sharpe and Sortino come from realised PnL at trade exits
+        (PerformanceAnalyzer without bars), so a grid point equals
+        PerformanceAnalyzer(model.apply(trades, c, s)) on those metrics.
+        """
+        trades = self._frame(trades)
+        commissions = np.asarray(commissions, dtype=float)
+        slippages = np.asarray(slippage_ticks, dtype=float)
+        grid_c, grid_s = np.meshgrid(commissions, slippages, indexing='ij')
+        rows = pd.DataFrame({'commission': grid_c.ravel(), 'slippage_ticks': grid_s.ravel()})
+        if trades.empty:
+            return rows.assign(total_trades=0)
+
+        cols = self._trade_columns(trades)
+        exit_ns = PerformanceAnalyzer._ns(trades['exit_time'].to_numpy())
+        order = np.argsort(exit_ns, kind='stable')
+        size = cols['size'][order] * multiplier
+        gross = (cols['side'] * (cols['exit'] - cols['entry']))[order]
+        market_fills = (1.0 + cols['market_exit'])[order]
+
+        # (commissions, slippages, trades) net PnL in one broadcast.
+        commission_points = 2 * commissions / self.point_value
+        slippage_points = slippages * self.tick_size
+        pnl = (gross[None, None, :]
+               - slippage_points[None, :, None] * market_fills[None, None, :]
+               - commission_points[:, None, None]) * size[None, None, :]
+        pnl = pnl.reshape(len(rows), -1)
+        n = pnl.shape[1]
+
+        wins = np.where(pnl > 0, pnl, 0.0)
+        losses = np.where(pnl < 0, -pnl, 0.0)
+        win_count = np.count_nonzero(pnl > 0, axis=1)
+        loss_count = np.count_nonzero(pnl < 0, axis=1)
+        sum_wins = wins.sum(axis=1)
+        sum_losses = losses.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            profit_factor = np.where(sum_losses != 0, sum_wins / sum_losses, np.inf)
+
+        equity = np.cumsum(pnl, axis=1)
+        peak = np.maximum.accumulate(np.maximum(equity, 0.0), axis=1)
+        max_drawdown = (equity - peak).min(axis=1)
+
+        # Daily equity changes, as PerformanceAnalyzer.risk_ratios.
+        days = exit_ns[order] // 86_400_000_000_000
+        last_of_day = np.flatnonzero(np.append(days[1:] != days[:-1], True))
+        daily = np.diff(equity[:, last_of_day], axis=1, prepend=0.0)
+        sharpe = sortino = np.full(len(rows), np.nan)
+        if daily.shape[1] >= 2:
+            mean = daily.mean(axis=1)
+            std = daily.std(axis=1, ddof=1)
+            downside = np.sqrt(np.mean(np.minimum(daily, 0.0) ** 2, axis=1))
+            scale = np.sqrt(TRADING_DAYS_PER_YEAR)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                sharpe = np.where(std > 0, mean / std * scale, np.nan)
+                sortino = np.where(downside > 0, mean / downside * scale, np.nan)
+
+        return rows.assign(
+            total_trades=n,
+            winning_trades=win_count,
+            losing_trades=loss_count,
+            win_rate=win_count / n * 100,
+            total_pnl=pnl.sum(axis=1),
+            avg_pl=pnl.mean(axis=1),
+            profit_factor=profit_factor,
+            max_drawdown=max_drawdown,
+            sharpe=sharpe,
+            sortino=sortino,
+        )
+
+
+def break_even(grid: pd.DataFrame) -> pd.DataFrame:
+    """Per commission, the highest slippage at which total PnL is still positive (NaN if none)."""
+    profitable = grid[grid['total_pnl'] > 0]
+    worst = profitable.groupby('commission')['slippage_ticks'].max()
+    return worst.reindex(sorted(grid['commission'].unique())).rename('max_slippage_ticks').reset_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Net metrics of a trade list over a commission/slippage grid.")
+    parser.add_argument('trades', help="Trades CSV (trade_ledger / results_and_reporting format)")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--commission', default=None, help="e.g. 0,0.5,1.0 (currency per contract per side)")
+    parser.add_argument('--slippage', default=None, help="e.g. 0,0.5,1,2 (ticks per market fill)")
+    parser.add_argument('--out', default=None)
+    args = parser.parse_args(argv)
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    grid_cfg = config.get('costs', {}).get('sensitivity', {})
+    commissions = ([float(v) for v in args.commission.split(',')] if args.commission
+                   else grid_cfg.get('commission', [0.0]))
+    slippages = ([float(v) for v in args.slippage.split(',')] if args.slippage
+                 else grid_cfg.get('slippage_ticks', [0.0]))
+
+    trades = pd.read_csv(args.trades, parse_dates=['entry_time', 'exit_time'])
+    grid = TransactionCostModel.from_config(config).sensitivity(trades, commissions, slippages)
+    print(grid.to_string(index=False))
+    print(break_even(grid).to_string(index=False))
+    if args.out:
+        grid.to_csv(args.out, index=False)
+        print(f"Sensitivity grid has been saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
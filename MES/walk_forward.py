@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from backtesting_app import (FILE_MAP, build_calculator, build_intrabar_index, build_merged_frame,
+                             build_session_mask, build_simulator, load_timeframes, print_stats)
+from columnar_engine import ColumnarEngine
+from data_loader import DataLoader
+from intrabar_index import IntrabarIndex
+from parameter_sweep import apply_params, expand_grid, parse_set_argument
+from performance_analyzer import PerformanceAnalyzer
+from shared_arrays import SharedArrays
+from strategy_logic import StrategyLogic
+
+# Merged columns the columnar engine reads; the entry rule's own columns are added per run.
+ENGINE_COLUMNS = ['high', 'low', 'close', 'EMA_short_5m', 'EMA_medium_5m', 'RSI_5m']
+
+# Per-process state; filled by _init_worker.
+_worker_shm = None
+_worker_arrays = None
+
+
+def _init_worker(handle):
+    global _worker_shm, _worker_arrays
+    _worker_shm, _worker_arrays = SharedArrays.attach(handle)
+
+
+def _slice_frame(arrays: dict, ind_key: int, lo: int, hi: int):
+    """Merged-frame view of rows [lo, hi) for one indicator setting, plus its session mask."""
+    frame = pd.DataFrame({'time': arrays['time'][lo:hi]}, copy=False)
+    prefix = f'{ind_key}/'
+    for name, values in arrays.items():
+        if name.startswith(prefix):
+            frame[name[len(prefix):]] = values[lo:hi]
+    return frame, arrays['session'][lo:hi]
+
+
+def _slice_intrabar(arrays: dict, lo: int, hi: int):
+    """IntrabarIndex of rows [lo, hi) when the 1m path was published (fill_mode "intrabar"), else None."""
+    if 'intrabar/start' not in arrays:
+        return None
+    return IntrabarIndex.from_path(arrays['intrabar/high'], arrays['intrabar/low'], arrays['intrabar/start'],
+                                   lo, hi)
+
+
+def _run_slice(arrays: dict, config: dict, ind_key: int, lo: int, hi: int) -> pd.DataFrame:
+    frame, session_mask = _slice_frame(arrays, ind_key, lo, hi)
+    simulator = build_simulator(config['execution'], log_mode='quiet')
+    ledger = ColumnarEngine(StrategyLogic(config['strategy']), simulator).run(
+        frame, session_mask, _slice_intrabar(arrays, lo, hi))
+    return ledger.to_frame()
+
+
+def _score(stats: dict, objective: str, min_trades: int) -> float:
+    if stats.get('total_trades', 0) < min_trades:
+        return -np.inf
+    value = stats.get(objective)
+    return -np.inf if value is None or value != value else value
+
+
+def _run_window(job):
+    """Optimise on the in-sample rows, then trade the best config out of sample."""
+    window, configs, ind_keys, objective, min_trades = job
+    best = None
+    for i, (config, ind_key) in enumerate(zip(configs, ind_keys)):
+        trades = _run_slice(_worker_arrays, config, ind_key, window['is_lo'], window['is_hi'])
+        stats = PerformanceAnalyzer(trades).compute_detailed_metrics()
+        score = _score(stats, objective, min_trades)
+        if best is None or score > best[0]:
+            best = (score, i, stats)
+
+    score, i, is_stats = best
+    oos_trades = _run_slice(_worker_arrays, configs[i], ind_keys[i], window['oos_lo'], window['oos_hi'])
+    return window, i, score, is_stats, oos_trades
+
+
+class WalkForwardOptimizer:
+    """
+    Rolling in-sample / out-of-sample optimisation over the merged 1m/5m frame.
+
+    Indicators are computed once over the full history for every indicator
+    setting in the grid and published to the workers through shared memory;
+    windows only slice those columns. Each window is optimised independently
+    (in parallel) and the best config is applied to the following
+    out-of-sample period. Positions still open at the end of an
+    out-of-sample window are dropped. With backtest.fill_mode "intrabar" the
+    1m path (IntrabarIndex) is published as well and sliced per window.
+    """
+
+    def __init__(self, config: dict, grid: dict, data_path: str = './data', file_map: dict = None,
+                 in_sample: str = '90D', out_of_sample: str = '30D', step: str = None,
+                 objective: str = 'profit_factor', min_trades: int = 10, max_workers: int = None):
+        self.config = config
+        self.grid = grid
+        self.data_path = data_path
+        self.file_map = file_map or FILE_MAP
+        self.in_sample = pd.Timedelta(in_sample)
+        self.out_of_sample = pd.Timedelta(out_of_sample)
+        self.step = pd.Timedelta(step) if step else self.out_of_sample
+        if self.step < self.out_of_sample:
+            # Overlapping out-of-sample windows would count their trades twice in the stitched result.
+            raise ValueError(f"step ({step}) must not be shorter than out_of_sample ({out_of_sample})")
+        self.objective = objective
+        self.min_trades = min_trades
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def make_windows(self, times: pd.Series) -> list:
+        """Row ranges of each (in-sample, out-of-sample) pair over the sorted time column."""
+        values = times.to_numpy()
+        windows = []
+        start = times.iloc[0]
+        while True:
+            is_end = start + self.in_sample
+            oos_end = is_end + self.out_of_sample
+            if is_end > times.iloc[-1]:
+                break
+            lo, mid, hi = np.searchsorted(values, [start.to_datetime64(), is_end.to_datetime64(),
+                                                   oos_end.to_datetime64()])
+            windows.append({
+                'window': len(windows),
+                'is_start': start, 'is_end': is_end, 'oos_end': oos_end,
+                'is_lo': int(lo), 'is_hi': int(mid), 'oos_lo': int(mid), 'oos_hi': int(hi),
+            })
+            start += self.step
+        return windows
+
+    def run(self) -> dict:
+        """
+        Returns {'windows': per-window DataFrame, 'trades': stitched
+        out-of-sample trades (DataFrame), 'stats': PerformanceAnalyzer metrics
+        on them}.
+        """
+        combos = expand_grid(self.grid)
+        configs = [apply_params(self.config, params) for params in combos]
+
+        # One merged frame per distinct indicator setting, over the full history.
+        bt_cfg = self.config.get('backtest', {})
+        loader = DataLoader(data_path=self.data_path, storage=bt_cfg.get('storage', 'csv'))
+        timeframes = load_timeframes(loader, self.config, self.file_map)
+        # Columns published per setting: the engine's plus those of every entry rule run on it.
+        ind_settings = {}
+        ind_columns = []
+        ind_keys = []
+        for config in configs:
+            key = json.dumps(config['indicators'], sort_keys=True)
+            if key not in ind_settings:
+                ind_settings[key] = len(ind_settings)
+                ind_columns.append((config, set(ENGINE_COLUMNS)))
+            ind_columns[ind_settings[key]][1].update(StrategyLogic(config['strategy']).columns)
+            ind_keys.append(ind_settings[key])
+
+        arrays = {}
+        for ind_key, (config, columns) in enumerate(ind_columns):
+            merged = build_merged_frame(timeframes, config['indicators'], build_calculator(config))
+            missing = sorted(columns.difference(merged.columns))
+            if missing:
+                raise ValueError(f"Entry rule columns not in the data: {missing} "
+                                 "(check the indicators section)")
+            for col in sorted(columns):
+                arrays[f'{ind_key}/{col}'] = merged[col].to_numpy(dtype=float)
+            if 'time' not in arrays:
+                arrays['time'] = merged['time'].to_numpy()
+                arrays['session'] = build_session_mask(self.config, merged['time'],
+                                                       timeframes['5m'].attrs.get('source_file'))
+                times = merged['time']
+                # The 1m path depends only on the bars, so one copy serves every setting.
+                intrabar = build_intrabar_index(self.config, timeframes, merged)
+                if intrabar is not None:
+                    arrays['intrabar/high'] = intrabar.high
+                    arrays['intrabar/low'] = intrabar.low
+                    arrays['intrabar/start'] = intrabar.start
+
+        windows = self.make_windows(times)
+        print(f"WalkForwardOptimizer: {len(windows)} windows x {len(configs)} combinations "
+              f"({len(ind_settings)} indicator settings) on {self.max_workers} workers")
+
+        jobs = [(window, configs, ind_keys, self.objective, self.min_trades) for window in windows]
+        with SharedArrays(arrays) as shared:
+            with ProcessPoolExecutor(max_workers=self.max_workers,
+                                     initializer=_init_worker,
+                                     initargs=(shared.handle,)) as pool:
+                results = list(pool.map(_run_window, jobs))
+
+        rows = []
+        trades = []
+        for window, best_index, score, is_stats, oos_trades in results:
+            oos_stats = PerformanceAnalyzer(oos_trades).compute_detailed_metrics()
+            rows.append({
+                'window': window['window'],
+                'is_start': window['is_start'],
+                'oos_start': window['is_end'],
+                'oos_end': window['oos_end'],
+                **combos[best_index],
+                f'is_{self.objective}': score,
+                'is_trades': is_stats.get('total_trades', 0),
+                'oos_trades': oos_stats.get('total_trades', 0),
+                f'oos_{self.objective}': oos_stats.get(self.objective),
+            })
+            trades.append(oos_trades)
+
+        trades = pd.concat(trades, ignore_index=True) if trades else pd.DataFrame()
+        stats = PerformanceAnalyzer(trades).compute_detailed_metrics()
+        return {'windows': pd.DataFrame(rows), 'trades': trades, 'stats': stats}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Walk-forward optimisation over config.json parameters.")
+    parser.add_argument('--config', default='config.json')
+    parser.add_argument('--data-path', default='./data')
+    parser.add_argument('--set', dest='grid', action='append', default=[],
+                        help="e.g. short_ema_period=5,9,13 or stop_offset=1:4:0.5")
+    parser.add_argument('--in-sample', default='90D')
+    parser.add_argument('--out-of-sample', default='30D')
+    parser.add_argument('--step', default=None,
+                        help="window step, at least the out-of-sample length (default: out-of-sample length)")
+    parser.add_argument('--objective', default='profit_factor')
+    parser.add_argument('--min-trades', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--out', default='walk_forward_windows.csv')
+    args = parser.parse_args(argv)
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    grid = dict(parse_set_argument(item) for item in args.grid)
+
+    result = WalkForwardOptimizer(
+        config, grid, data_path=args.data_path,
+        in_sample=args.in_sample, out_of_sample=args.out_of_sample, step=args.step,
+        objective=args.objective, min_trades=args.min_trades, max_workers=args.workers
+    ).run()
+
+    result['windows'].to_csv(args.out, index=False)
+    print(result['windows'].to_string(index=False))
+    print(f"Window results have been saved to {args.out}")
+    print_stats("Walk-Forward Out-of-Sample", result['stats'])
+
+
+if __name__ == "__main__":
+    main()